@@ -1,5 +1,6 @@
 const asyncHandler = require('express-async-handler');
 const Vital = require('../models/Vital');
+const vitalsWorker = require('../services/vitalsWorker');
 
 // @desc    Add new vital reading
 // @route   POST /api/vitals
@@ -65,31 +66,14 @@ const analyzeVitals = asyncHandler(async (req, res) => {
     throw new Error('No vitals provided for analysis');
   }
 
-  const { spawn } = require('child_process');
-  const path = require('path');
-
-  const scriptPath = path.join(__dirname, '../python_services/vitals_feedback.py');
-  const pythonProcess = spawn('python', [scriptPath, JSON.stringify(vitals)]);
-
-  let dataString = '';
-
-  pythonProcess.stdout.on('data', (data) => {
-    dataString += data.toString();
-  });
-
-  pythonProcess.stderr.on('data', (data) => {
-    console.error(`Python Error: ${data}`);
-  });
-
-  pythonProcess.on('close', (code) => {
-    try {
-      const result = JSON.parse(dataString);
-      res.json(result);
-    } catch (e) {
-      console.error('Failed to parse Python output', dataString);
-      res.status(500).json({ error: 'Analysis failed' });
-    }
-  });
+  try {
+    // The patient id lets the worker compare readings with this patient's own baseline
+    const result = await vitalsWorker.analyzeVitals(vitals, req.user.id);
+    res.json(result);
+  } catch (e) {
+    console.error('Vitals analysis failed', e.message);
+    res.status(500).json({ error: 'Analysis failed' });
+  }
 });
 
 module.exports = {
@@ -13,22 +13,21 @@ current_dir = Path(__file__).parent.absolute()
 sys.path.append(str(current_dir))
 
 from report_processor import HospitalReportProcessor
-from enhanced_chronic_disease_predictor import EnhancedChronicDiseasePredictor
-import google.generativeai as genai
+from model_registry import ModelRegistry
+from feature_mapping import build_model_input, profile_from_extracted
+from patient_feature_store import PatientFeatureStore
+from llm_client import GeminiHTTPClient
 
 # Setup Gemini Fallback
 # Try to get key from environment, fallback to hardcoded if testing standalone without env
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or "AQ.Ab8RN6KAePRZ7IMaIVDnDSmhQgNld8UJOlWjd2ZqPvs-xDdGqA"
 
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-except Exception as e:
-    sys.stderr.write(f"Gemini config error: {e}\n")
+# Every call is bounded by LLM_DEADLINE_SECONDS; GEMINI_API_BASE can point at a fake server
+llm_client = GeminiHTTPClient('gemini-pro', api_key=GEMINI_API_KEY)
 
 def call_gemini_fallback(text):
     """Fallback to Gemini for extraction if local models fail or find nothing."""
     try:
-        model = genai.GenerativeModel('gemini-pro')
         prompt = f"""
         Analyze this medical report text and extract or infer the following:
         1. Patient health metrics (age, gender, glucose, bp, etc) as 'profile'.
@@ -47,14 +46,54 @@ def call_gemini_fallback(text):
         Report Text:
         {text[:5000]}
         """
-        response = model.generate_content(prompt)
-        # simplistic clean up
-        content = response.text.replace('```json', '').replace('```', '').strip()
-        return json.loads(content)
+        return llm_client.generate_json_sync(prompt, validate=lambda data: isinstance(data, dict))
     except Exception as e:
         sys.stderr.write(f"Gemini fallback failed: {e}\n")
         return None
 
+def is_valid_context_reply(data):
+    """Whether a context_prompt reply carries a usable probability"""
+    return (isinstance(data, dict) and isinstance(data.get('risk_score'), (int, float))
+            and not isinstance(data['risk_score'], bool) and 0 <= data['risk_score'] <= 1)
+
+def context_prompt(disease_context, text):
+    """Prompt asking Gemini how strongly the report supports the disease the patient selected"""
+    return f"""
+                Act as a Chief Medical Officer. The patient reports a history of {disease_context}. 
+                Analyze the provided medical report text strictly for evidence of {disease_context} or related markers.
+                
+                Report Text:
+                {text[:4000]}
+                
+                Task:
+                1. Look for explicit diagnosis mentions (e.g. "known hypertensive").
+                2. Look for medication indicators (e.g. taking Amlodipine).
+                3. Look for biomarker values (e.g. BP 140/90).
+                4. Estimate a clinical probability (0.00 to 0.99) that this patient has {disease_context} based on the text.
+                   - If explicit diagnosis found: 0.95 - 0.99
+                   - If indicative values/meds found: 0.70 - 0.90
+                   - If no evidence found but patient claims it: 0.5 (Self-report weight)
+                
+                Return JSON:
+                {{
+                    "risk_score": <float>,
+                    "risk_category": "High Risk" | "Moderate Risk" | "Low Risk" | "Self Reported Only"
+                }}
+                """
+
+AVAILABLE_MODELS = ['diabetes', 'heart_disease', 'kidney_disease', 'stroke', 'hypertension', 'copd']
+
+def load_risk_predictor(models_dir=None, watch=False):
+    """
+    Registry serving every available disease model, reusable across reports
+
+    With watch=True it polls models_dir in a background thread and swaps in
+    retrained models as they are saved; a report in progress keeps scoring
+    against the models it started with.
+    """
+    registry = ModelRegistry(models_dir or current_dir, diseases=AVAILABLE_MODELS)
+    return registry.start() if watch else registry
+
 # Restore stdout for final output
 def print_json_result(data):
     sys.stdout = original_stdout
@@ -63,60 +102,74 @@ def print_json_result(data):
     print("__JSON_END__")
     sys.stdout = sys.stderr
 
-def analyze_report(file_path, disease_context="General"):
+def analyze_report(file_path, disease_context="General", predictor=None, patient_id=None, feature_store=None):
+    """
+    Analyze one report file
+    
+    predictor: a predictor from load_risk_predictor() to reuse across calls
+               (e.g. by report_worker_pool); loaded from disk when omitted.
+               A ModelRegistry is pinned to its current models for the call
+    patient_id: when given, the extracted values are saved to the patient
+                feature store and risks are scored from the patient's full
+                stored profile (earlier reports and logged vitals included)
+    """
+    context_future = None
     try:
         # Initialize processors
         report_processor = HospitalReportProcessor()
-        predictor = EnhancedChronicDiseasePredictor()
+        if predictor is None:
+            predictor = load_risk_predictor()
+        # One snapshot for the whole report, even if a reload lands meanwhile
+        predictor = getattr(predictor, 'current', predictor)
         
         # 1. Extract Data from PDF
         text = report_processor.extract_text_from_file(file_path)
         if not text:
             return {"error": "Could not extract text from file"}
-            
+
+        # Map disease selection from UI to internal model names/vitals
+        # UI: 'Diabetes', 'Heart Disease', 'Hypertension', 'COPD'
+        # Internal: 'diabetes', 'heart_disease', 'hypertension', 'copd'
+        
+        context_map = {
+            'Diabetes': 'diabetes',
+            'Heart Disease': 'heart_disease',
+            'Hypertension': 'hypertension',
+            'COPD': 'copd',
+            'Kidney Disease': 'kidney_disease'
+        }
+        
+        normalized_context = context_map.get(disease_context, 'General')
+
+        # If no local model can score the selected disease, Gemini will be asked about it
+        # anyway; start that call now so it runs while the report is mined and scored.
+        if normalized_context != 'General' and (normalized_context not in predictor.models
+                                                or not predictor.feature_names.get(normalized_context)):
+            sys.stderr.write(f"selected disease {normalized_context} has no local model. Asking Gemini...\n")
+            context_future = llm_client.submit_json(context_prompt(disease_context, text), validate=is_valid_context_reply)
+
         extracted_data = report_processor.extract_medical_data(text)
         
         # 2. Generate Patient Profile
-        patient_profile = {
-            'age': extracted_data.get('age'),
-            'gender': 1 if extracted_data.get('gender') == 'male' else 0,
-            'glucose': extracted_data.get('glucose'),
-            'blood_pressure_systolic': extracted_data.get('systolic'),
-            'blood_pressure_diastolic': extracted_data.get('diastolic'),
-            'cholesterol': extracted_data.get('cholesterol'),
-            'hdl': extracted_data.get('hdl'),
-            'heart_rate': extracted_data.get('heart_rate'),
-            'bmi': extracted_data.get('bmi'),
-        }
+        patient_profile = profile_from_extracted(extracted_data)
+        
+        if patient_id is not None:
+            store = feature_store or PatientFeatureStore()
+            observed = dict(patient_profile)
+            if extracted_data.get('gender') is None:
+                # Don't let a report without a gender overwrite a known one with the default
+                observed.pop('gender')
+            store.record(patient_id, observed, 'report', source_ref=Path(file_path).name)
+            patient_profile = {**patient_profile, **store.get_profile(patient_id)}
 
         # 3. Assess Risks
-        models_dir = current_dir
-        available_models = ['diabetes', 'heart_disease', 'kidney_disease', 'stroke', 'hypertension', 'copd']
         risks = {}
         
-        for disease in available_models:
-            model_path = models_dir / f'enhanced_chronic_disease_model_{disease}.pkl'
-            
-            if model_path.exists():
-                predictor.load_model(str(model_path), disease)
-                
-                safe_profile = {}
+        for disease in AVAILABLE_MODELS:
+            if disease in predictor.models:
                 feature_names = predictor.feature_names.get(disease, [])
                 if feature_names:
-                    for feature in feature_names:
-                        val = None
-                        if feature == 'age': val = patient_profile.get('age')
-                        elif feature == 'gender' or feature == 'sex': val = patient_profile.get('gender')
-                        elif feature == 'glucose': val = patient_profile.get('glucose')
-                        elif feature == 'bmi': val = patient_profile.get('bmi')
-                        elif feature == 'systolic' or feature == 'trestbps': val = patient_profile.get('blood_pressure_systolic')
-                        elif feature == 'diastolic': val = patient_profile.get('blood_pressure_diastolic')
-                        elif feature == 'blood_pressure': val = patient_profile.get('blood_pressure_systolic')
-                        elif feature == 'cholesterol' or feature == 'chol': val = patient_profile.get('cholesterol')
-                        elif feature == 'heart_rate' or feature == 'thalach': val = patient_profile.get('heart_rate')
-                        
-                        safe_profile[feature] = val if val is not None else np.nan
-                    
+                    safe_profile = build_model_input(patient_profile, feature_names)
                     result = predictor.predict_risk_score(safe_profile, disease)
                     if result:
                         risks[disease] = result
@@ -128,70 +181,28 @@ def analyze_report(file_path, disease_context="General"):
         
         required_vitals = set()
         
-        # Map disease selection from UI to internal model names/vitals
-        # UI: 'Diabetes', 'Heart Disease', 'Hypertension', 'COPD'
-        # Internal: 'diabetes', 'heart_disease', 'hypertension', 'copd'
-        
-        context_map = {
-            'Diabetes': 'diabetes',
-            'Heart Disease': 'heart_disease',
-            'Hypertension': 'hypertension',
-            'COPD': 'copd',
-            'Kidney Disease': 'kidney_disease'
-        }
-        
-        normalized_context = context_map.get(disease_context, 'General')
-        
         # REMOVED: Mocking logic. User wants real analysis.
         
         # Check if the selected disease was actually detected by local models
         # If not (or if we want a second opinion for the selected condition), use Gemini.
         
-        context_risk_found = False
-        if normalized_context != 'General':
-            if normalized_context in risks:
-                context_risk_found = True
-            
+        if normalized_context != 'General' and normalized_context not in risks:
             # If the selected disease wasn't found by local models (e.g. data missing from simple extraction), 
             # ask Gemini specifically to analyze the text for this condition.
-            if not context_risk_found:
+            if context_future is None:
                 sys.stderr.write(f"selected disease {normalized_context} not in local risks. Asking Gemini...\n")
-                gemini_prompt = f"""
-                Act as a Chief Medical Officer. The patient reports a history of {disease_context}. 
-                Analyze the provided medical report text strictly for evidence of {disease_context} or related markers.
-                
-                Report Text:
-                {text[:4000]}
-                
-                Task:
-                1. Look for explicit diagnosis mentions (e.g. "known hypertensive").
-                2. Look for medication indicators (e.g. taking Amlodipine).
-                3. Look for biomarker values (e.g. BP 140/90).
-                4. Estimate a clinical probability (0.00 to 0.99) that this patient has {disease_context} based on the text.
-                   - If explicit diagnosis found: 0.95 - 0.99
-                   - If indicative values/meds found: 0.70 - 0.90
-                   - If no evidence found but patient claims it: 0.5 (Self-report weight)
-                
-                Return JSON:
-                {{
-                    "risk_score": <float>,
-                    "risk_category": "High Risk" | "Moderate Risk" | "Low Risk" | "Self Reported Only"
-                }}
-                """
+                context_future = llm_client.submit_json(context_prompt(disease_context, text), validate=is_valid_context_reply)
+            
+            try:
+                gemini_data = context_future.result()
                 
-                try:
-                    model = genai.GenerativeModel('gemini-pro')
-                    response = model.generate_content(gemini_prompt)
-                    clean_resp = response.text.replace('```json', '').replace('```', '').strip()
-                    gemini_data = json.loads(clean_resp)
-                    
-                    if gemini_data.get('risk_score') is not None:
-                         risks[normalized_context] = {
-                             'risk_score': gemini_data['risk_score'],
-                             'risk_category': gemini_data.get('risk_category', 'AI Assessment')
-                         }
-                except Exception as e:
-                    sys.stderr.write(f"Gemini context analysis failed: {e}\n")
+                if gemini_data.get('risk_score') is not None:
+                     risks[normalized_context] = {
+                         'risk_score': gemini_data['risk_score'],
+                         'risk_category': gemini_data.get('risk_category', 'AI Assessment')
+                     }
+            except Exception as e:
+                sys.stderr.write(f"Gemini context analysis failed: {e}\n")
         
         # FINAL SAFEGUARD: Only use self-reported fallback if meaningful analysis failed entirely.
         if normalized_context != 'General' and normalized_context not in risks:
@@ -256,12 +267,17 @@ def analyze_report(file_path, disease_context="General"):
             "risks": {k: v['risk_category'] for k, v in risks.items()},
             "risk_scores": {k: v['risk_score'] for k, v in risks.items()},
             "recommended_vitals": final_vitals,
-            "debug_context": disease_context
+            "debug_context": disease_context,
+            "patient_id": patient_id
         }
 
     except Exception as e:
         import traceback
         return {"error": str(e), "trace": traceback.format_exc()}
+    finally:
+        # Nothing waits on the context call when the report fails early
+        if context_future is not None:
+            context_future.cancel()
 
 if __name__ == "__main__":
     try:
@@ -271,10 +287,9 @@ if __name__ == "__main__":
             
         file_path = sys.argv[1]
         disease_context = sys.argv[2] if len(sys.argv) > 2 else "General"
+        patient_id = sys.argv[3] if len(sys.argv) > 3 else None
         
-        import numpy as np 
-        
-        result = analyze_report(file_path, disease_context)
+        result = analyze_report(file_path, disease_context, patient_id=patient_id)
         print_json_result(result)
         
     except Exception as e:
@@ -0,0 +1,193 @@
+import os
+import time
+import json
+import resource
+import multiprocessing as mp
+from collections import deque
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from threadpoolctl import threadpool_limits
+
+from feature_mapping import map_columns
+from frozen_predictor import FrozenPredictor
+
+# Set in the parent before the pool forks, so workers share the loaded models
+_PREDICTOR = None
+
+
+def iter_chunks(input_path, chunk_size):
+    """Yield DataFrames of at most chunk_size rows from a CSV or Parquet file"""
+    input_path = Path(input_path)
+    if input_path.suffix.lower() in ('.parquet', '.pq'):
+        parquet_file = pq.ParquetFile(input_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(input_path, chunksize=chunk_size)
+
+
+def score_chunk(predictor, chunk, diseases, id_column=None):
+    """Scores, categories and confidence for every disease, one vectorised call per disease"""
+    result = pd.DataFrame(index=chunk.index)
+    if id_column:
+        ids = chunk[id_column]
+        if pd.api.types.is_float_dtype(ids) and ids.dropna().mod(1).eq(0).all():
+            # Integer ids read as float because this chunk has a blank one; keep them integers
+            ids = ids.astype('Int64')
+        result[id_column] = ids
+
+    for disease in diseases:
+        model = predictor.models[disease]
+        batch = model.predict_batch(map_columns(chunk, model.input_columns))
+        result[f'{disease}_risk_score'] = batch['risk_score']
+        result[f'{disease}_risk_category'] = batch['risk_category']
+        result[f'{disease}_confidence'] = batch['confidence']
+        result[f'{disease}_confidence_method'] = batch['confidence_method']
+    return result
+
+
+def _init_worker():
+    # Parallelism comes from the processes; one BLAS/OpenMP thread each avoids oversubscription
+    threadpool_limits(1)
+
+
+def _score_in_worker(chunk, diseases, id_column):
+    return score_chunk(_PREDICTOR, chunk, diseases, id_column)
+
+
+class _ResultWriter:
+    """
+    Appends result chunks to a CSV or Parquet file
+
+    The Parquet schema is fixed by the first chunk; later chunks are cast to
+    it, since a column's inferred type can differ between chunks (an integer
+    column with a null in it comes out of pandas as double).
+    """
+
+    def __init__(self, output_path):
+        self.output_path = Path(output_path)
+        self.parquet = self.output_path.suffix.lower() in ('.parquet', '.pq')
+        self._writer = None
+        self._first = True
+
+    def write(self, frame):
+        if self.parquet:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.output_path, table.schema)
+            elif not table.schema.equals(self._writer.schema):
+                table = table.cast(self._writer.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.output_path, mode='w' if self._first else 'a', header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _peak_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux; children covers the worker processes
+    parent = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    return parent, children
+
+
+def batch_score(input_path, output_path, models_dir=None, diseases=None, chunk_size=50000,
+                workers=None, id_column=None):
+    """
+    Score every row of a patient table for every disease
+
+    Args:
+        input_path: CSV or Parquet file, one patient per row
+        output_path: Result file (.csv or .parquet)
+        models_dir: Directory with the enhanced_chronic_disease_model_* models
+        diseases: Diseases to score (default: every model found)
+        chunk_size: Rows read and scored at a time
+        workers: Scoring processes (default: CPU count); 1 scores in-process
+        id_column: Input column copied to the output to identify rows
+
+    Returns:
+        Run statistics: rows, seconds, rows_per_second, peak memory
+    """
+    global _PREDICTOR
+
+    start = time.perf_counter()
+    _PREDICTOR = FrozenPredictor.from_directory(models_dir or Path(__file__).parent.absolute(), diseases)
+    diseases = _PREDICTOR.diseases
+    if not diseases:
+        raise RuntimeError("No disease models could be loaded")
+    load_seconds = time.perf_counter() - start
+
+    workers = workers or os.cpu_count() or 1
+    writer = _ResultWriter(output_path)
+    rows = 0
+    chunks = 0
+    score_start = time.perf_counter()
+
+    try:
+        if workers == 1:
+            for chunk in iter_chunks(input_path, chunk_size):
+                writer.write(score_chunk(_PREDICTOR, chunk, diseases, id_column))
+                rows += len(chunk)
+                chunks += 1
+        else:
+            # Bounded window of in-flight chunks keeps memory flat; results are written in input order
+            with mp.get_context('fork').Pool(workers, initializer=_init_worker) as pool:
+                in_flight = deque()
+                for chunk in iter_chunks(input_path, chunk_size):
+                    in_flight.append(pool.apply_async(_score_in_worker, (chunk, diseases, id_column)))
+                    rows += len(chunk)
+                    chunks += 1
+                    if len(in_flight) >= workers * 2:
+                        writer.write(in_flight.popleft().get())
+                while in_flight:
+                    writer.write(in_flight.popleft().get())
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - score_start
+    parent_peak, worker_peak = _peak_rss_bytes()
+    stats = {
+        'input': str(input_path),
+        'output': str(output_path),
+        'diseases': diseases,
+        'rows': rows,
+        'chunks': chunks,
+        'workers': workers,
+        'model_load_seconds': round(load_seconds, 3),
+        'scoring_seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed, 1) if elapsed > 0 else None,
+        'peak_rss_bytes': parent_peak,
+        'peak_worker_rss_bytes': worker_peak if workers > 1 else None
+    }
+
+    print(f"✅ Scored {rows} rows x {len(diseases)} diseases in {elapsed:.2f}s "
+          f"({stats['rows_per_second']} rows/s, {workers} workers)")
+    print(f"📊 Peak RSS: parent {parent_peak / 1e6:.1f} MB"
+          + (f", largest worker {worker_peak / 1e6:.1f} MB" if workers > 1 else ""))
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Score a CSV/Parquet table of patients for every disease')
+    parser.add_argument('input', help='CSV or Parquet file with one patient per row')
+    parser.add_argument('output', help='Result file (.csv or .parquet)')
+    parser.add_argument('--models-dir', default=str(Path(__file__).parent.absolute()))
+    parser.add_argument('--diseases', nargs='*')
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--id-column', help='Column copied to the output to identify rows')
+    parser.add_argument('--stats', help='Also write the run statistics to this JSON file')
+    args = parser.parse_args()
+
+    stats = batch_score(args.input, args.output, args.models_dir, args.diseases,
+                        args.chunk_size, args.workers, args.id_column)
+    if args.stats:
+        with open(args.stats, 'w') as f:
+            json.dump(stats, f, indent=2)
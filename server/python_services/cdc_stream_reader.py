@@ -0,0 +1,223 @@
+import os
+import json
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from fetch_engine import ConcurrentFetchEngine
+
+
+class SocrataStreamReader:
+    """
+    Paginated reader for Socrata (CDC open data) datasets.
+
+    Pages are requested with ``$limit``/``$offset`` ordered by ``:id`` so the
+    result is stable, several pages are kept in flight at once, and each page
+    is appended to a parquet file as soon as it arrives in order. Memory is
+    bounded by ``page_size * max_in_flight`` rows no matter how large the
+    extract is. All values are stored as strings, exactly as Socrata returns
+    them; typing happens when the file is loaded.
+    """
+
+    def __init__(self, resource_url='https://chronicdata.cdc.gov/resource',
+                 views_url='https://chronicdata.cdc.gov/api/views',
+                 fetch_engine=None, page_size=10000, max_in_flight=4):
+        self.resource_url = resource_url.rstrip('/')
+        self.views_url = views_url.rstrip('/')
+        self.engine = fetch_engine or ConcurrentFetchEngine(max_workers=max_in_flight)
+        self.page_size = page_size
+        self.max_in_flight = max_in_flight
+
+    def fetch_columns(self, dataset_id):
+        """Column field names from the view metadata, or None if unavailable"""
+        try:
+            response = self.engine.get(f"{self.views_url}/{dataset_id}.json")
+            columns = response.json().get('columns', [])
+            names = [col['fieldName'] for col in columns
+                     if col.get('fieldName') and not col['fieldName'].startswith(':')]
+            return names or None
+        except Exception as e:
+            print(f"⚠️ Could not read column metadata for {dataset_id}: {e}")
+            return None
+
+    def count_rows(self, dataset_id):
+        """Total row count via ``$select=count(*)``, or None if unavailable"""
+        try:
+            query = urlencode({'$select': 'count(*)'})
+            response = self.engine.get(f"{self.resource_url}/{dataset_id}.json?{query}")
+            record = response.json()[0]
+            return int(next(iter(record.values())))
+        except Exception as e:
+            print(f"⚠️ Could not count rows for {dataset_id}: {e}")
+            return None
+
+    def page_url(self, dataset_id, offset, limit=None):
+        query = urlencode({
+            '$limit': limit or self.page_size,
+            '$offset': offset,
+            '$order': ':id'
+        })
+        return f"{self.resource_url}/{dataset_id}.json?{query}"
+
+    def _fetch_page(self, dataset_id, offset, limit):
+        response = self.engine.get(self.page_url(dataset_id, offset, limit))
+        return response.json()
+
+    @staticmethod
+    def _page_to_table(records, columns):
+        """Turn one page of JSON records into a string-typed arrow table"""
+        arrays = []
+        for col in columns:
+            values = []
+            for record in records:
+                value = record.get(col)
+                if value is not None and not isinstance(value, str):
+                    value = json.dumps(value)
+                values.append(value)
+            arrays.append(pa.array(values, type=pa.string()))
+        return pa.Table.from_arrays(arrays, names=columns)
+
+    @staticmethod
+    def _new_keys(records, known):
+        """Keys used by any record in the page that aren't in known, in order of first appearance"""
+        seen = set(known)
+        keys = []
+        for record in records:
+            for key in record:
+                if key not in seen:
+                    seen.add(key)
+                    keys.append(key)
+        return keys
+
+    @staticmethod
+    def _merge_parts(parts, columns, output_path):
+        """
+        Write part files (each with a prefix of columns) into one parquet file
+
+        Columns a part lacks are filled with nulls. Parts are streamed batch by
+        batch, so memory stays bounded and every row is copied once.
+        """
+        schema = pa.schema([(col, pa.string()) for col in columns])
+        with pq.ParquetWriter(output_path, schema) as writer:
+            for part_path, part_columns in parts:
+                missing = len(columns) - len(part_columns)
+                for batch in pq.ParquetFile(part_path).iter_batches():
+                    nulls = [pa.nulls(batch.num_rows, pa.string()) for _ in range(missing)]
+                    writer.write_table(pa.Table.from_arrays(batch.columns + nulls, schema=schema))
+
+    def stream_to_parquet(self, dataset_id, output_path, max_rows=None):
+        """
+        Download every row of a dataset into a parquet file
+
+        Args:
+            dataset_id: Socrata 4x4 identifier (e.g. 'waxm-p5qv')
+            output_path: Destination parquet file, replaced atomically when complete
+            max_rows: Optional cap on the number of rows fetched
+
+        Returns:
+            Dict with the output path, rows written and pages fetched
+        """
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        columns = self.fetch_columns(dataset_id)
+        # Without view metadata the columns come from the records themselves. Socrata
+        # leaves null fields out, so any page may bring keys not seen before.
+        columns_from_records = columns is None
+        total = self.count_rows(dataset_id)
+        if max_rows is not None:
+            total = min(total, max_rows) if total is not None else max_rows
+
+        print(f"Streaming CDC dataset {dataset_id}: "
+              f"{total if total is not None else 'unknown'} rows, {self.page_size} per page")
+
+        # When a page brings new columns the current part file is closed and a
+        # wider one started; the parts are merged once at the end
+        parts = []
+        writer = None
+        rows_written = 0
+        pages = 0
+        next_offset = 0
+        exhausted = False
+        in_flight = deque()
+
+        def submit_next(executor):
+            nonlocal next_offset
+            if exhausted or (total is not None and next_offset >= total):
+                return False
+            limit = self.page_size if total is None else min(self.page_size, total - next_offset)
+            in_flight.append((next_offset, limit, executor.submit(self._fetch_page, dataset_id, next_offset, limit)))
+            next_offset += limit
+            return True
+
+        def start_part():
+            fd, part_path = tempfile.mkstemp(dir=str(output_path.parent), suffix='.parquet.tmp')
+            os.close(fd)
+            parts.append((part_path, list(columns or [])))
+            return pq.ParquetWriter(part_path, pa.schema([(col, pa.string()) for col in columns or []]))
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+                while len(in_flight) < self.max_in_flight and submit_next(executor):
+                    pass
+
+                # Consume pages strictly in offset order so the file is ordered by :id
+                while in_flight:
+                    offset, limit, future = in_flight.popleft()
+                    records = future.result()
+
+                    if records:
+                        if columns is None:
+                            columns = self._new_keys(records, ())
+                        elif columns_from_records and writer is not None:
+                            new_columns = self._new_keys(records, columns)
+                            if new_columns:
+                                print(f"➕ New columns at row {offset}: {', '.join(new_columns)}; starting a wider part")
+                                writer.close()
+                                writer = None
+                                columns = columns + new_columns
+                        if writer is None:
+                            writer = start_part()
+                        writer.write_table(self._page_to_table(records, columns))
+                        rows_written += len(records)
+                        pages += 1
+
+                    # A short page means we have reached the end of the dataset
+                    if len(records) < limit:
+                        exhausted = True
+                        for _, _, pending in in_flight:
+                            pending.cancel()
+                        in_flight.clear()
+                        break
+
+                    submit_next(executor)
+
+            if writer is None and not parts:
+                writer = start_part()
+            if writer is not None:
+                writer.close()
+                writer = None
+
+            if len(parts) == 1:
+                os.replace(parts[0][0], output_path)
+            else:
+                fd, merged_path = tempfile.mkstemp(dir=str(output_path.parent), suffix='.parquet.tmp')
+                os.close(fd)
+                merging = list(parts)
+                # Listed with the parts so a failed merge is cleaned up too
+                parts.append((merged_path, columns))
+                self._merge_parts(merging, columns, merged_path)
+                os.replace(merged_path, output_path)
+        finally:
+            if writer is not None:
+                writer.close()
+            for part_path, _ in parts:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+
+        print(f"✓ CDC data streamed: {rows_written} rows in {pages} pages -> {output_path}")
+        return {'path': output_path, 'rows': rows_written, 'pages': pages}
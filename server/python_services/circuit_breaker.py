@@ -0,0 +1,308 @@
+import os
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from data_paths import data_path
+
+# Shared by every process on the host: one-shot analyze_input runs, the vitals
+# worker and forked report workers all see the same circuit per endpoint
+DEFAULT_DB_PATH = os.getenv('CARESYNC_LLM_DB') or data_path('llm_state.db')
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS circuit_breakers (
+    name TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    changed_at REAL NOT NULL,
+    probes INTEGER NOT NULL DEFAULT 0,
+    times_opened INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE TABLE IF NOT EXISTS circuit_calls (
+    name TEXT NOT NULL,
+    finished_at REAL NOT NULL,
+    latency REAL NOT NULL,
+    ok INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_circuit_calls ON circuit_calls (name, finished_at);
+"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker over a rolling window of calls, with state shared through SQLite.
+
+    Closed: calls go through and each outcome and latency is recorded. Once
+    the window holds at least min_calls, the circuit opens if the error rate
+    or the share of calls slower than slow_call_seconds reaches its threshold.
+    Open: calls are refused straight away (allow() is False) for cooldown
+    seconds, so callers fall back without waiting on a failing service.
+    Half-open: up to half_open_calls probe calls are let through; a success
+    closes the circuit with a fresh window, a failure opens it again.
+    """
+
+    def __init__(self, name, db_path=None, window_seconds=60.0, min_calls=5, error_rate=0.5,
+                 slow_call_seconds=10.0, slow_call_rate=0.5, cooldown=30.0, half_open_calls=1):
+        """
+        Args:
+            name: Circuit name, e.g. one per LLM endpoint
+            db_path: SQLite file holding the shared state (default: CARESYNC_LLM_DB or llm_state.db in the data directory)
+            window_seconds: Age of the oldest call in the rolling window
+            min_calls: Calls in the window before it can trip
+            error_rate: Failed share of the window that opens the circuit
+            slow_call_seconds: Latency at which a successful call counts as slow
+            slow_call_rate: Slow share of the window that opens the circuit
+            cooldown: Seconds the circuit stays open before probing
+            half_open_calls: Probe calls let through while half-open
+        """
+        self.name = name
+        self.db_path = str(db_path or DEFAULT_DB_PATH)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.cooldown = cooldown
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    def _connection(self):
+        # A connection must not cross a fork; each process opens its own
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            conn.execute(
+                "INSERT OR IGNORE INTO circuit_breakers (name, state, changed_at) VALUES (?, ?, ?)",
+                (self.name, CLOSED, time.time())
+            )
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    def _transaction(self, work):
+        """Run work(conn, now) under the breaker's write lock, shared with every other process"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = work(conn, time.time())
+                conn.execute('COMMIT')
+                return result
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def _row(self, conn):
+        return conn.execute(
+            "SELECT state, changed_at, probes FROM circuit_breakers WHERE name = ?", (self.name,)
+        ).fetchone()
+
+    def _set_state(self, conn, state, now, last_error=None):
+        opened = 1 if state == OPEN else 0
+        conn.execute(
+            "UPDATE circuit_breakers SET state = ?, changed_at = ?, probes = 0, "
+            "times_opened = times_opened + ?, last_error = COALESCE(?, last_error) WHERE name = ?",
+            (state, now, opened, last_error, self.name)
+        )
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._row(self._connection())[0]
+
+    def allow(self):
+        """Whether a call may go ahead now; claims a probe slot when half-open"""
+        with self._lock:
+            state, changed_at, _ = self._row(self._connection())
+        if state == CLOSED:
+            return True
+        if state == OPEN and time.time() - changed_at < self.cooldown:
+            return False
+
+        def claim_probe(conn, now):
+            state, changed_at, probes = self._row(conn)
+            if state == CLOSED:
+                return True
+            if state == OPEN:
+                if now - changed_at < self.cooldown:
+                    return False
+                self._set_state(conn, HALF_OPEN, now)
+                probes = 0
+            elif probes >= self.half_open_calls and now - changed_at < self.cooldown:
+                # Probes in flight; one that never reported back (its process died) expires after a cooldown
+                return False
+            elif probes >= self.half_open_calls:
+                probes = 0
+            conn.execute(
+                "UPDATE circuit_breakers SET probes = ?, changed_at = ? WHERE name = ?",
+                (probes + 1, now, self.name)
+            )
+            return True
+
+        return self._transaction(claim_probe)
+
+    def record(self, latency, ok, error=None):
+        """Record a finished call and move the circuit if the window says so"""
+        def update(conn, now):
+            conn.execute(
+                "INSERT INTO circuit_calls (name, finished_at, latency, ok) VALUES (?, ?, ?, ?)",
+                (self.name, now, latency, int(ok))
+            )
+            conn.execute(
+                "DELETE FROM circuit_calls WHERE name = ? AND finished_at < ?", (self.name, now - self.window_seconds)
+            )
+            state = self._row(conn)[0]
+            slow = latency >= self.slow_call_seconds
+            if state == HALF_OPEN:
+                if ok and not slow:
+                    # Forget the failures that opened the circuit
+                    conn.execute("DELETE FROM circuit_calls WHERE name = ? AND finished_at < ?", (self.name, now))
+                    self._set_state(conn, CLOSED, now)
+                else:
+                    self._set_state(conn, OPEN, now, error or 'slow probe call')
+            elif state == CLOSED:
+                calls, errors, slow_calls = conn.execute(
+                    "SELECT COUNT(*), SUM(1 - ok), SUM(ok AND latency >= ?) FROM circuit_calls WHERE name = ?",
+                    (self.slow_call_seconds, self.name)
+                ).fetchone()
+                if calls >= self.min_calls and (
+                        errors / calls >= self.error_rate or slow_calls / calls >= self.slow_call_rate):
+                    self._set_state(conn, OPEN, now, error or f'{slow_calls} of {calls} calls slower than '
+                                                               f'{self.slow_call_seconds:g}s')
+
+        self._transaction(update)
+
+    def release(self):
+        """Give back a probe slot claimed by allow() for a call that ended without an outcome to record"""
+        def give_back(conn, now):
+            state, _, probes = self._row(conn)
+            if state == HALF_OPEN and probes > 0:
+                conn.execute("UPDATE circuit_breakers SET probes = ? WHERE name = ?", (probes - 1, self.name))
+
+        self._transaction(give_back)
+
+    def reset(self):
+        """Force the circuit closed with an empty window"""
+        def clear(conn, now):
+            conn.execute("DELETE FROM circuit_calls WHERE name = ?", (self.name,))
+            self._set_state(conn, CLOSED, now)
+
+        self._transaction(clear)
+
+    def snapshot(self):
+        """State and rolling-window error rate and latency, for monitoring"""
+        with self._lock:
+            conn = self._connection()
+            state, changed_at, probes, times_opened, last_error = conn.execute(
+                "SELECT state, changed_at, probes, times_opened, last_error FROM circuit_breakers WHERE name = ?",
+                (self.name,)
+            ).fetchone()
+            rows = conn.execute(
+                "SELECT latency, ok FROM circuit_calls WHERE name = ? AND finished_at >= ?",
+                (self.name, time.time() - self.window_seconds)
+            ).fetchall()
+
+        window = {'calls': len(rows), 'errors': 0, 'error_rate': 0.0, 'slow_calls': 0}
+        if rows:
+            latency, ok = np.asarray(rows, dtype=float).T
+            ms = latency * 1000
+            window.update({
+                'errors': int((ok == 0).sum()),
+                'error_rate': float((ok == 0).mean()),
+                'slow_calls': int(((ok == 1) & (latency >= self.slow_call_seconds)).sum()),
+                'mean_ms': round(float(ms.mean()), 3),
+                'p50_ms': round(float(np.percentile(ms, 50)), 3),
+                'p95_ms': round(float(np.percentile(ms, 95)), 3)
+            })
+        return {
+            'name': self.name,
+            'state': state,
+            'since': changed_at,
+            'retry_in_seconds': max(0.0, round(changed_at + self.cooldown - time.time(), 3)) if state == OPEN else 0.0,
+            'probes_in_flight': probes,
+            'times_opened': times_opened,
+            'last_error': last_error,
+            'window_seconds': self.window_seconds,
+            'window': window
+        }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name, **config):
+    """
+    The process-wide breaker for a name (its state is shared with other processes anyway)
+
+    Thresholds default to the LLM_BREAKER_* environment variables.
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            defaults = {
+                'window_seconds': float(os.getenv('LLM_BREAKER_WINDOW_SECONDS', '60')),
+                'min_calls': int(os.getenv('LLM_BREAKER_MIN_CALLS', '5')),
+                'error_rate': float(os.getenv('LLM_BREAKER_ERROR_RATE', '0.5')),
+                'slow_call_seconds': float(os.getenv('LLM_BREAKER_SLOW_CALL_SECONDS', '10')),
+                'slow_call_rate': float(os.getenv('LLM_BREAKER_SLOW_CALL_RATE', '0.5')),
+                'cooldown': float(os.getenv('LLM_BREAKER_COOLDOWN_SECONDS', '30'))
+            }
+            breaker = _breakers[name] = CircuitBreaker(name, **{**defaults, **config})
+        return breaker
+
+
+def breaker_snapshots(db_path=None):
+    """Snapshots of every circuit recorded in the database"""
+    db_path = str(db_path or DEFAULT_DB_PATH)
+    if not Path(db_path).exists():
+        return []
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        names = [row[0] for row in conn.execute("SELECT name FROM circuit_breakers ORDER BY name")]
+    except sqlite3.OperationalError:
+        names = []
+    finally:
+        conn.close()
+    return [
+        (get_breaker(name) if db_path == DEFAULT_DB_PATH else CircuitBreaker(name, db_path)).snapshot()
+        for name in names
+    ]
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or reset the shared LLM circuit breakers")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    status_parser = subparsers.add_parser('status', help='Show every circuit')
+    status_parser.add_argument('--json', action='store_true')
+    reset_parser = subparsers.add_parser('reset', help='Force a circuit closed')
+    reset_parser.add_argument('name')
+    args = parser.parse_args()
+
+    if args.command == 'reset':
+        CircuitBreaker(args.name, args.db).reset()
+        print(f"✅ {args.name} closed")
+    else:
+        snapshots = breaker_snapshots(args.db)
+        if args.json:
+            print(json.dumps(snapshots, indent=2))
+        for snapshot in [] if args.json else snapshots:
+            window = snapshot['window']
+            icon = {CLOSED: '✅', HALF_OPEN: '⚠️', OPEN: '❌'}[snapshot['state']]
+            print(f"{icon} {snapshot['name']}: {snapshot['state']} "
+                  f"({window['calls']} calls in {snapshot['window_seconds']:g}s, "
+                  f"error rate {window['error_rate']:.0%}, p95 {window.get('p95_ms', 0):.0f} ms)")
+            if snapshot['last_error']:
+                print(f"   last error: {snapshot['last_error']}")
@@ -0,0 +1,11 @@
+import os
+from pathlib import Path
+
+# Runtime state (patient features, LLM circuit/cache state, downloaded datasets)
+# is kept out of the source tree; CARESYNC_DATA_DIR moves all of it at once
+DATA_DIR = Path(os.getenv('CARESYNC_DATA_DIR') or Path(__file__).parent.parent.absolute() / 'data')
+
+
+def data_path(*parts):
+    """Path under the data directory, as a string"""
+    return str(DATA_DIR.joinpath(*parts))
@@ -0,0 +1,300 @@
+import os
+import json
+import hashlib
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta
+import pandas as pd
+import numpy as np
+
+from data_paths import data_path
+
+
+class LocalDatasetStore:
+    """
+    Content-addressed local store for downloaded datasets.
+
+    Every dataset is written once as a parquet object named after the hash of
+    its contents (``objects/<sha256>.parquet``). A small JSON index maps a
+    ``{disease}:{source}`` key to the object it currently points at, together
+    with the fetch time, TTL and pin flag. Pinned entries never expire, which
+    is how build machines without network access are expected to train.
+    """
+
+    INDEX_VERSION = 1
+
+    def __init__(self, cache_dir=None, default_ttl_hours=24 * 7):
+        self.cache_dir = Path(cache_dir or data_path('dataset_cache'))
+        self.objects_dir = self.cache_dir / 'objects'
+        self.index_file = self.cache_dir / 'index.json'
+        self.default_ttl = timedelta(hours=default_ttl_hours) if default_ttl_hours is not None else None
+        self._lock = threading.Lock()
+
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.index = self._load_index()
+
+    # ------------------------------------------------------------------
+    # Index handling
+    # ------------------------------------------------------------------
+    def _load_index(self):
+        """Load the dataset index, starting fresh if it is missing or corrupt"""
+        if not self.index_file.exists():
+            return {'version': self.INDEX_VERSION, 'entries': {}}
+
+        try:
+            with open(self.index_file, 'r') as f:
+                index = json.load(f)
+            index.setdefault('entries', {})
+            return index
+        except Exception as e:
+            print(f"⚠️ Dataset index unreadable, starting fresh: {e}")
+            return {'version': self.INDEX_VERSION, 'entries': {}}
+
+    def _save_index(self):
+        """Write the index atomically so readers never see a partial file"""
+        fd, tmp_path = tempfile.mkstemp(dir=str(self.cache_dir), prefix='.index-', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_path, self.index_file)
+
+    @staticmethod
+    def make_key(disease, source_name):
+        return f"{disease}:{source_name}"
+
+    # ------------------------------------------------------------------
+    # Content addressing
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _normalize_types(df):
+        """Give object columns a single type so they round-trip through parquet"""
+        df = df.infer_objects()
+        for col in df.columns:
+            if df[col].dtype == object:
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        df.columns = [str(col) for col in df.columns]
+        return df
+
+    @staticmethod
+    def content_hash(df):
+        """Stable hash over column names, dtypes and row values"""
+        digest = hashlib.sha256()
+        digest.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode('utf-8'))
+        row_hashes = pd.util.hash_pandas_object(df, index=False).values
+        digest.update(np.ascontiguousarray(row_hashes).tobytes())
+        return digest.hexdigest()
+
+    def _object_path(self, digest):
+        return self.objects_dir / f"{digest}.parquet"
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def put(self, disease, source, df, ttl_hours=None, pin=None):
+        """Store a dataset and point the ``disease:source`` key at it"""
+        df = self._normalize_types(df)
+        digest = self.content_hash(df)
+        object_path = self._object_path(digest)
+
+        if not object_path.exists():
+            fd, tmp_path = tempfile.mkstemp(dir=str(self.objects_dir), suffix='.parquet.tmp')
+            os.close(fd)
+            try:
+                df.to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, object_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        key = self.make_key(disease, source['name'])
+        with self._lock:
+            previous = self.index['entries'].get(key, {})
+            self.index['entries'][key] = {
+                'disease': disease,
+                'source': source,
+                'object': digest,
+                'rows': int(df.shape[0]),
+                'columns': {str(c): str(t) for c, t in df.dtypes.items()},
+                'fetched_at': datetime.now().isoformat(),
+                'ttl_hours': ttl_hours if ttl_hours is not None else previous.get('ttl_hours'),
+                'pinned': pin if pin is not None else previous.get('pinned', False)
+            }
+            self._save_index()
+
+        print(f"💾 Dataset stored: {key} -> {object_path.name}")
+        return digest
+
+    def is_fresh(self, entry):
+        """Check whether an index entry is pinned or still within its TTL"""
+        if entry.get('pinned'):
+            return True
+
+        ttl_hours = entry.get('ttl_hours')
+        ttl = timedelta(hours=ttl_hours) if ttl_hours is not None else self.default_ttl
+        if ttl is None:
+            return True
+
+        fetched_at = datetime.fromisoformat(entry['fetched_at'])
+        return datetime.now() - fetched_at < ttl
+
+    def lookup(self, disease, source_name=None, allow_stale=False):
+        """
+        Find the best cached entry for a disease
+
+        Args:
+            disease: Disease type
+            source_name: Restrict to a specific source, otherwise any source
+            allow_stale: Return expired entries too (used in offline mode)
+        """
+        # put/pin/prune mutate the index from fetcher threads; read a consistent copy
+        with self._lock:
+            entries = [dict(entry) for entry in self.index['entries'].values()]
+
+        candidates = []
+        for entry in entries:
+            if entry.get('disease') != disease:
+                continue
+            if source_name and entry['source'].get('name') != source_name:
+                continue
+            if not self._object_path(entry['object']).exists():
+                continue
+            if not allow_stale and not self.is_fresh(entry):
+                continue
+            candidates.append(entry)
+
+        if not candidates:
+            return None
+
+        # Pinned entries win, then the most recently fetched
+        candidates.sort(key=lambda e: (e.get('pinned', False), e['fetched_at']), reverse=True)
+        return candidates[0]
+
+    def get_path(self, disease, source_name=None, allow_stale=False):
+        """Path of the parquet object for a disease, for streaming readers"""
+        entry = self.lookup(disease, source_name, allow_stale)
+        if entry is None:
+            return None
+        return self._object_path(entry['object'])
+
+    def get(self, disease, source_name=None, allow_stale=False, columns=None):
+        """Load a cached dataset; returns (DataFrame, source) or (None, None)"""
+        entry = self.lookup(disease, source_name, allow_stale)
+        if entry is None:
+            return None, None
+
+        try:
+            df = pd.read_parquet(self._object_path(entry['object']), columns=columns)
+            return df, entry['source']
+        except Exception as e:
+            print(f"❌ Error reading cached dataset for {disease}: {e}")
+            return None, None
+
+    def pin(self, disease, source_name, pinned=True):
+        """Pin (or unpin) an entry so it never expires"""
+        key = self.make_key(disease, source_name)
+        with self._lock:
+            if key not in self.index['entries']:
+                print(f"❌ No cached dataset for {key}")
+                return False
+            self.index['entries'][key]['pinned'] = pinned
+            self._save_index()
+
+        print(f"📌 {'Pinned' if pinned else 'Unpinned'} dataset: {key}")
+        return True
+
+    def unpin(self, disease, source_name):
+        return self.pin(disease, source_name, pinned=False)
+
+    def import_file(self, disease, source, file_path, pin=True):
+        """Seed the store from a local CSV or parquet file (e.g. for offline machines)"""
+        file_path = Path(file_path)
+        if file_path.suffix.lower() == '.parquet':
+            df = pd.read_parquet(file_path)
+        else:
+            df = pd.read_csv(file_path, names=source.get('columns'))
+        return self.put(disease, source, df, pin=pin)
+
+    def prune(self):
+        """Drop expired unpinned entries and delete objects nothing points at"""
+        with self._lock:
+            expired = [key for key, entry in self.index['entries'].items() if not self.is_fresh(entry)]
+            for key in expired:
+                del self.index['entries'][key]
+            self._save_index()
+
+            referenced = {entry['object'] for entry in self.index['entries'].values()}
+
+        removed_objects = 0
+        for object_path in self.objects_dir.glob('*.parquet'):
+            if object_path.stem not in referenced:
+                object_path.unlink()
+                removed_objects += 1
+
+        print(f"🧹 Pruned {len(expired)} expired entries and {removed_objects} unreferenced objects")
+        return {'expired_entries': expired, 'removed_objects': removed_objects}
+
+    def list_entries(self):
+        """List cached datasets with freshness information"""
+        with self._lock:
+            snapshot = sorted((key, dict(entry)) for key, entry in self.index['entries'].items())
+
+        entries = []
+        for key, entry in snapshot:
+            entries.append({
+                'key': key,
+                'rows': entry.get('rows'),
+                'object': entry['object'][:12],
+                'fetched_at': entry['fetched_at'],
+                'pinned': entry.get('pinned', False),
+                'fresh': self.is_fresh(entry)
+            })
+        return entries
+
+    def clear(self):
+        """Remove every cached object and reset the index"""
+        with self._lock:
+            shutil.rmtree(self.objects_dir, ignore_errors=True)
+            self.objects_dir.mkdir(parents=True, exist_ok=True)
+            self.index = {'version': self.INDEX_VERSION, 'entries': {}}
+            self._save_index()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inspect and manage the local dataset store')
+    parser.add_argument('--cache-dir', default=data_path('dataset_cache'))
+    subparsers = parser.add_subparsers(dest='command')
+
+    subparsers.add_parser('list', help='List cached datasets')
+    subparsers.add_parser('prune', help='Remove expired entries and orphaned objects')
+
+    pin_parser = subparsers.add_parser('pin', help='Pin a dataset so it never expires')
+    pin_parser.add_argument('disease')
+    pin_parser.add_argument('source_name')
+
+    unpin_parser = subparsers.add_parser('unpin', help='Let a pinned dataset expire again')
+    unpin_parser.add_argument('disease')
+    unpin_parser.add_argument('source_name')
+
+    import_parser = subparsers.add_parser('import', help='Seed the store from a local file')
+    import_parser.add_argument('disease')
+    import_parser.add_argument('source_name')
+    import_parser.add_argument('file_path')
+
+    args = parser.parse_args()
+    store = LocalDatasetStore(args.cache_dir)
+
+    if args.command == 'pin':
+        store.pin(args.disease, args.source_name)
+    elif args.command == 'unpin':
+        store.unpin(args.disease, args.source_name)
+    elif args.command == 'prune':
+        store.prune()
+    elif args.command == 'import':
+        store.import_file(args.disease, {'name': args.source_name, 'type': 'local_file'}, args.file_path)
+    else:
+        for entry in store.list_entries():
+            flags = ('📌 ' if entry['pinned'] else '') + ('fresh' if entry['fresh'] else 'stale')
+            print(f"{entry['key']:<45} {entry['rows']:>9} rows  {entry['object']}  {entry['fetched_at']}  {flags}")
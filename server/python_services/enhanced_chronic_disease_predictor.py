@@ -3,7 +3,12 @@ import numpy as np
 import json
 from datetime import datetime
 from pathlib import Path
+import os
 import pickle
+import hashlib
+import tempfile
+import time
+import threading
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -24,10 +29,14 @@ import seaborn as sns
 
 # Import our multi-API fetcher
 from multi_api_dataset_fetcher import MultiAPIDatasetFetcher
+from model_artifacts import save_artifact, load_artifact, is_artifact_dir, load_versioned_pickle
+from model_distillation import distill_model
+from model_explanations import build_explainer, explain_in_probability, top_factors
 
 class EnhancedChronicDiseasePredictor:
-    def __init__(self):
-        self.fetcher = MultiAPIDatasetFetcher()
+    def __init__(self, offline=None):
+        # offline=True trains purely from the local dataset store (no network access)
+        self.fetcher = MultiAPIDatasetFetcher(offline=offline)
         self.models = {}
         self.scalers = {}
         self.imputers = {}
@@ -35,6 +44,45 @@ class EnhancedChronicDiseasePredictor:
         self.label_encoders = {}
         self.feature_names = {}
         self.model_metadata = {}
+        # Content version of each loaded/saved model, returned with every prediction
+        self.model_versions = {}
+        # Versioned artifacts loaded with lazy=True, unpickled on first prediction
+        self._lazy_artifacts = {}
+        
+        # Cheap student models distilled from slow ensembles; served only when
+        # their fidelity to the full model passes distillation_config
+        self.student_models = {}
+        self.serve_student_models = True
+        self.distillation_config = {
+            'enabled': True,
+            'min_category_agreement': 0.98,
+            'max_mean_abs_gap': 0.02
+        }
+        
+        # Cascade scoring: the student scores first and the full model only runs
+        # when the student's probability is within `margin` of a category boundary
+        self.cascade_config = {
+            'enabled': False,
+            'margin': 0.05
+        }
+        self.cascade_stats = {}
+        self._cascade_lock = threading.Lock()
+        
+        # Per-prediction attribution structures ({'full': ..., 'student': ...}),
+        # precomputed after training and saved with the model
+        self.explainers = {}
+        
+        # How train_advanced_model picks the final model among the candidates:
+        #   'max_auc'       - highest test AUC
+        #   'auc_tolerance' - fastest model within auc_tolerance of the best AUC
+        #   'auc_per_ms'    - best AUC per millisecond of p99 single-row latency
+        # Models slower than p99_latency_ms (if set) are only chosen when none fit the budget.
+        self.selection_objective = {
+            'type': 'max_auc',
+            'p99_latency_ms': None,
+            'auc_tolerance': 0.002,
+            'latency_sample_rows': 200
+        }
         
         # Risk thresholds for different diseases
         self.risk_thresholds = {
@@ -194,33 +242,32 @@ class EnhancedChronicDiseasePredictor:
             print("❌ Could not identify target column for kidney disease dataset")
             return None, None, None
         
-        # Clean the dataset first
-        df_clean = df.copy()
-        
-        # Remove the ID column if present
-        if 'id' in df_clean.columns:
-            df_clean = df_clean.drop('id', axis=1)
-        
-        # Replace '?' and other missing value indicators with NaN
-        df_clean = df_clean.replace(['?', '\t?', 'ckd\t', ' yes', '\tno', '\tyes'], [None, None, 'ckd', 'yes', 'no', 'yes'])
+        # Drop the target and ID column in one step; this is the only copy of the frame
+        X = df.drop(columns=[target_column, 'id'], errors='ignore')
+        y = df[target_column]
         
-        X = df_clean.drop(target_column, axis=1)
-        y = df_clean[target_column]
+        # Replace '?' and other missing value indicators with NaN, column by column
+        missing_markers = {'?': None, '\t?': None, 'ckd\t': 'ckd', ' yes': 'yes', '\tno': 'no', '\tyes': 'yes'}
+        for col in X.columns:
+            if isinstance(X[col].dtype, pd.CategoricalDtype):
+                X[col] = X[col].astype(object)
+            if X[col].dtype == object or pd.api.types.is_string_dtype(X[col].dtype):
+                X[col] = X[col].replace(missing_markers)
+                # Numeric columns polluted by '?' become numeric again once it is gone
+                converted = pd.to_numeric(X[col], errors='coerce')
+                if converted.notna().sum() == X[col].notna().sum():
+                    X[col] = converted.astype('float32')
         
         # Convert target to binary (ckd=1, notckd=0)
-        if y.dtype == 'object':
-            y = y.map({'ckd': 1, 'notckd': 0}).fillna(0)
+        if not pd.api.types.is_numeric_dtype(y.dtype):
+            y = y.astype(object).replace(missing_markers).map({'ckd': 1, 'notckd': 0}).fillna(0)
         
         # Clean categorical columns that have inconsistent values
         categorical_cols = ['rbc', 'pc', 'pcc', 'ba', 'htn', 'dm', 'cad', 'appet', 'pe', 'ane']
         for col in categorical_cols:
             if col in X.columns:
                 # Standardize categorical values
-                X[col] = X[col].astype(str).str.strip()
-                X[col] = X[col].replace({'abnormal': 'abnormal', 'normal': 'normal', 
-                                       'present': 'present', 'notpresent': 'notpresent',
-                                       'yes': 'yes', 'no': 'no',
-                                       'good': 'good', 'poor': 'poor'})
+                X[col] = X[col].astype(str).str.strip().astype('category')
         
         return X, y, target_column
     
@@ -276,31 +323,19 @@ class EnhancedChronicDiseasePredictor:
             print("❌ Could not identify target column for COPD dataset")
             return None, None, None
         
-        # Clean the dataset first
-        df_clean = df.copy()
-        
-        # Remove unnecessary columns
-        columns_to_drop = ['Unnamed: 0', 'ID']
-        for col in columns_to_drop:
-            if col in df_clean.columns:
-                df_clean = df_clean.drop(col, axis=1)
+        # Drop the target and unnecessary columns in one step (a single copy)
+        X = df.drop(columns=[target_column, 'Unnamed: 0', 'ID'], errors='ignore')
+        y = df[target_column]
         
         if target_column == 'copd':
             # For 'copd' column: Convert multiclass (1,2,3,4) to binary (1,2 = 0, 3,4 = 1)
-            X = df_clean.drop(target_column, axis=1)
-            y = df_clean[target_column]
             # Convert to binary: 1,2 = mild/moderate (0), 3,4 = severe/very severe (1)
             y = (y >= 3).astype(int)
         elif target_column == 'COPDSEVERITY':
             # For severity: Convert text categories to binary
-            X = df_clean.drop(target_column, axis=1)
-            y = df_clean[target_column]
             # Convert to binary: MILD/MODERATE = 0, SEVERE/VERY SEVERE = 1
             severity_map = {'MILD': 0, 'MODERATE': 0, 'SEVERE': 1, 'VERY SEVERE': 1}
-            y = y.map(severity_map).fillna(0)
-        else:
-            X = df_clean.drop(target_column, axis=1)
-            y = df_clean[target_column]
+            y = y.astype(object).map(severity_map).fillna(0)
         
         return X, y, target_column
     
@@ -314,7 +349,13 @@ class EnhancedChronicDiseasePredictor:
         
         # Identify column types
         numeric_columns = X_train_copy.select_dtypes(include=[np.number]).columns
-        categorical_columns = X_train_copy.select_dtypes(include=['object', 'category']).columns
+        categorical_columns = X_train_copy.select_dtypes(include=['object', 'string', 'category']).columns
+        
+        # Compact categoricals from the loader are imputed and encoded as plain labels
+        for col in categorical_columns:
+            if isinstance(X_train_copy[col].dtype, pd.CategoricalDtype):
+                X_train_copy[col] = X_train_copy[col].astype(object)
+                X_test_copy[col] = X_test_copy[col].astype(object)
         
         # Handle missing values separately for numeric and categorical
         if len(numeric_columns) > 0:
@@ -477,32 +518,112 @@ class EnhancedChronicDiseasePredictor:
         
         print(f"🎯 Ensemble model - Accuracy: {ensemble_accuracy:.4f}, AUC: {ensemble_auc:.4f}")
         
-        # Use ensemble if it performs better, otherwise use best individual model
-        if ensemble_auc > model_scores[best_model_name]['auc_score']:
-            final_model = ensemble_model
-            final_score = ensemble_auc
-            print(f"✅ Using ensemble model")
-        else:
-            final_model = best_model
-            final_score = model_scores[best_model_name]['auc_score']
-            print(f"✅ Using {best_model_name} model")
+        # The ensemble competes with the individual models; listed last so ties keep the simpler model
+        model_scores['ensemble'] = {
+            'accuracy': ensemble_accuracy,
+            'auc_score': ensemble_auc,
+            'model': ensemble_model
+        }
+        
+        # Measure serving cost of every candidate
+        print("⏱️ Measuring inference latency...")
+        for name, scores in model_scores.items():
+            scores.update(self._measure_inference_cost(scores['model'], X_test_processed))
+            print(f"    {name}: p99 {scores['p99_latency_ms']:.2f} ms/row, "
+                  f"batch {scores['batch_latency_ms']:.1f} ms, {scores['serialized_bytes'] / 1024:.0f} KB")
+        
+        final_name = self._select_model(model_scores)
+        final_model = model_scores[final_name]['model']
+        final_score = model_scores[final_name]['auc_score']
+        print(f"✅ Using {final_name} model (objective: {self.selection_objective['type']})")
         
         # Store model and metadata
         self.models[disease] = final_model
         self.model_metadata[disease] = {
-            'model_type': 'ensemble' if ensemble_auc > model_scores[best_model_name]['auc_score'] else best_model_name,
-            'accuracy': ensemble_accuracy if ensemble_auc > model_scores[best_model_name]['auc_score'] else model_scores[best_model_name]['accuracy'],
+            'model_type': final_name,
+            'accuracy': model_scores[final_name]['accuracy'],
             'auc_score': final_score,
             'training_date': datetime.now().isoformat(),
             'feature_count': X_train_processed.shape[1],
-            'training_samples': X_train_processed.shape[0]
+            'training_samples': X_train_processed.shape[0],
+            'selection_objective': dict(self.selection_objective),
+            'inference_latency': {
+                key: model_scores[final_name][key]
+                for key in ['p50_latency_ms', 'p99_latency_ms', 'batch_latency_ms', 'batch_rows', 'serialized_bytes']
+            },
+            'candidates': {
+                name: {key: value for key, value in scores.items() if key != 'model'}
+                for name, scores in model_scores.items()
+            }
         }
         
+        # Distill anything slower than a linear model into a cheap student
+        self.student_models.pop(disease, None)
+        if self.distillation_config.get('enabled') and not isinstance(final_model, LogisticRegression):
+            distill_model(self, disease, X_train_processed, X_test_processed)
+            cascade_report = self.evaluate_cascade(X_test_processed, disease)
+            self.model_metadata[disease]['cascade'] = cascade_report
+            print(f"🪜 Cascade (margin {cascade_report['margin']}): {cascade_report['escalation_rate']:.1%} escalated, "
+                  f"{cascade_report['category_agreement']:.2%} category agreement with full scoring")
+        
+        self._build_explainers(disease, X_train_processed.mean(axis=0))
+        
         # Generate detailed report
         self._generate_model_report(y_test, ensemble_pred, ensemble_pred_proba, disease)
         
         return final_model
     
+    def _measure_inference_cost(self, model, X_sample):
+        """Per-row and batch predict_proba latency plus pickled size of a model"""
+        n_rows = min(self.selection_objective.get('latency_sample_rows', 200), X_sample.shape[0])
+        
+        # Warm up caches and lazily built attributes before timing
+        model.predict_proba(X_sample[:1])
+        
+        row_timings = []
+        for i in range(n_rows):
+            start = time.perf_counter()
+            model.predict_proba(X_sample[i:i + 1])
+            row_timings.append((time.perf_counter() - start) * 1000)
+        
+        start = time.perf_counter()
+        model.predict_proba(X_sample)
+        batch_ms = (time.perf_counter() - start) * 1000
+        
+        return {
+            'p50_latency_ms': float(np.percentile(row_timings, 50)),
+            'p99_latency_ms': float(np.percentile(row_timings, 99)),
+            'batch_latency_ms': batch_ms,
+            'batch_rows': int(X_sample.shape[0]),
+            'serialized_bytes': len(pickle.dumps(model))
+        }
+    
+    def _select_model(self, model_scores):
+        """Pick the final model name according to self.selection_objective"""
+        objective = self.selection_objective
+        names = list(model_scores.keys())
+        
+        budget = objective.get('p99_latency_ms')
+        if budget is not None:
+            within_budget = [name for name in names if model_scores[name]['p99_latency_ms'] <= budget]
+            if within_budget:
+                names = within_budget
+            else:
+                fastest = min(names, key=lambda name: model_scores[name]['p99_latency_ms'])
+                print(f"⚠️ No model meets the {budget} ms p99 budget; using the fastest ({fastest})")
+                return fastest
+        
+        objective_type = objective.get('type', 'max_auc')
+        if objective_type == 'auc_tolerance':
+            best_auc = max(model_scores[name]['auc_score'] for name in names)
+            tolerance = objective.get('auc_tolerance', 0.0)
+            eligible = [name for name in names if model_scores[name]['auc_score'] >= best_auc - tolerance]
+            return min(eligible, key=lambda name: model_scores[name]['p99_latency_ms'])
+        elif objective_type == 'auc_per_ms':
+            return max(names, key=lambda name: model_scores[name]['auc_score'] / max(model_scores[name]['p99_latency_ms'], 1e-3))
+        else:
+            return max(names, key=lambda name: model_scores[name]['auc_score'])
+    
     def _generate_model_report(self, y_true, y_pred, y_pred_proba, disease):
         """Generate detailed model performance report"""
         print(f"\n📊 DETAILED MODEL REPORT - {disease.upper()}")
@@ -573,12 +694,166 @@ class EnhancedChronicDiseasePredictor:
         plot_file = f'feature_importance_{disease}.png'
         plt.savefig(plot_file)
         print(f"📊 Feature importance plot saved: {plot_file}")
-        plt.show()
+        # Don't block training on an interactive window; the file is the output
+        plt.close()
         
         return importance_df
     
-    def predict_risk_score(self, patient_data, disease):
-        """Predict risk score with enhanced preprocessing"""
+    def _preprocess_patient(self, patient_df, disease):
+        """Apply the stored imputation, encoding, scaling and selection steps to patient rows"""
+        # 1. Imputation (handle new structure)
+        if disease in self.imputers:
+            imputers = self.imputers[disease]
+            
+            # Handle numeric columns
+            numeric_columns = patient_df.select_dtypes(include=[np.number]).columns
+            categorical_columns = patient_df.select_dtypes(include=['object', 'category']).columns
+            
+            if len(numeric_columns) > 0 and imputers.get('numeric'):
+                patient_df[numeric_columns] = imputers['numeric'].transform(patient_df[numeric_columns])
+                
+            if len(categorical_columns) > 0 and imputers.get('categorical'):
+                patient_df[categorical_columns] = imputers['categorical'].transform(patient_df[categorical_columns])
+        
+        # 2. Label encoding
+        if disease in self.label_encoders:
+            for col, le in self.label_encoders[disease].items():
+                if col in patient_df.columns:
+                    patient_df[col] = le.transform(patient_df[col].astype(str))
+        
+        # 3. Scaling
+        if disease in self.scalers:
+            patient_scaled = self.scalers[disease].transform(patient_df)
+        else:
+            patient_scaled = patient_df.values
+        
+        # 4. Feature selection
+        if disease in self.feature_selectors:
+            return self.feature_selectors[disease].transform(patient_scaled)
+        return patient_scaled
+    
+    def _categorize_risk(self, risk_prob, disease):
+        """Map a probability to a risk category using disease-specific thresholds"""
+        thresholds = self.risk_thresholds.get(disease, {'low': 0.3, 'moderate': 0.6, 'high': 0.8})
+        
+        if risk_prob < thresholds['low']:
+            return 'Low Risk'
+        elif risk_prob < thresholds['moderate']:
+            return 'Moderate Risk'
+        elif risk_prob < thresholds['high']:
+            return 'High Risk'
+        else:
+            return 'Very High Risk'
+    
+    def _categorize_risks(self, risk_probs, disease):
+        """Vectorised _categorize_risk for an array of probabilities"""
+        thresholds = self.risk_thresholds.get(disease, {'low': 0.3, 'moderate': 0.6, 'high': 0.8})
+        bounds = [thresholds['low'], thresholds['moderate'], thresholds['high']]
+        labels = np.array(['Low Risk', 'Moderate Risk', 'High Risk', 'Very High Risk'])
+        return labels[np.searchsorted(bounds, np.asarray(risk_probs), side='right')]
+    
+    def _serving_model(self, disease):
+        """The model used for predictions: a distilled student that passed fidelity, else the full model"""
+        distillation = self.model_metadata.get(disease, {}).get('distillation') or {}
+        if self.serve_student_models and distillation.get('serving') and self.student_models.get(disease) is not None:
+            return self.student_models[disease], 'student'
+        return self.models[disease], 'full'
+    
+    def _near_threshold(self, risk_probs, disease, margin):
+        """Boolean mask of probabilities within margin of any category boundary"""
+        thresholds = self.risk_thresholds.get(disease, {'low': 0.3, 'moderate': 0.6, 'high': 0.8})
+        bounds = np.array([thresholds['low'], thresholds['moderate'], thresholds['high']])
+        distance = np.abs(np.asarray(risk_probs)[:, None] - bounds[None, :]).min(axis=1)
+        return distance < margin
+    
+    def _cascade_predict(self, patient_processed, disease):
+        """Score with the student and escalate to the full model near category boundaries"""
+        student = self.student_models[disease]
+        risk_prob = student.predict_proba(patient_processed)[0][1]
+        escalate = bool(self._near_threshold([risk_prob], disease, self.cascade_config['margin'])[0])
+        
+        with self._cascade_lock:
+            stats = self.cascade_stats.setdefault(disease, {'scored': 0, 'escalated': 0})
+            stats['scored'] += 1
+            stats['escalated'] += int(escalate)
+        
+        if escalate:
+            model = self.models[disease]
+            return model.predict_proba(patient_processed)[0][1], model, 'cascade_full'
+        return risk_prob, student, 'cascade_student'
+    
+    def evaluate_cascade(self, X_processed, disease, margin=None):
+        """
+        Compare cascade scoring with always-full scoring on preprocessed rows
+        
+        Returns the fraction of rows escalated to the full model and the
+        risk-category agreement between cascade and full scoring.
+        """
+        if self.student_models.get(disease) is None:
+            print(f"❌ No first-stage model for {disease}; distill one first")
+            return None
+        
+        margin = self.cascade_config['margin'] if margin is None else margin
+        student_probs = self.student_models[disease].predict_proba(X_processed)[:, 1]
+        full_probs = self.models[disease].predict_proba(X_processed)[:, 1]
+        escalated = self._near_threshold(student_probs, disease, margin)
+        cascade_probs = np.where(escalated, full_probs, student_probs)
+        
+        return {
+            'margin': margin,
+            'rows': int(len(cascade_probs)),
+            'escalation_rate': float(escalated.mean()),
+            'category_agreement': float(np.mean(
+                self._categorize_risks(cascade_probs, disease) == self._categorize_risks(full_probs, disease)
+            )),
+            'mean_abs_gap': float(np.abs(cascade_probs - full_probs).mean())
+        }
+    
+    def get_cascade_stats(self):
+        """Runtime escalation counts per disease since the predictor was created"""
+        with self._cascade_lock:
+            return {
+                disease: {**stats, 'escalation_rate': stats['escalated'] / stats['scored'] if stats['scored'] else 0.0}
+                for disease, stats in self.cascade_stats.items()
+            }
+    
+    def _build_explainers(self, disease, background):
+        """Precompute attribution structures for the full model and its student"""
+        explainers = {'full': build_explainer(self.models[disease], background)}
+        if self.student_models.get(disease) is not None:
+            explainers['student'] = build_explainer(self.student_models[disease], background)
+        self.explainers[disease] = explainers
+        return explainers
+    
+    def _explain(self, patient_processed, disease, served_by, top_k=5):
+        """Base risk and the features that moved this patient's risk the most"""
+        explainers = self.explainers.get(disease)
+        kind = 'student' if 'student' in served_by else 'full'
+        if explainers is None or kind not in explainers:
+            # Models saved before explainers existed: scaled features have mean 0
+            explainers = self._build_explainers(disease, np.zeros(patient_processed.shape[1]))
+        
+        base, contributions = explain_in_probability(explainers[kind], patient_processed)
+        return {
+            'base_risk': float(base[0]),
+            'top_factors': top_factors(contributions[0], self.feature_names[disease], top_k)
+        }
+    
+    def predict_risk_score(self, patient_data, disease, explain=False):
+        """
+        Predict risk score with enhanced preprocessing
+        
+        explain=True adds 'base_risk' and 'top_factors': the selected features
+        whose values moved this patient's risk furthest from the average patient.
+        
+        'confidence' is measured on the model that produced the score (see
+        'served_by'), so its meaning follows that model; 'confidence_method'
+        names it: 'ensemble_agreement' (1 - 2 * std of the ensemble members'
+        probabilities, the full model), 'decision_margin' (|decision function|
+        / 2 capped at 1, e.g. a distilled student's log-odds) or 'fixed' (0.8
+        for models with neither). Values from different methods aren't comparable.
+        """
+        self._ensure_loaded(disease)
         if disease not in self.models:
             print(f"❌ Model for {disease} not available")
             return None
@@ -588,71 +863,52 @@ class EnhancedChronicDiseasePredictor:
             if isinstance(patient_data, dict):
                 patient_df = pd.DataFrame([patient_data])
             else:
-                patient_df = patient_data
+                # Preprocessing writes columns in place; never touch the caller's frame
+                patient_df = patient_data.copy()
             
             # Apply same preprocessing pipeline
-            # 1. Imputation (handle new structure)
-            if disease in self.imputers:
-                imputers = self.imputers[disease]
-                
-                # Handle numeric columns
-                numeric_columns = patient_df.select_dtypes(include=[np.number]).columns
-                categorical_columns = patient_df.select_dtypes(include=['object', 'category']).columns
-                
-                if len(numeric_columns) > 0 and imputers.get('numeric'):
-                    patient_df[numeric_columns] = imputers['numeric'].transform(patient_df[numeric_columns])
-                    
-                if len(categorical_columns) > 0 and imputers.get('categorical'):
-                    patient_df[categorical_columns] = imputers['categorical'].transform(patient_df[categorical_columns])
-            
-            # 2. Label encoding
-            if disease in self.label_encoders:
-                for col, le in self.label_encoders[disease].items():
-                    if col in patient_df.columns:
-                        patient_df[col] = le.transform(patient_df[col].astype(str))
-            
-            # 3. Scaling
-            if disease in self.scalers:
-                patient_scaled = self.scalers[disease].transform(patient_df)
-            else:
-                patient_scaled = patient_df.values
-            
-            # 4. Feature selection
-            if disease in self.feature_selectors:
-                patient_processed = self.feature_selectors[disease].transform(patient_scaled)
-            else:
-                patient_processed = patient_scaled
+            patient_processed = self._preprocess_patient(patient_df, disease)
             
             # Get prediction
-            model = self.models[disease]
-            risk_prob = model.predict_proba(patient_processed)[0][1]
+            if self.cascade_config.get('enabled') and self.student_models.get(disease) is not None:
+                risk_prob, model, served_by = self._cascade_predict(patient_processed, disease)
+            else:
+                model, served_by = self._serving_model(disease)
+                risk_prob = model.predict_proba(patient_processed)[0][1]
             
             # Determine risk category based on disease-specific thresholds
-            thresholds = self.risk_thresholds.get(disease, {'low': 0.3, 'moderate': 0.6, 'high': 0.8})
-            
-            if risk_prob < thresholds['low']:
-                risk_category = 'Low Risk'
-            elif risk_prob < thresholds['moderate']:
-                risk_category = 'Moderate Risk'
-            elif risk_prob < thresholds['high']:
-                risk_category = 'High Risk'
-            else:
-                risk_category = 'Very High Risk'
+            risk_category = self._categorize_risk(risk_prob, disease)
             
-            return {
+            result = {
                 'risk_score': risk_prob,
                 'risk_category': risk_category,
                 'risk_percentage': risk_prob * 100,
-                'confidence': self._calculate_prediction_confidence(patient_processed, disease)
+                'confidence': self._calculate_prediction_confidence(patient_processed, disease, model),
+                'confidence_method': self._confidence_method(model),
+                'served_by': served_by,
+                'model_version': self.model_versions.get(disease)
             }
+            if explain:
+                result.update(self._explain(patient_processed, disease, served_by))
+            return result
             
         except Exception as e:
             print(f"❌ Error predicting risk for {disease}: {e}")
             return None
     
-    def _calculate_prediction_confidence(self, patient_data, disease):
+    @staticmethod
+    def _confidence_method(model):
+        """Name of the measure _calculate_prediction_confidence uses for a model"""
+        if hasattr(model, 'named_estimators_'):
+            return 'ensemble_agreement'
+        if hasattr(model, 'decision_function'):
+            return 'decision_margin'
+        return 'fixed'
+    
+    def _calculate_prediction_confidence(self, patient_data, disease, model=None):
         """Calculate prediction confidence based on ensemble agreement"""
-        model = self.models[disease]
+        if model is None:
+            model = self.models[disease]
         
         if hasattr(model, 'named_estimators_'):
             # For ensemble models, calculate agreement between estimators
@@ -675,6 +931,13 @@ class EnhancedChronicDiseasePredictor:
                 # Default confidence for models without decision function
                 return 0.8
     
+    def train_out_of_core(self, disease, chunk_size=100000, epochs=3, source_name=None):
+        """Train from the local dataset store in chunks with incremental learners"""
+        from out_of_core_trainer import OutOfCoreTrainer
+        
+        trainer = OutOfCoreTrainer(self, chunk_size=chunk_size, epochs=epochs)
+        return trainer.train(disease, source_name=source_name)
+    
     def train_all_diseases(self, source_preference='kaggle'):
         """Train models for all available diseases"""
         diseases = self.fetcher.list_available_diseases()
@@ -709,10 +972,18 @@ class EnhancedChronicDiseasePredictor:
         print(f"\n🎉 Training completed! Successfully trained {len(trained_models)} models")
         return trained_models
     
-    def save_model(self, disease, filename=None):
-        """Save trained model with all preprocessing components"""
+    def save_model(self, disease, filename=None, artifact_format='pickle'):
+        """
+        Save trained model with all preprocessing components
+        
+        artifact_format='pickle' writes the legacy single .pkl file;
+        'artifact' writes a versioned directory (JSON manifest plus a
+        memory-mappable joblib sidecar, see model_artifacts.py).
+        """
         if filename is None:
-            filename = f'enhanced_chronic_disease_model_{disease}.pkl'
+            filename = f'enhanced_chronic_disease_model_{disease}'
+            if artifact_format == 'pickle':
+                filename += '.pkl'
         
         model_data = {
             'model': self.models.get(disease),
@@ -720,36 +991,96 @@ class EnhancedChronicDiseasePredictor:
             'imputer': self.imputers.get(disease),
             'feature_selector': self.feature_selectors.get(disease),
             'label_encoders': self.label_encoders.get(disease),
+            'student_model': self.student_models.get(disease),
+            'explainers': self.explainers.get(disease),
             'feature_names': self.feature_names.get(disease),
             'metadata': self.model_metadata.get(disease),
             'risk_thresholds': self.risk_thresholds.get(disease)
         }
         
         try:
-            with open(filename, 'wb') as f:
-                pickle.dump(model_data, f)
-            print(f"💾 Model saved: {filename}")
+            if artifact_format == 'artifact':
+                manifest = save_artifact(model_data, filename, disease=disease)
+                self.model_versions[disease] = manifest['model_version']
+                print(f"💾 Model artifact saved: {filename} (version {manifest['model_version']})")
+                return True
+            
+            # Write next to the target and rename, so a process loading the
+            # model never reads a half-written pickle
+            payload = pickle.dumps(model_data)
+            directory = os.path.dirname(os.path.abspath(filename))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.model-', suffix='.pkl.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, filename)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            
+            self.model_versions[disease] = hashlib.sha256(payload).hexdigest()[:12]
+            print(f"💾 Model saved: {filename} (version {self.model_versions[disease]})")
             return True
         except Exception as e:
             print(f"❌ Error saving model: {e}")
             return False
     
-    def load_model(self, filename, disease):
-        """Load trained model with all preprocessing components"""
+    def _apply_model_data(self, disease, model_data):
+        """Install a loaded model_data dict (legacy pickle layout) for a disease"""
+        self.models[disease] = model_data.get('model')
+        self.scalers[disease] = model_data.get('scaler')
+        self.imputers[disease] = model_data.get('imputer')
+        self.feature_selectors[disease] = model_data.get('feature_selector')
+        self.label_encoders[disease] = model_data.get('label_encoders') or {}
+        self.feature_names[disease] = model_data.get('feature_names') or []
+        self.model_metadata[disease] = model_data.get('metadata') or {}
+        
+        if model_data.get('student_model') is not None:
+            self.student_models[disease] = model_data['student_model']
+        else:
+            self.student_models.pop(disease, None)
+        
+        if model_data.get('explainers') is not None:
+            self.explainers[disease] = model_data['explainers']
+        else:
+            self.explainers.pop(disease, None)
+        
+        if disease in (model_data.get('risk_thresholds') or {}):
+            self.risk_thresholds[disease] = model_data['risk_thresholds']
+    
+    def _ensure_loaded(self, disease):
+        """Finish loading a lazily loaded artifact before it is used"""
+        artifact = self._lazy_artifacts.pop(disease, None)
+        if artifact is not None:
+            self._apply_model_data(disease, artifact.as_model_data())
+    
+    def load_model(self, filename, disease, lazy=False):
+        """
+        Load trained model with all preprocessing components
+        
+        Accepts a legacy .pkl file or a versioned artifact directory. With
+        lazy=True an artifact only has its manifest read now (feature names,
+        metadata); the estimator is loaded on the first prediction.
+        """
         try:
-            with open(filename, 'rb') as f:
-                model_data = pickle.load(f)
-            
-            self.models[disease] = model_data.get('model')
-            self.scalers[disease] = model_data.get('scaler')
-            self.imputers[disease] = model_data.get('imputer')
-            self.feature_selectors[disease] = model_data.get('feature_selector')
-            self.label_encoders[disease] = model_data.get('label_encoders', {})
-            self.feature_names[disease] = model_data.get('feature_names', [])
-            self.model_metadata[disease] = model_data.get('metadata', {})
+            if is_artifact_dir(filename):
+                artifact = load_artifact(filename)
+                if lazy:
+                    self._lazy_artifacts[disease] = artifact
+                    self.feature_names[disease] = artifact.feature_names
+                    self.model_metadata[disease] = artifact.metadata
+                    self.model_versions[disease] = artifact.model_version
+                    print(f"✅ Model artifact registered (lazy): {filename}")
+                    return True
+                model_data, model_version = artifact.as_model_data(), artifact.model_version
+            else:
+                model_data, model_version = load_versioned_pickle(filename)
             
-            if disease in model_data.get('risk_thresholds', {}):
-                self.risk_thresholds[disease] = model_data['risk_thresholds']
+            self._lazy_artifacts.pop(disease, None)
+            self._apply_model_data(disease, model_data)
+            self.model_versions[disease] = model_version
             
             print(f"✅ Model loaded: {filename}")
             return True
@@ -757,6 +1088,12 @@ class EnhancedChronicDiseasePredictor:
             print(f"❌ Error loading model: {e}")
             return False
     
+    def freeze(self, diseases=None):
+        """Read-only, thread-safe snapshot of the loaded models (see frozen_predictor.py)"""
+        from frozen_predictor import FrozenPredictor
+        
+        return FrozenPredictor.from_predictor(self, diseases)
+    
     def get_model_summary(self):
         """Get summary of all trained models"""
         if not self.models:
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+# Model feature name -> patient profile field it is filled from. Feature names
+# come from the training datasets (e.g. 'trestbps' and 'chol' in the UCI heart
+# data); profile fields are what report extraction and logged vitals produce.
+FEATURE_ALIASES = {
+    'age': 'age',
+    'gender': 'gender',
+    'sex': 'gender',
+    'glucose': 'glucose',
+    'bmi': 'bmi',
+    'systolic': 'blood_pressure_systolic',
+    'trestbps': 'blood_pressure_systolic',
+    'blood_pressure': 'blood_pressure_systolic',
+    'diastolic': 'blood_pressure_diastolic',
+    'cholesterol': 'cholesterol',
+    'chol': 'cholesterol',
+    'heart_rate': 'heart_rate',
+    'thalach': 'heart_rate'
+}
+
+
+def profile_from_extracted(extracted_data):
+    """Canonical profile fields from HospitalReportProcessor.extract_medical_data output"""
+    return {
+        'age': extracted_data.get('age'),
+        'gender': 1 if extracted_data.get('gender') == 'male' else 0,
+        'glucose': extracted_data.get('glucose'),
+        'blood_pressure_systolic': extracted_data.get('systolic'),
+        'blood_pressure_diastolic': extracted_data.get('diastolic'),
+        'cholesterol': extracted_data.get('cholesterol'),
+        'hdl': extracted_data.get('hdl'),
+        'heart_rate': extracted_data.get('heart_rate'),
+        'bmi': extracted_data.get('bmi'),
+    }
+
+
+def profile_field(feature):
+    """Profile field a model feature reads, or None if no profile field feeds it"""
+    return FEATURE_ALIASES.get(feature)
+
+
+def build_model_input(profile, feature_names):
+    """Model input dict for the given features, NaN where the profile has no value"""
+    model_input = {}
+    for feature in feature_names:
+        field = profile_field(feature)
+        value = profile.get(field) if field else None
+        model_input[feature] = value if value is not None else np.nan
+    return model_input
+
+
+def map_columns(frame, input_columns):
+    """
+    Frame with a model's input columns taken from a table of patients
+
+    A column is used directly when the table has the model's own name for it
+    (e.g. 'trestbps'), otherwise through the canonical profile field
+    (e.g. 'blood_pressure_systolic'). Anything else is left missing and
+    imputed by the model's pipeline.
+    """
+    columns = {}
+    for col in input_columns:
+        if col in frame.columns:
+            columns[col] = frame[col]
+        else:
+            field = profile_field(col)
+            if field and field in frame.columns:
+                columns[col] = frame[field]
+    return pd.DataFrame(columns, index=frame.index)
+
+
+def build_dependency_map(feature_names_by_disease):
+    """
+    Profile field -> diseases whose selected features read it
+
+    A field missing from the map does not influence any model, so changing it
+    never requires rescoring.
+    """
+    dependencies = {}
+    for disease, feature_names in feature_names_by_disease.items():
+        for feature in feature_names or []:
+            field = profile_field(feature)
+            if field:
+                dependencies.setdefault(field, set()).add(disease)
+    return dependencies
+
+
+def vital_to_profile(vital_type, value):
+    """
+    Profile fields updated by one logged vital
+
+    Vital types are matched the same way vitals_feedback.py matches them
+    ('Blood Pressure', 'blood_sugar', 'Heart Rate', ...). Oxygen saturation
+    feeds no current model and maps to its own field.
+    """
+    vtype = (vital_type or '').lower()
+    try:
+        if 'pressure' in vtype:
+            systolic, diastolic = str(value).split('/')
+            return {'blood_pressure_systolic': float(systolic), 'blood_pressure_diastolic': float(diastolic)}
+        if 'sugar' in vtype or 'glucose' in vtype:
+            return {'glucose': float(value)}
+        if 'heart' in vtype:
+            return {'heart_rate': float(value)}
+        if 'oxygen' in vtype:
+            return {'oxygen': float(value)}
+    except (TypeError, ValueError):
+        pass
+    return {}
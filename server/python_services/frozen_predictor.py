@@ -0,0 +1,348 @@
+import threading
+from pathlib import Path
+from types import MappingProxyType
+import numpy as np
+import pandas as pd
+
+from model_artifacts import load_artifact, is_artifact_dir, load_versioned_pickle
+from model_explanations import build_explainer, explain_in_probability, top_factors
+
+DEFAULT_THRESHOLDS = {'low': 0.3, 'moderate': 0.6, 'high': 0.8}
+RISK_LABELS = np.array(['Low Risk', 'Moderate Risk', 'High Risk', 'Very High Risk'])
+AVAILABLE_DISEASES = ['diabetes', 'heart_disease', 'kidney_disease', 'stroke', 'hypertension', 'copd']
+
+
+def model_source(models_dir, disease):
+    """The artifact directory or legacy pickle a disease model is loaded from, or None"""
+    artifact_path = Path(models_dir) / f'enhanced_chronic_disease_model_{disease}'
+    if is_artifact_dir(artifact_path):
+        return artifact_path
+    pickle_path = Path(models_dir) / f'enhanced_chronic_disease_model_{disease}.pkl'
+    return pickle_path if pickle_path.exists() else None
+
+
+def read_model(source, verify=False):
+    """Load (model_data, model_version) from an artifact directory or legacy pickle"""
+    if is_artifact_dir(source):
+        artifact = load_artifact(source, verify=verify)
+        return artifact.as_model_data(), artifact.model_version
+    return load_versioned_pickle(source)
+
+
+class _Frozen:
+    """Rejects attribute assignment once __init__ has finished"""
+
+    _frozen = False
+
+    def __setattr__(self, name, value):
+        if self._frozen:
+            raise AttributeError(f"{type(self).__name__} is read-only")
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def _freeze(self):
+        object.__setattr__(self, '_frozen', True)
+
+
+class FrozenDiseaseModel(_Frozen):
+    """
+    Read-only snapshot of one disease model and its preprocessing pipeline.
+
+    Nothing here is written after construction: every prediction works on its
+    own copy of the input, and the fitted sklearn objects are only ever called
+    through their transform/predict methods. One instance can therefore serve
+    any number of threads without locking, and numpy/sklearn release the GIL
+    for the heavy parts.
+    """
+
+    def __init__(self, disease, model_data, serve_student=True, cascade_margin=None, model_version=None):
+        metadata = model_data.get('metadata') or {}
+        # Saved thresholds are the flat {'low', 'moderate', 'high'} dict for this disease
+        thresholds = {**DEFAULT_THRESHOLDS, **(model_data.get('risk_thresholds') or {})}
+
+        imputers = model_data.get('imputer') or {}
+        scaler = model_data.get('scaler')
+        feature_names = tuple(model_data.get('feature_names') or [])
+
+        self.disease = disease
+        self.model_version = model_version
+        self.full_model = model_data['model']
+        self.student_model = model_data.get('student_model')
+        self.numeric_imputer = imputers.get('numeric')
+        self.categorical_imputer = imputers.get('categorical')
+        self.label_encoders = MappingProxyType(dict(model_data.get('label_encoders') or {}))
+        self.scaler = scaler
+        self.feature_selector = model_data.get('feature_selector')
+        self.feature_names = feature_names
+        self.metadata = MappingProxyType(dict(metadata))
+        self.bounds = np.array([thresholds['low'], thresholds['moderate'], thresholds['high']])
+        self.risk_thresholds = MappingProxyType(thresholds)
+
+        # The scaler sees every pre-selection column; callers may supply any subset
+        if scaler is not None and hasattr(scaler, 'feature_names_in_'):
+            self.input_columns = tuple(scaler.feature_names_in_)
+        else:
+            self.input_columns = feature_names
+        self.numeric_columns = self._imputer_columns(self.numeric_imputer)
+        self.categorical_columns = self._imputer_columns(self.categorical_imputer)
+
+        # Unseen categories fall back to the training mode, as in preprocess_features
+        fallbacks = {}
+        if self.categorical_imputer is not None:
+            for col, mode in zip(self.categorical_columns, self.categorical_imputer.statistics_):
+                encoder = self.label_encoders.get(col)
+                if encoder is not None and str(mode) in encoder.classes_:
+                    fallbacks[col] = str(mode)
+        self.category_fallbacks = MappingProxyType(fallbacks)
+
+        distillation = metadata.get('distillation') or {}
+        use_student = serve_student and distillation.get('serving') and self.student_model is not None
+        self.serving_model = self.student_model if use_student else self.full_model
+        self.served_by = 'student' if use_student else 'full'
+        self.cascade_margin = cascade_margin if self.student_model is not None else None
+        # Saved with the model since explanations were added; built on first use for older models
+        self._explainers = dict(model_data.get('explainers') or {})
+        self._explainer_lock = threading.Lock()
+        self._freeze()
+
+    @staticmethod
+    def _imputer_columns(imputer):
+        if imputer is None or not hasattr(imputer, 'feature_names_in_'):
+            return ()
+        return tuple(imputer.feature_names_in_)
+
+    def transform(self, patient_data):
+        """Impute, encode, scale and select features on a private copy of the rows"""
+        if isinstance(patient_data, dict):
+            frame = pd.DataFrame([patient_data])
+        else:
+            frame = pd.DataFrame(patient_data)
+        # reindex always returns a new frame, so the caller's data is never touched
+        frame = frame.reindex(columns=list(self.input_columns))
+
+        if self.numeric_columns:
+            numeric = frame[list(self.numeric_columns)].apply(pd.to_numeric, errors='coerce')
+            frame[list(self.numeric_columns)] = self.numeric_imputer.transform(numeric)
+
+        if self.categorical_columns:
+            categorical = frame[list(self.categorical_columns)].astype(object)
+            # None from JSON payloads counts as missing, like NaN
+            categorical = categorical.where(categorical.notna(), np.nan)
+            frame[list(self.categorical_columns)] = self.categorical_imputer.transform(categorical)
+
+        for col, encoder in self.label_encoders.items():
+            if col not in frame.columns:
+                continue
+            values = frame[col].astype(str)
+            if col in self.category_fallbacks:
+                values = values.where(values.isin(encoder.classes_), self.category_fallbacks[col])
+            frame[col] = encoder.transform(values)
+
+        values = self.scaler.transform(frame) if self.scaler is not None else frame.values
+        if self.feature_selector is not None:
+            values = self.feature_selector.transform(values)
+        return values
+
+    def categorize(self, risk_probs):
+        return RISK_LABELS[np.searchsorted(self.bounds, np.asarray(risk_probs), side='right')]
+
+    def confidence(self, X, model):
+        """Vectorised version of the predictor's _calculate_prediction_confidence"""
+        if hasattr(model, 'named_estimators_'):
+            member_probs = np.column_stack([
+                estimator.predict_proba(X)[:, 1] for estimator in model.named_estimators_.values()
+            ])
+            return 1.0 - np.minimum(member_probs.std(axis=1) * 2, 1.0)
+        if hasattr(model, 'decision_function'):
+            return np.minimum(np.abs(model.decision_function(X)) / 2.0, 1.0)
+        return np.full(X.shape[0], 0.8)
+
+    @staticmethod
+    def confidence_method(model):
+        """Name of the measure confidence() uses for a model, as the predictor's _confidence_method"""
+        if hasattr(model, 'named_estimators_'):
+            return 'ensemble_agreement'
+        if hasattr(model, 'decision_function'):
+            return 'decision_margin'
+        return 'fixed'
+
+    def explainer(self, kind, n_features):
+        """The 'full' or 'student' model's explainer, built once if the saved model has none"""
+        explainer = self._explainers.get(kind)
+        if explainer is None:
+            with self._explainer_lock:
+                if kind not in self._explainers:
+                    model = self.student_model if kind == 'student' else self.full_model
+                    # Scaled training features have mean 0, so zeros is the average patient
+                    self._explainers[kind] = build_explainer(model, np.zeros(n_features))
+                explainer = self._explainers[kind]
+        return explainer
+
+    def explain(self, X, served_by, top_k=5):
+        """Base risk and top contributing features for preprocessed rows, per serving model"""
+        base_risk = np.zeros(len(X))
+        factors = np.empty(len(X), dtype=object)
+        uses_student = np.char.find(served_by.astype(str), 'student') >= 0
+        for kind, mask in (('student', uses_student), ('full', ~uses_student)):
+            if not mask.any():
+                continue
+            base, contributions = explain_in_probability(self.explainer(kind, X.shape[1]), X[mask])
+            base_risk[mask] = base
+            factors[np.flatnonzero(mask)] = [top_factors(row, self.feature_names, top_k) for row in contributions]
+        return base_risk, factors
+
+    def predict_batch(self, patient_data, explain=False, top_k=5):
+        """
+        Score many rows at once
+
+        Returns:
+            Dict of equal-length arrays: risk_score, risk_category,
+            risk_percentage, confidence, confidence_method and served_by,
+            plus base_risk and top_factors when explain is set. Confidence
+            is measured on the model that served each row, with the method
+            confidence_method names (see the predictor's predict_risk_score)
+        """
+        X = self.transform(patient_data)
+
+        if self.cascade_margin is not None:
+            risk_probs = self.student_model.predict_proba(X)[:, 1]
+            distance = np.abs(risk_probs[:, None] - self.bounds[None, :]).min(axis=1)
+            escalate = distance < self.cascade_margin
+            confidence = self.confidence(X, self.student_model)
+            served_by = np.where(escalate, 'cascade_full', 'cascade_student')
+            confidence_method = np.where(escalate, self.confidence_method(self.full_model),
+                                         self.confidence_method(self.student_model))
+            if escalate.any():
+                X_escalated = X[escalate]
+                risk_probs[escalate] = self.full_model.predict_proba(X_escalated)[:, 1]
+                confidence[escalate] = self.confidence(X_escalated, self.full_model)
+        else:
+            risk_probs = self.serving_model.predict_proba(X)[:, 1]
+            confidence = self.confidence(X, self.serving_model)
+            served_by = np.full(len(risk_probs), self.served_by)
+            confidence_method = np.full(len(risk_probs), self.confidence_method(self.serving_model))
+
+        batch = {
+            'risk_score': risk_probs,
+            'risk_category': self.categorize(risk_probs),
+            'risk_percentage': risk_probs * 100,
+            'confidence': confidence,
+            'confidence_method': confidence_method,
+            'served_by': served_by
+        }
+        if explain:
+            batch['base_risk'], batch['top_factors'] = self.explain(X, served_by, top_k)
+        return batch
+
+
+class FrozenPredictor(_Frozen):
+    """
+    Immutable, thread-safe serving counterpart of EnhancedChronicDiseasePredictor.
+
+    Build it once from a trained predictor or a directory of saved models and
+    share it between request threads. Reloading a model means building a new
+    FrozenPredictor and swapping the reference; an existing instance never
+    changes underneath a running request.
+    """
+
+    def __init__(self, disease_models):
+        self.models = MappingProxyType(dict(disease_models))
+        self.feature_names = MappingProxyType({
+            disease: list(model.feature_names) for disease, model in self.models.items()
+        })
+        self._freeze()
+
+    @classmethod
+    def from_predictor(cls, predictor, diseases=None):
+        """Snapshot the models currently loaded in an EnhancedChronicDiseasePredictor"""
+        disease_models = {}
+        for disease in diseases or list(predictor.models.keys()) + list(predictor._lazy_artifacts.keys()):
+            predictor._ensure_loaded(disease)
+            if predictor.models.get(disease) is None:
+                continue
+            model_data = {
+                'model': predictor.models[disease],
+                'scaler': predictor.scalers.get(disease),
+                'imputer': predictor.imputers.get(disease),
+                'feature_selector': predictor.feature_selectors.get(disease),
+                'label_encoders': predictor.label_encoders.get(disease),
+                'student_model': predictor.student_models.get(disease),
+                'explainers': predictor.explainers.get(disease),
+                'feature_names': predictor.feature_names.get(disease),
+                'metadata': predictor.model_metadata.get(disease),
+                'risk_thresholds': predictor.risk_thresholds.get(disease)
+            }
+            cascade = predictor.cascade_config
+            disease_models[disease] = FrozenDiseaseModel(
+                disease, model_data,
+                serve_student=predictor.serve_student_models,
+                cascade_margin=cascade['margin'] if cascade.get('enabled') else None,
+                model_version=predictor.model_versions.get(disease)
+            )
+        return cls(disease_models)
+
+    @classmethod
+    def from_directory(cls, models_dir, diseases=None, serve_student=True, cascade_margin=None):
+        """Load every enhanced_chronic_disease_model_* artifact (or legacy pickle) in a directory"""
+        models_dir = Path(models_dir)
+        disease_models = {}
+        for disease in diseases or AVAILABLE_DISEASES:
+            source = model_source(models_dir, disease)
+            if source is None:
+                continue
+            try:
+                model_data, model_version = read_model(source)
+            except Exception as e:
+                print(f"❌ Error loading {disease} model: {e}")
+                continue
+            disease_models[disease] = FrozenDiseaseModel(
+                disease, model_data,
+                serve_student=serve_student,
+                cascade_margin=cascade_margin,
+                model_version=model_version
+            )
+        return cls(disease_models)
+
+    @property
+    def diseases(self):
+        return list(self.models.keys())
+
+    def predict_risk_score(self, patient_data, disease, explain=False):
+        """Same result dict as EnhancedChronicDiseasePredictor.predict_risk_score"""
+        model = self.models.get(disease)
+        if model is None:
+            print(f"❌ Model for {disease} not available")
+            return None
+
+        try:
+            batch = model.predict_batch(patient_data, explain=explain)
+        except Exception as e:
+            print(f"❌ Error predicting risk for {disease}: {e}")
+            return None
+
+        result = {
+            'risk_score': float(batch['risk_score'][0]),
+            'risk_category': str(batch['risk_category'][0]),
+            'risk_percentage': float(batch['risk_percentage'][0]),
+            'confidence': float(batch['confidence'][0]),
+            'confidence_method': str(batch['confidence_method'][0]),
+            'served_by': str(batch['served_by'][0]),
+            'model_version': model.model_version
+        }
+        if explain:
+            result['base_risk'] = float(batch['base_risk'][0])
+            result['top_factors'] = batch['top_factors'][0]
+        return result
+
+    def predict_risk_batch(self, patient_frame, disease, explain=False):
+        """Score a DataFrame of patients in one vectorised pass; returns a DataFrame aligned to its index"""
+        model = self.models.get(disease)
+        if model is None:
+            raise KeyError(f"Model for {disease} not available")
+
+        batch = model.predict_batch(patient_frame, explain=explain)
+        index = patient_frame.index if isinstance(patient_frame, pd.DataFrame) else None
+        return pd.DataFrame(batch, index=index)
+
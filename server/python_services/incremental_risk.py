@@ -0,0 +1,148 @@
+import threading
+from collections import Counter
+import numpy as np
+
+from feature_mapping import build_dependency_map, build_model_input, vital_to_profile
+
+
+def _same_input(left, right):
+    """Model inputs are equal, treating NaN as equal to NaN"""
+    if left is None or right is None or left.keys() != right.keys():
+        return False
+    for key, value in left.items():
+        other = right[key]
+        if isinstance(value, float) and isinstance(other, float) and np.isnan(value) and np.isnan(other):
+            continue
+        if value != other:
+            return False
+    return True
+
+
+class IncrementalRiskScorer:
+    """
+    Keeps each patient's profile, per-disease model input and risk result, and
+    on a new observation rescores only the diseases that read a changed field.
+
+    Works with any predictor exposing ``feature_names`` and
+    ``predict_risk_score`` (EnhancedChronicDiseasePredictor, FrozenPredictor or
+    ModelRegistry). If the predictor starts serving a different model version
+    for a disease, that disease is rescored on the next update even if no
+    input changed. With a PatientFeatureStore, patients can be scored by ID
+    and logged vitals are persisted as they are observed.
+    """
+
+    def __init__(self, predictor, diseases=None, feature_store=None):
+        self.predictor = predictor
+        self.diseases = diseases
+        self.feature_store = feature_store
+        self.stats = Counter()
+        self._patients = {}
+        self._lock = threading.Lock()
+        self._feature_names = None
+        self.dependencies = {}
+        self._refresh_dependencies()
+
+    def _refresh_dependencies(self):
+        feature_names = {
+            disease: list(names) for disease, names in self.predictor.feature_names.items()
+            if names and (self.diseases is None or disease in self.diseases)
+        }
+        if feature_names != self._feature_names:
+            self._feature_names = feature_names
+            self.dependencies = build_dependency_map(feature_names)
+
+    def _model_version(self, disease):
+        versions = getattr(self.predictor, 'model_versions', None)
+        if versions is not None:
+            return versions.get(disease)
+        model = self.predictor.models.get(disease)
+        return getattr(model, 'model_version', None)
+
+    def _score(self, state, diseases):
+        """Rescore the given diseases whose model input or model version changed; returns those rescored"""
+        rescored = []
+        for disease in diseases:
+            model_input = build_model_input(state['profile'], self._feature_names[disease])
+            cached = state['risks'].get(disease)
+            if (_same_input(model_input, state['inputs'].get(disease)) and cached is not None
+                    and cached.get('model_version') == self._model_version(disease)):
+                self.stats['unchanged_input'] += 1
+                continue
+
+            result = self.predictor.predict_risk_score(model_input, disease)
+            self.stats['rescored'] += 1
+            rescored.append(disease)
+            state['inputs'][disease] = model_input
+            if result is not None:
+                state['risks'][disease] = result
+            else:
+                state['risks'].pop(disease, None)
+        return rescored
+
+    def score_profile(self, patient_id, profile):
+        """Score a full profile (e.g. from a new report), replacing whatever was cached"""
+        with self._lock:
+            self._refresh_dependencies()
+            state = {'profile': {k: v for k, v in profile.items() if v is not None}, 'inputs': {}, 'risks': {}}
+            self._patients[patient_id] = state
+            self._score(state, list(self._feature_names.keys()))
+            return dict(state['risks'])
+
+    def update(self, patient_id, changes):
+        """
+        Apply changed profile fields and rescore only the affected diseases
+
+        Returns:
+            (risks, rescored) - all cached risks for the patient and the list
+            of diseases whose model actually ran
+        """
+        with self._lock:
+            self._refresh_dependencies()
+            state = self._patients.setdefault(patient_id, {'profile': {}, 'inputs': {}, 'risks': {}})
+
+            changed_fields = [
+                field for field, value in changes.items()
+                if value is not None and state['profile'].get(field) != value
+            ]
+            state['profile'].update({field: changes[field] for field in changed_fields})
+
+            affected = set()
+            for field in changed_fields:
+                affected |= self.dependencies.get(field, set())
+            # Diseases never scored for this patient, or now served by a new model version
+            for disease in self._feature_names:
+                cached = state['risks'].get(disease)
+                if disease not in state['inputs'] or (
+                        cached is not None and cached.get('model_version') != self._model_version(disease)):
+                    affected.add(disease)
+
+            rescored = self._score(state, sorted(affected))
+            self.stats['skipped'] += len(self._feature_names) - len(affected)
+            return dict(state['risks']), rescored
+
+    def observe_vital(self, patient_id, vital_type, value, observed_at=None):
+        """Fold one logged vital (type and value as stored by the Node API) into the patient's risks"""
+        if self.feature_store is not None:
+            self.feature_store.record_vital(patient_id, vital_type, value, observed_at=observed_at)
+        return self.update(patient_id, vital_to_profile(vital_type, value))
+    
+    def score_patient(self, patient_id):
+        """Risks for a patient from their stored features, without re-reading any document"""
+        if self.feature_store is None:
+            raise ValueError("score_patient needs a feature_store")
+        
+        profile = self.feature_store.get_profile(patient_id)
+        with self._lock:
+            known = patient_id in self._patients
+        if known:
+            return self.update(patient_id, profile)[0]
+        return self.score_profile(patient_id, profile)
+
+    def get_risks(self, patient_id):
+        with self._lock:
+            state = self._patients.get(patient_id)
+            return dict(state['risks']) if state else {}
+
+    def forget(self, patient_id):
+        with self._lock:
+            self._patients.pop(patient_id, None)
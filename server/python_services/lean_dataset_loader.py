@@ -0,0 +1,198 @@
+import io
+import json
+import tracemalloc
+from datetime import datetime
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+def _is_text(series):
+    return series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+
+
+def downcast_numeric(series, float_dtype='float32'):
+    """Shrink a numeric column to the smallest dtype that holds its values"""
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return series
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return pd.to_numeric(series, downcast='integer')
+    if pd.api.types.is_float_dtype(series.dtype):
+        # Whole-number float columns (ints with NaN) still shrink to float32
+        return series.astype(float_dtype) if series.dtype != float_dtype else series
+    return series
+
+
+def plan_categorical_columns(df, max_unique=64, max_ratio=0.5):
+    """Pick the text columns that are cheaper to store as pandas categoricals"""
+    columns = []
+    for col in df.columns:
+        if not _is_text(df[col]):
+            continue
+        n_unique = df[col].nunique(dropna=True)
+        if n_unique <= max_unique and n_unique <= max(1, len(df)) * max_ratio:
+            columns.append(col)
+    return columns
+
+
+def compact_frame(df, categorical_columns=None, float_dtype='float32'):
+    """
+    Downcast numeric columns and convert the given text columns to categoricals.
+
+    Columns are replaced one at a time, so at most one extra column is alive at
+    any point rather than a second copy of the frame.
+    """
+    if categorical_columns is None:
+        categorical_columns = plan_categorical_columns(df)
+    categorical_columns = set(categorical_columns)
+
+    for col in df.columns:
+        series = df[col]
+        if col in categorical_columns:
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                df[col] = series.astype('category')
+        elif pd.api.types.is_numeric_dtype(series.dtype):
+            compact = downcast_numeric(series, float_dtype)
+            if compact.dtype != series.dtype:
+                df[col] = compact
+    return df
+
+
+def _concat_chunks(chunks):
+    """Concatenate compacted chunks, keeping categoricals categorical"""
+    if len(chunks) == 1:
+        return chunks[0]
+
+    columns = list(chunks[0].columns)
+    categorical = [
+        col for col in columns
+        if all(isinstance(chunk[col].dtype, pd.CategoricalDtype) for chunk in chunks)
+    ]
+
+    combined = pd.concat([chunk.drop(columns=categorical) for chunk in chunks], ignore_index=True)
+    for col in categorical:
+        combined[col] = union_categoricals([chunk[col] for chunk in chunks], ignore_order=True)
+        for chunk in chunks:
+            del chunk[col]
+
+    # concat upcasts mixed widths; shrink once more to the common minimum
+    return compact_frame(combined[columns], categorical_columns=categorical)
+
+
+def read_csv_lean(source, names=None, usecols=None, exclude_columns=None,
+                  categorical_columns=None, chunksize=100000, float_dtype='float32'):
+    """
+    Read a CSV with compact dtypes without materialising a default-typed copy
+
+    Args:
+        source: Path, URL or bytes of the CSV
+        names: Explicit column names for header-less files
+        usecols: Columns to keep (anything else is never parsed)
+        exclude_columns: Columns to skip, used when the full header is not known up front
+        categorical_columns: Text columns to store as categoricals; inferred from
+                             the first chunk when not given
+        chunksize: Rows parsed at a time
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    if exclude_columns and usecols is None:
+        excluded = set(exclude_columns)
+        usecols = lambda col: col not in excluded
+
+    reader = pd.read_csv(source, names=names, usecols=usecols, chunksize=chunksize)
+    chunks = []
+    for chunk in reader:
+        if categorical_columns is None:
+            categorical_columns = plan_categorical_columns(chunk)
+        chunks.append(compact_frame(chunk, categorical_columns, float_dtype))
+
+    if not chunks:
+        return pd.DataFrame(columns=names or [])
+    return _concat_chunks(chunks)
+
+
+def frame_memory(df):
+    """Deep memory footprint of a DataFrame in bytes"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def default_typed_memory(df):
+    """Footprint the same data would have with pandas' default CSV dtypes"""
+    total = 0
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype(series.cat.categories.dtype)
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            series = series.astype('int64')
+        elif pd.api.types.is_float_dtype(series.dtype):
+            series = series.astype('float64')
+        total += int(series.memory_usage(deep=True, index=False))
+    return total
+
+
+def build_memory_report(predictor, diseases=None, output_file='dataset_memory_report.json',
+                        source_preference=None):
+    """
+    Load and prepare each disease dataset and record its memory profile
+
+    The peak is measured with tracemalloc, which sees every numpy/pandas buffer
+    allocated while fetching (or reading the local store) and preparing X/y.
+    Intended for CI, where the fetcher normally runs in offline mode.
+    """
+    diseases = diseases or list(predictor.fetcher.datasets_config.keys())
+    report = {'generated_at': datetime.now().isoformat(), 'diseases': {}}
+
+    for disease in diseases:
+        tracemalloc.start()
+        try:
+            df, source = predictor.fetcher.fetch_dataset(disease, source_preference=source_preference)
+            if df is None:
+                report['diseases'][disease] = {'error': 'dataset unavailable'}
+                continue
+
+            X, y, target_column = predictor._prepare_disease_dataset(df, disease)
+            _, peak = tracemalloc.get_traced_memory()
+
+            report['diseases'][disease] = {
+                'source': source.get('name') if source else None,
+                'rows': int(df.shape[0]),
+                'columns': int(df.shape[1]),
+                'frame_bytes': frame_memory(df),
+                'default_dtype_bytes': default_typed_memory(df),
+                'prepared_X_bytes': frame_memory(X) if X is not None else None,
+                'peak_traced_bytes': int(peak),
+                'dtypes': {str(col): str(dtype) for col, dtype in df.dtypes.items()}
+            }
+        except Exception as e:
+            report['diseases'][disease] = {'error': str(e)}
+        finally:
+            tracemalloc.stop()
+
+    with open(output_file, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n📊 DATASET MEMORY REPORT ({output_file})")
+    print(f"{'Disease':<16} {'Rows':>9} {'Frame MB':>9} {'Default MB':>11} {'Peak MB':>9}")
+    for disease, info in report['diseases'].items():
+        if 'error' in info:
+            print(f"{disease:<16} ❌ {info['error']}")
+            continue
+        print(f"{disease:<16} {info['rows']:>9} {info['frame_bytes'] / 1e6:>9.2f} "
+              f"{info['default_dtype_bytes'] / 1e6:>11.2f} {info['peak_traced_bytes'] / 1e6:>9.2f}")
+
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    from enhanced_chronic_disease_predictor import EnhancedChronicDiseasePredictor
+
+    parser = argparse.ArgumentParser(description='Per-disease dataset memory report')
+    parser.add_argument('--output', default='dataset_memory_report.json')
+    parser.add_argument('--diseases', nargs='*')
+    parser.add_argument('--offline', action='store_true', help='Only use the local dataset store')
+    args = parser.parse_args()
+
+    predictor = EnhancedChronicDiseasePredictor(offline=args.offline or None)
+    build_memory_report(predictor, args.diseases, args.output)
@@ -0,0 +1,207 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from pathlib import Path
+
+from circuit_breaker import DEFAULT_DB_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at);
+"""
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_prompt(prompt):
+    """
+    Prompt text as compared for caching
+
+    Unicode is NFKC-normalised and every run of whitespace becomes one
+    space, so prompts that differ only in indentation or line breaks (the
+    templates here are indented f-strings) share an entry.
+    """
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', prompt)).strip()
+
+
+def cache_key(model, prompt, endpoint=''):
+    return hashlib.sha256(f"{endpoint}\n{model}\n{normalize_prompt(prompt)}".encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Disk-backed cache of parsed LLM JSON responses, keyed by endpoint, model and normalized prompt.
+
+    Entries expire ttl seconds after they were stored. When the cache holds
+    more than max_entries or max_bytes of responses, the least recently used
+    entries are evicted. Only responses that parsed as JSON (and passed the
+    caller's validation) are ever stored (the client caches after checking),
+    so a malformed reply is retried next time rather than replayed. The
+    endpoint is part of the key, so replies from a test server never answer
+    calls to the real API. The SQLite file is shared between processes.
+    """
+
+    def __init__(self, db_path=None, ttl=86400.0, max_entries=5000, max_bytes=50 * 1024 * 1024):
+        """
+        Args:
+            db_path: SQLite file (default: CARESYNC_LLM_DB or llm_state.db in the data directory, shared with the circuit breakers)
+            ttl: Seconds an entry is served after it was stored
+            max_entries: Entries kept before least recently used ones are evicted
+            max_bytes: Total response size kept before least recently used ones are evicted
+        """
+        self.db_path = str(db_path or DEFAULT_DB_PATH)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    def _connection(self):
+        # A connection must not cross a fork; each process opens its own
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, model, prompt, endpoint=''):
+        """The cached response for this prompt, or None"""
+        key = cache_key(model, prompt, endpoint)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            conn.execute("UPDATE llm_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, model, prompt, response, endpoint=''):
+        """Store a parsed response (anything but None), then evict down to the size bounds"""
+        if response is None:
+            return
+        data = json.dumps(response)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, model, response, size, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (cache_key(model, prompt, endpoint), model, data, len(data), now, now)
+                )
+                conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+                self._evict(conn)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def _evict(self, conn):
+        entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        if entries <= self.max_entries and total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY last_used"):
+            if entries <= self.max_entries and total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            entries -= 1
+            total -= size
+        conn.executemany("DELETE FROM llm_cache WHERE key = ?", evicted)
+
+    def clear(self, model=None):
+        """Drop every entry, or only one model's"""
+        with self._lock:
+            conn = self._connection()
+            if model is None:
+                conn.execute("DELETE FROM llm_cache")
+            else:
+                conn.execute("DELETE FROM llm_cache WHERE model = ?", (model,))
+
+    def snapshot(self):
+        """Entries and size per model, plus this process's hit rate"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT model, COUNT(*), SUM(size), SUM(hits) FROM llm_cache WHERE created_at >= ? GROUP BY model",
+                (time.time() - self.ttl,)
+            ).fetchall()
+        lookups = self.hits + self.misses
+        return {
+            'models': {model: {'entries': entries, 'bytes': size, 'hits': hits} for model, entries, size, hits in rows},
+            'entries': sum(row[1] for row in rows),
+            'bytes': sum(row[2] for row in rows),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    The process-wide cache configured by LLM_CACHE_* variables, or None if LLM_CACHE=off
+
+    LLM_CACHE_TTL_SECONDS (default one day), LLM_CACHE_MAX_ENTRIES and
+    LLM_CACHE_MAX_MB set the bounds.
+    """
+    global _default_cache
+    if os.getenv('LLM_CACHE', 'on').lower() in ('off', '0', 'false'):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMResponseCache(
+                ttl=float(os.getenv('LLM_CACHE_TTL_SECONDS', '86400')),
+                max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000')),
+                max_bytes=int(float(os.getenv('LLM_CACHE_MAX_MB', '50')) * 1024 * 1024)
+            )
+        return _default_cache
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or clear the persistent LLM response cache")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help='Entries and size per model')
+    clear_parser = subparsers.add_parser('clear', help='Drop cached responses')
+    clear_parser.add_argument('--model', help='Only this model (default: all)')
+    args = parser.parse_args()
+
+    cache = LLMResponseCache(args.db)
+    if args.command == 'clear':
+        cache.clear(args.model)
+        print(f"✅ Cleared cached responses for {args.model or 'all models'}")
+    else:
+        summary = cache.snapshot()
+        print(f"🗄️ {summary['entries']} cached responses, {summary['bytes'] / 1024:.1f} KiB")
+        for model, entry in summary['models'].items():
+            print(f"  {model}: {entry['entries']} entries, {entry['bytes'] / 1024:.1f} KiB, {entry['hits']} hits")
@@ -0,0 +1,353 @@
+import os
+import abc
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+
+from circuit_breaker import get_breaker
+from llm_cache import get_cache
+
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+# Seconds a single LLM call may take before the caller gives up on it
+DEFAULT_DEADLINE = float(os.getenv("LLM_DEADLINE_SECONDS", "20"))
+# Blocking HTTP requests allowed in flight at once per process
+MAX_CONCURRENT_CALLS = int(os.getenv("LLM_MAX_CONCURRENT_CALLS", "16"))
+
+
+class LLMError(Exception):
+    """The LLM call failed or returned something unusable"""
+
+
+class LLMUnavailable(LLMError):
+    """The LLM is not configured (no API key) or refused to answer"""
+
+
+class LLMTimeout(LLMError):
+    """The LLM did not answer within the call's deadline"""
+
+
+class CircuitOpen(LLMUnavailable):
+    """The endpoint's circuit breaker is open; the call was refused without being made"""
+
+
+def parse_json_response(text):
+    """JSON object from an LLM reply, with any ```json fences stripped"""
+    content = text.replace('```json', '').replace('```', '').strip()
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError as e:
+        raise LLMError(f"response is not valid JSON: {content[:200]!r}") from e
+
+
+# One event loop per process, on a daemon thread, started on first use. It is
+# recreated after a fork (report_worker_pool) since threads don't survive one.
+# Breaker and cache reads/writes are SQLite transactions that may wait on a
+# lock; they run on their own threads so they neither stall the loop nor
+# queue behind HTTP requests in the default executor.
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+_state_executor = None
+
+
+def _background_loop():
+    global _loop, _loop_pid, _state_executor
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop.set_default_executor(ThreadPoolExecutor(MAX_CONCURRENT_CALLS, thread_name_prefix='llm-call'))
+            _state_executor = ThreadPoolExecutor(4, thread_name_prefix='llm-state')
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name='llm-client-loop', daemon=True).start()
+        return _loop
+
+
+def _run_blocking(func, *args):
+    """Future for a blocking breaker/cache call, run off the event loop"""
+    executor = _state_executor if _loop_pid == os.getpid() else None
+    return asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+def submit(coro):
+    """Run a coroutine on the background loop; returns a concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop())
+
+
+class AsyncLLMClient(abc.ABC):
+    """
+    Base for LLM backends: subclasses implement ``async _generate(prompt, timeout)``
+
+    Every call is bounded by a deadline (the client's default or a per-call
+    one); a call that runs past it raises LLMTimeout. With a circuit breaker,
+    each call's outcome and latency are recorded and, while the circuit is
+    open, calls raise CircuitOpen at once so callers go straight to their
+    fallback. With a cache, generate_json answers repeated prompts from it
+    (even while the circuit is open) and stores replies that parse as JSON
+    and pass the caller's validate check; entries are scoped to the client's
+    endpoint and model.
+    Synchronous code can start a call with ``submit_*`` and collect
+    it later, so the request runs while the caller does other work.
+    """
+
+    model_name = 'llm'
+    endpoint = ''
+
+    def __init__(self, deadline=None, breaker=None, cache=None):
+        self.deadline = DEFAULT_DEADLINE if deadline is None else deadline
+        self.breaker = breaker
+        self.cache = cache
+
+    @abc.abstractmethod
+    async def _generate(self, prompt, timeout):
+        """Reply text for one prompt; timeout is the deadline for this call"""
+
+    async def generate(self, prompt, deadline=None):
+        """Reply text for one prompt"""
+        deadline = self.deadline if deadline is None else deadline
+        if self.breaker is not None and not await self._allow():
+            raise CircuitOpen(f"circuit {self.breaker.name} is open")
+
+        start = time.perf_counter()
+        recorded = False
+        try:
+            try:
+                text = await asyncio.wait_for(self._generate(prompt, deadline), deadline)
+            except asyncio.TimeoutError:
+                error = LLMTimeout(f"no response within {deadline:g}s")
+                recorded = True
+                await self._record(start, error)
+                raise error from None
+            except LLMUnavailable:
+                # Not configured: says nothing about the endpoint's health
+                raise
+            except Exception as e:
+                recorded = True
+                await self._record(start, e)
+                raise
+            recorded = True
+            await self._record(start)
+            return text
+        finally:
+            if not recorded and self.breaker is not None:
+                # No outcome (not configured, or the caller cancelled); a half-open
+                # probe slot this call claimed must not stay taken until it expires.
+                # Shielded, so it completes even if this task is cancelled again.
+                await asyncio.shield(_run_blocking(self.breaker.release))
+
+    async def _allow(self):
+        """breaker.allow() off the loop; a probe it claims for a cancelled caller is given back"""
+        claim = _run_blocking(self.breaker.allow)
+        try:
+            return await asyncio.shield(claim)
+        except asyncio.CancelledError:
+            def give_back(future):
+                if not future.cancelled() and future.exception() is None and future.result():
+                    _run_blocking(self.breaker.release)
+            claim.add_done_callback(give_back)
+            raise
+
+    async def _record(self, start, error=None):
+        """Record the call's outcome on the breaker"""
+        if self.breaker is not None:
+            await _run_blocking(self.breaker.record, time.perf_counter() - start, error is None,
+                                None if error is None else f"{type(error).__name__}: {error}"[:500])
+
+    async def generate_json(self, prompt, deadline=None, validate=None):
+        """
+        Parsed JSON reply for one prompt
+
+        Args:
+            prompt: Prompt text
+            deadline: Seconds before LLMTimeout (default: the client's)
+            validate: Callable taking the parsed reply and returning whether it
+                has the shape the caller needs; a reply that fails raises
+                LLMError and is not cached, and a cached one that fails is refetched
+        """
+        if self.cache is not None:
+            cached = await _run_blocking(self.cache.get, self.model_name, prompt, self.endpoint)
+            if cached is not None and (validate is None or validate(cached)):
+                return cached
+        response = parse_json_response(await self.generate(prompt, deadline))
+        if validate is not None and not validate(response):
+            raise LLMError(f"unexpected response shape from {self.model_name}: {json.dumps(response)[:200]}")
+        if self.cache is not None:
+            await _run_blocking(self.cache.put, self.model_name, prompt, response, self.endpoint)
+        return response
+
+    def submit_json(self, prompt, deadline=None, validate=None):
+        """Start generate_json in the background; .result() on the returned future waits for it"""
+        return submit(self.generate_json(prompt, deadline, validate))
+
+    def generate_json_sync(self, prompt, deadline=None, validate=None):
+        return self.submit_json(prompt, deadline, validate).result()
+
+
+class GeminiHTTPClient(AsyncLLMClient):
+    """
+    Gemini generateContent over its REST API
+
+    base_url (default GEMINI_API_BASE) can point at FakeLLMServer to run
+    offline. The blocking HTTP request runs in a worker thread with the same
+    timeout as the deadline, so an abandoned call doesn't linger. Unless a
+    breaker is given, every client of the same host shares one circuit
+    ('gemini:<host>'), and the response cache is llm_cache.get_cache();
+    pass breaker=False or cache=False to go without.
+    """
+
+    def __init__(self, model_name='gemini-pro', api_key=None, base_url=None, deadline=None, breaker=None,
+                 cache=None):
+        base_url = (base_url or GEMINI_API_BASE).rstrip('/')
+        if breaker is None:
+            breaker = get_breaker(f"gemini:{urlparse(base_url).netloc}")
+        if cache is None:
+            cache = get_cache()
+        super().__init__(deadline, breaker or None, cache or None)
+        self.model_name = model_name
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self.base_url = base_url
+        self.endpoint = base_url
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    async def _generate(self, prompt, timeout):
+        if not self.api_key:
+            raise LLMUnavailable("GEMINI_API_KEY is not configured")
+        return await asyncio.to_thread(self._post, prompt, timeout)
+
+    def _post(self, prompt, timeout):
+        url = f"{self.base_url}/models/{self.model_name}:generateContent"
+        try:
+            response = self._session().post(
+                url,
+                json={'contents': [{'parts': [{'text': prompt}]}]},
+                headers={'x-goog-api-key': self.api_key},
+                timeout=timeout
+            )
+        except requests.Timeout:
+            raise LLMTimeout(f"no response within {timeout:g}s") from None
+        except requests.RequestException as e:
+            raise LLMError(f"request to {self.model_name} failed: {e}") from e
+
+        if response.status_code in (401, 403):
+            raise LLMUnavailable(f"{self.model_name} refused the API key (HTTP {response.status_code})")
+        if response.status_code != 200:
+            raise LLMError(f"{self.model_name} returned HTTP {response.status_code}: {response.text[:200]}")
+        try:
+            parts = response.json()['candidates'][0]['content']['parts']
+            return ''.join(part.get('text', '') for part in parts)
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise LLMError(f"unexpected {self.model_name} response: {response.text[:200]}") from e
+
+
+class FakeLLMServer:
+    """
+    Local stand-in for the Gemini REST API, for tests and offline runs
+
+    Serves generateContent on 127.0.0.1, answering every prompt with
+    ``respond(prompt)`` (default: a fixed reply) after ``latency`` seconds.
+    Use as a context manager, then point GeminiHTTPClient at ``base_url``.
+    """
+
+    def __init__(self, reply='{}', latency=0.0, respond=None, port=0, status=200):
+        self.respond = respond or (lambda prompt: reply)
+        self.latency = latency
+        self.status = status
+        self.prompts = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                prompt = ''.join(part.get('text', '') for part in body['contents'][0]['parts'])
+                server.prompts.append(prompt)
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.status == 200:
+                    payload = {'candidates': [{'content': {'parts': [{'text': server.respond(prompt)}]}}]}
+                else:
+                    payload = {'error': {'code': server.status, 'message': 'fake server error'}}
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(server.status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client hit its deadline and hung up
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1beta"
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="LLM client with deadlines, and a fake Gemini server for offline runs")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help='Run a fake Gemini API (set GEMINI_API_BASE to its URL)')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--reply', default='{}', help='Text returned for every prompt')
+    serve_parser.add_argument('--latency', type=float, default=0.0)
+    ask_parser = subparsers.add_parser('ask', help='Send one prompt and print the reply')
+    ask_parser.add_argument('prompt')
+    ask_parser.add_argument('--model', default='gemini-pro')
+    ask_parser.add_argument('--base-url')
+    ask_parser.add_argument('--deadline', type=float)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        fake = FakeLLMServer(args.reply, args.latency, port=args.port)
+        print(f"🧪 Fake Gemini API at {fake.base_url}")
+        try:
+            fake.serve_forever()
+        except KeyboardInterrupt:
+            fake.stop()
+    else:
+        client = GeminiHTTPClient(args.model, base_url=args.base_url, deadline=args.deadline)
+        start = time.perf_counter()
+        try:
+            reply = submit(client.generate(args.prompt)).result()
+            print(reply)
+        except LLMError as e:
+            print(f"❌ {type(e).__name__}: {e}")
+        print(f"({(time.perf_counter() - start) * 1000:.0f} ms)")
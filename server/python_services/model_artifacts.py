@@ -0,0 +1,347 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import pickle
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from pathlib import Path
+import joblib
+import numpy as np
+import sklearn
+
+# Version 1 is the legacy single-pickle format written by save_model.
+ARTIFACT_FORMAT_VERSION = 2
+MANIFEST_FILE = 'manifest.json'
+COMPONENTS_FILE = 'components.joblib'
+
+# Heavy fitted objects live in the joblib sidecar; everything else is plain
+# JSON in the manifest so it can be read without unpickling anything.
+COMPONENT_KEYS = ['model', 'scaler', 'imputer', 'feature_selector', 'label_encoders', 'student_model', 'explainers']
+MANIFEST_KEYS = ['feature_names', 'metadata', 'risk_thresholds']
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def _file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_artifact_dir(path):
+    """True if ``path`` is a versioned artifact directory"""
+    path = Path(path)
+    return path.is_dir() and (path / MANIFEST_FILE).exists()
+
+
+def _version_dirs(artifact_dir):
+    """Published versions of an artifact, i.e. the directories its symlink can point at"""
+    return [path for path in artifact_dir.parent.glob(f".{artifact_dir.name}-v-*")
+            if path.is_dir() and not path.is_symlink()]
+
+
+def save_artifact(model_data, artifact_dir, disease=None):
+    """
+    Write a model as a versioned artifact directory
+
+    Layout::
+
+        <artifact_dir>/manifest.json       format version, metadata, checksums
+        <artifact_dir>/components.joblib   estimator + preprocessing objects
+
+    The sidecar is written uncompressed so numpy arrays inside it (SVC support
+    vectors, linear coefficients, scaler statistics, ...) can be memory-mapped
+    on load. Each version is assembled in its own hidden sibling directory and
+    artifact_dir is a symlink to it, repointed with a single rename, so
+    readers see the old version or the new one and never a gap. The version
+    just replaced is kept for readers still opening it; older ones are removed.
+    """
+    artifact_dir = Path(artifact_dir).absolute()
+    artifact_dir.parent.mkdir(parents=True, exist_ok=True)
+    staging_dir = Path(tempfile.mkdtemp(dir=str(artifact_dir.parent), prefix=f".{artifact_dir.name}-staging-"))
+    version_dir = link = None
+
+    try:
+        components = {key: model_data.get(key) for key in COMPONENT_KEYS}
+        components_path = staging_dir / COMPONENTS_FILE
+        joblib.dump(components, components_path, compress=0, protocol=pickle.HIGHEST_PROTOCOL)
+
+        checksum = _file_sha256(components_path)
+        manifest = {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'disease': disease,
+            'model_version': checksum[:12],
+            'created_at': datetime.now().isoformat(),
+            'components_file': COMPONENTS_FILE,
+            'components_sha256': checksum,
+            'components_bytes': components_path.stat().st_size,
+            'sklearn_version': sklearn.__version__,
+            'numpy_version': np.__version__
+        }
+        for key in MANIFEST_KEYS:
+            manifest[key] = model_data.get(key)
+
+        with open(staging_dir / MANIFEST_FILE, 'w') as f:
+            json.dump(manifest, f, indent=2, default=_json_default)
+
+        version_dir = artifact_dir.with_name(f".{artifact_dir.name}-v-{checksum[:12]}-{time.time_ns()}")
+        os.replace(staging_dir, version_dir)
+
+        previous = artifact_dir.resolve() if artifact_dir.is_symlink() else None
+        if artifact_dir.exists() and not artifact_dir.is_symlink():
+            # A directory saved before versions were symlinked; moving it aside is
+            # the only time the path is briefly missing
+            previous = artifact_dir.with_name(f".{artifact_dir.name}-v-legacy-{time.time_ns()}")
+            os.replace(artifact_dir, previous)
+
+        # The swap itself: a relative link renamed over the old one
+        link = artifact_dir.with_name(f".{artifact_dir.name}-link-{os.getpid()}-{time.time_ns()}")
+        os.symlink(version_dir.name, link)
+        os.replace(link, artifact_dir)
+        link = None
+
+        keep = {version_dir.name, previous.name if previous is not None else None}
+        for old_dir in _version_dirs(artifact_dir):
+            if old_dir.name not in keep:
+                shutil.rmtree(old_dir, ignore_errors=True)
+        version_dir = None
+    finally:
+        if link is not None and os.path.lexists(link):
+            os.remove(link)
+        if version_dir is not None:
+            # Never published
+            shutil.rmtree(version_dir, ignore_errors=True)
+        if staging_dir.exists():
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    return manifest
+
+
+class LazyArtifact:
+    """
+    A loaded artifact whose manifest is read eagerly and whose components are
+    only unpickled on first use.
+
+    Components are opened with ``mmap_mode='c'``: array pages come straight
+    from the page cache, so several worker processes loading the same artifact
+    share them until one of them writes (which serving never does). sklearn
+    copies tree node arrays into its own buffers when unpickling, so forest and
+    boosting members still get private memory; the saving there is the deferred
+    load rather than sharing. The artifact symlink is resolved once, so a
+    lazy component load reads the same version as the manifest even if a new
+    one was saved in between.
+    """
+
+    def __init__(self, artifact_dir, mmap_mode='c', verify=False):
+        self.artifact_dir = Path(artifact_dir).resolve()
+        self.mmap_mode = mmap_mode
+        self.verify = verify
+        self._components = None
+        self._lock = threading.Lock()
+
+        with open(self.artifact_dir / MANIFEST_FILE, 'r') as f:
+            self.manifest = json.load(f)
+
+        version = self.manifest.get('format_version')
+        if version != ARTIFACT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported artifact format version {version} in {self.artifact_dir}")
+
+    @property
+    def model_version(self):
+        return self.manifest.get('model_version')
+
+    @property
+    def feature_names(self):
+        return self.manifest.get('feature_names') or []
+
+    @property
+    def metadata(self):
+        return self.manifest.get('metadata') or {}
+
+    @property
+    def risk_thresholds(self):
+        return self.manifest.get('risk_thresholds')
+
+    @property
+    def loaded(self):
+        return self._components is not None
+
+    @property
+    def components(self):
+        if self._components is None:
+            with self._lock:
+                if self._components is None:
+                    components_path = self.artifact_dir / self.manifest['components_file']
+                    if self.verify and _file_sha256(components_path) != self.manifest['components_sha256']:
+                        raise ValueError(f"Checksum mismatch for {components_path}")
+                    self._components = joblib.load(components_path, mmap_mode=self.mmap_mode)
+        return self._components
+
+    def as_model_data(self):
+        """Same dict shape as the legacy pickle, for load_model"""
+        model_data = dict(self.components)
+        for key in MANIFEST_KEYS:
+            model_data[key] = self.manifest.get(key)
+        return model_data
+
+
+def load_artifact(artifact_dir, mmap_mode='c', verify=False):
+    return LazyArtifact(artifact_dir, mmap_mode=mmap_mode, verify=verify)
+
+
+def load_versioned_pickle(pkl_path):
+    """
+    Load a legacy pickle together with a content version
+
+    The version is the first 12 hex digits of the file's sha256, the same
+    scheme as an artifact's model_version, computed from the bytes that were
+    actually unpickled.
+    """
+    with open(pkl_path, 'rb') as f:
+        payload = f.read()
+    return pickle.loads(payload), hashlib.sha256(payload).hexdigest()[:12]
+
+
+def convert_pickle(pkl_path, artifact_dir=None, disease=None):
+    """Convert a legacy ``enhanced_chronic_disease_model_*.pkl`` to an artifact directory"""
+    pkl_path = Path(pkl_path)
+    if artifact_dir is None:
+        artifact_dir = pkl_path.with_suffix('')
+    if disease is None:
+        disease = pkl_path.stem.replace('enhanced_chronic_disease_model_', '')
+
+    with open(pkl_path, 'rb') as f:
+        model_data = pickle.load(f)
+
+    manifest = save_artifact(model_data, artifact_dir, disease=disease)
+    print(f"📦 Converted {pkl_path.name} -> {artifact_dir} (version {manifest['model_version']})")
+    return Path(artifact_dir)
+
+
+# ----------------------------------------------------------------------
+# Benchmarks
+# ----------------------------------------------------------------------
+_BENCH_SNIPPET = r"""
+import sys, json, time, pickle, warnings
+warnings.filterwarnings('ignore')
+sys.path.insert(0, {services_dir!r})
+
+def rss():
+    fields = {{}}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'RssAnon', 'RssFile'):
+                fields[key] = int(value.split()[0]) * 1024
+    return fields
+
+import numpy, sklearn, joblib  # import cost is excluded from the measurement
+from model_artifacts import load_artifact
+before = rss()
+start = time.perf_counter()
+if {fmt!r} == 'pickle':
+    with open({path!r}, 'rb') as f:
+        data = pickle.load(f)
+    model = data['model']
+else:
+    artifact = load_artifact({path!r})
+    model = artifact.components['model']
+load_seconds = time.perf_counter() - start
+after = rss()
+print(json.dumps({{
+    'load_ms': load_seconds * 1000,
+    'rss_delta': after.get('VmRSS', 0) - before.get('VmRSS', 0),
+    'anon_delta': after.get('RssAnon', 0) - before.get('RssAnon', 0),
+    'file_backed_delta': after.get('RssFile', 0) - before.get('RssFile', 0)
+}}))
+"""
+
+
+def _measure_load(fmt, path, repeats):
+    services_dir = str(Path(__file__).parent.absolute())
+    code = _BENCH_SNIPPET.format(services_dir=services_dir, fmt=fmt, path=str(path))
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {
+        'load_ms': float(np.median([run['load_ms'] for run in runs])),
+        'rss_delta': int(np.median([run['rss_delta'] for run in runs])),
+        'anon_delta': int(np.median([run['anon_delta'] for run in runs])),
+        'file_backed_delta': int(np.median([run['file_backed_delta'] for run in runs]))
+    }
+
+
+def benchmark_artifacts(pkl_paths, output_dir='artifact_benchmark', repeats=5):
+    """
+    Compare legacy pickles with versioned artifacts
+
+    Each load runs in a fresh interpreter so the numbers include cold
+    unpickling. RSS is split into anonymous (private) and file-backed
+    (shareable page cache) memory; memory-mapped arrays show up as the latter.
+    """
+    output_dir = Path(output_dir)
+    results = {}
+
+    for pkl_path in pkl_paths:
+        pkl_path = Path(pkl_path)
+        disease = pkl_path.stem.replace('enhanced_chronic_disease_model_', '')
+        try:
+            artifact_dir = convert_pickle(pkl_path, output_dir / pkl_path.stem, disease=disease)
+            results[disease] = {
+                'pickle_bytes': pkl_path.stat().st_size,
+                'pickle': _measure_load('pickle', pkl_path, repeats),
+                'artifact': _measure_load('artifact', artifact_dir, repeats)
+            }
+        except Exception as e:
+            results[disease] = {'error': str(e)}
+
+    print("\n📊 MODEL LOAD BENCHMARK (median of fresh-process loads)")
+    print(f"{'Disease':<16} {'Pickle ms':>10} {'Artifact ms':>12} {'Pickle RSS MB':>14} "
+          f"{'Artifact anon MB':>17} {'Artifact file MB':>17}")
+    for disease, info in results.items():
+        if 'error' in info:
+            print(f"{disease:<16} ❌ {info['error']}")
+            continue
+        print(f"{disease:<16} {info['pickle']['load_ms']:>10.1f} {info['artifact']['load_ms']:>12.1f} "
+              f"{info['pickle']['rss_delta'] / 1e6:>14.2f} {info['artifact']['anon_delta'] / 1e6:>17.2f} "
+              f"{info['artifact']['file_backed_delta'] / 1e6:>17.2f}")
+
+    with open(output_dir / 'benchmark.json', 'w') as f:
+        json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert and benchmark model artifacts')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert_parser = subparsers.add_parser('convert', help='Convert legacy pickles to artifact directories')
+    convert_parser.add_argument('pickles', nargs='+')
+
+    bench_parser = subparsers.add_parser('benchmark', help='Compare load time and RSS of both formats')
+    bench_parser.add_argument('pickles', nargs='+')
+    bench_parser.add_argument('--output-dir', default='artifact_benchmark')
+    bench_parser.add_argument('--repeats', type=int, default=5)
+
+    args = parser.parse_args()
+    if args.command == 'convert':
+        for pkl in args.pickles:
+            convert_pickle(pkl)
+    else:
+        benchmark_artifacts(args.pickles, args.output_dir, args.repeats)
@@ -0,0 +1,148 @@
+import numpy as np
+from scipy.special import expit, logit
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.linear_model import LogisticRegression
+
+
+class GradientBoostedStudent:
+    """
+    Shallow gradient-boosted trees that regress the teacher's log-odds.
+
+    Exposes the small classifier surface the predictor relies on
+    (``classes_``, ``predict_proba``, ``predict``, ``decision_function``).
+    """
+
+    def __init__(self, n_estimators=150, max_depth=3, learning_rate=0.1, random_state=42):
+        self.regressor = GradientBoostingRegressor(
+            n_estimators=n_estimators,
+            max_depth=max_depth,
+            learning_rate=learning_rate,
+            random_state=random_state
+        )
+        self.classes_ = np.array([0, 1])
+
+    def fit(self, X, teacher_proba):
+        target = logit(np.clip(teacher_proba, 1e-4, 1 - 1e-4))
+        self.regressor.fit(X, target)
+        return self
+
+    def decision_function(self, X):
+        return self.regressor.predict(X)
+
+    def predict_proba(self, X):
+        positive = expit(self.decision_function(X))
+        return np.column_stack([1 - positive, positive])
+
+    def predict(self, X):
+        return (self.decision_function(X) > 0).astype(int)
+
+
+def fit_soft_label_logistic(X, teacher_proba, C=10.0):
+    """
+    Logistic regression trained on soft labels.
+
+    Every row appears once as a positive weighted by p and once as a negative
+    weighted by 1 - p, which is exactly cross-entropy against the teacher's
+    probabilities.
+    """
+    n_rows = X.shape[0]
+    X_doubled = np.vstack([X, X])
+    y_doubled = np.concatenate([np.ones(n_rows, dtype=int), np.zeros(n_rows, dtype=int)])
+    weights = np.concatenate([teacher_proba, 1 - teacher_proba])
+
+    model = LogisticRegression(C=C, max_iter=1000)
+    model.fit(X_doubled, y_doubled, sample_weight=weights)
+    return model
+
+
+STUDENT_BUILDERS = {
+    'LogisticRegression': lambda X, p: fit_soft_label_logistic(X, p),
+    'ShallowGradientBoosting': lambda X, p: GradientBoostedStudent().fit(X, p)
+}
+
+
+def distill_model(predictor, disease, X_transfer, X_holdout, candidates=None,
+                  augment_copies=2, noise_scale=0.1, random_state=42):
+    """
+    Train a cheap student on the full model's soft probabilities
+
+    Args:
+        predictor: EnhancedChronicDiseasePredictor holding the trained teacher
+        disease: Disease whose model is distilled
+        X_transfer: Preprocessed rows the teacher labels (usually the training set)
+        X_holdout: Preprocessed rows used only to measure fidelity
+        candidates: Student types to try (keys of STUDENT_BUILDERS)
+        augment_copies: Jittered copies of the transfer set added to widen coverage
+        noise_scale: Std of the jitter, in scaled-feature units
+
+    Returns:
+        The fidelity report stored in model_metadata[disease]['distillation']
+    """
+    config = predictor.distillation_config
+    teacher = predictor.models[disease]
+    candidates = candidates or list(STUDENT_BUILDERS.keys())
+
+    # Jittered copies let the student see the teacher's surface between training points
+    rng = np.random.default_rng(random_state)
+    transfer = [X_transfer] + [
+        X_transfer + rng.normal(0.0, noise_scale, size=X_transfer.shape) for _ in range(augment_copies)
+    ]
+    transfer = np.vstack(transfer)
+    transfer_proba = teacher.predict_proba(transfer)[:, 1]
+
+    teacher_holdout = teacher.predict_proba(X_holdout)[:, 1]
+    teacher_categories = predictor._categorize_risks(teacher_holdout, disease)
+
+    print(f"🎓 Distilling {disease} model into a student ({len(transfer)} transfer rows)...")
+    results = {}
+    students = {}
+    for name in candidates:
+        student = STUDENT_BUILDERS[name](transfer, transfer_proba)
+        student_holdout = student.predict_proba(X_holdout)[:, 1]
+        gap = np.abs(student_holdout - teacher_holdout)
+
+        results[name] = {
+            'mean_abs_gap': float(gap.mean()),
+            'max_abs_gap': float(gap.max()),
+            'category_agreement': float(np.mean(predictor._categorize_risks(student_holdout, disease) == teacher_categories)),
+            'p99_latency_ms': predictor._measure_inference_cost(student, X_holdout)['p99_latency_ms']
+        }
+        results[name]['passes'] = (
+            results[name]['category_agreement'] >= config['min_category_agreement'] and
+            results[name]['mean_abs_gap'] <= config['max_mean_abs_gap']
+        )
+        students[name] = student
+        print(f"    {name}: MAE {results[name]['mean_abs_gap']:.4f}, "
+              f"category agreement {results[name]['category_agreement']:.2%}, "
+              f"p99 {results[name]['p99_latency_ms']:.2f} ms")
+
+    passing = [name for name in candidates if results[name]['passes']]
+    if passing:
+        # Among faithful students, serve the fastest
+        chosen = min(passing, key=lambda name: results[name]['p99_latency_ms'])
+    else:
+        chosen = max(candidates, key=lambda name: (results[name]['category_agreement'], -results[name]['mean_abs_gap']))
+
+    report = {
+        'student_type': chosen,
+        'teacher_type': predictor.model_metadata.get(disease, {}).get('model_type'),
+        'serving': bool(results[chosen]['passes']),
+        'mean_abs_gap': results[chosen]['mean_abs_gap'],
+        'max_abs_gap': results[chosen]['max_abs_gap'],
+        'category_agreement': results[chosen]['category_agreement'],
+        'holdout_rows': int(X_holdout.shape[0]),
+        'fidelity_thresholds': {
+            'min_category_agreement': config['min_category_agreement'],
+            'max_mean_abs_gap': config['max_mean_abs_gap']
+        },
+        'candidates': results
+    }
+
+    predictor.student_models[disease] = students[chosen]
+    predictor.model_metadata.setdefault(disease, {})['distillation'] = report
+
+    if report['serving']:
+        print(f"✅ Serving distilled {chosen} student for {disease}")
+    else:
+        print(f"⚠️ No student met the fidelity threshold for {disease}; serving the full model")
+    return report
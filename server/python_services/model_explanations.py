@@ -0,0 +1,239 @@
+import numpy as np
+from scipy.special import expit
+from sklearn.ensemble import (
+    RandomForestClassifier, ExtraTreesClassifier, GradientBoostingClassifier, VotingClassifier
+)
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from model_distillation import GradientBoostedStudent
+
+# Rows gathered at once from tree contribution tables; bounds memory for large batches
+_TREE_ROW_CHUNK = 1024
+
+
+def _to_probability(base, contributions):
+    """
+    Rescale log-odds contributions into probability space
+
+    The probability change p(x) - p(base) is split between features in
+    proportion to their log-odds contributions, so the result still sums
+    exactly to the change in predicted probability.
+    """
+    logit = base + contributions.sum(axis=1)
+    p = expit(logit)
+    p_base = expit(base)
+    total = logit - base
+    # Where the log-odds barely move, the local slope p(1 - p) is the limit of the ratio
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.where(np.abs(total) > 1e-9, (p - p_base) / total, p * (1 - p))
+    return p_base, contributions * scale[:, None]
+
+
+class LinearExplainer:
+    """Exact log-odds contributions coef_j * (x_j - mean_j) for logistic models"""
+
+    space = 'logit'
+
+    def __init__(self, model, background):
+        self.coef = np.asarray(model.coef_, dtype=float).ravel()
+        self.background = np.asarray(background, dtype=float)
+        self.base = float(np.ravel(model.intercept_)[0] + self.coef @ self.background)
+
+    def explain(self, X):
+        contributions = (np.asarray(X, dtype=float) - self.background) * self.coef
+        return np.full(len(contributions), self.base), contributions
+
+
+class TreeTableExplainer:
+    """
+    Saabas-style path contributions from precomputed per-leaf tables.
+
+    For every leaf the contribution of each feature along the root-to-leaf
+    path (the change in the node's expected output at each split on that
+    feature) is summed once, at build time. Explaining a row is then a single
+    ``apply`` to find its leaves plus a table lookup per tree. Contributions
+    plus the base value reproduce the model output exactly: the averaged
+    probability for forests, the raw log-odds for gradient boosting.
+    """
+
+    def __init__(self, model, n_features):
+        trees, node_values, self.space = self._tree_values(model)
+        self._applier = model.regressor if isinstance(model, GradientBoostedStudent) else model
+
+        tables = []
+        leaf_index = []
+        node_offsets = []
+        offset_nodes = 0
+        offset_leaves = 0
+        root_total = 0.0
+        for tree, values in zip(trees, node_values):
+            table, leaf_rows = self._leaf_table(tree.tree_, values, n_features)
+            tables.append(table)
+            leaf_index.append(np.where(leaf_rows >= 0, leaf_rows + offset_leaves, -1))
+            node_offsets.append(offset_nodes)
+            offset_nodes += tree.tree_.node_count
+            offset_leaves += len(table)
+            root_total += values[0]
+
+        self.tables = np.vstack(tables).astype(np.float32)
+        self.leaf_index = np.concatenate(leaf_index).astype(np.int64)
+        self.node_offsets = np.asarray(node_offsets, dtype=np.int64)
+        self.base = float(root_total)
+
+        if self.space == 'logit':
+            # Gradient boosting adds an initial raw prediction before the trees
+            probe = np.zeros((1, n_features))
+            raw = model.decision_function(probe)
+            self.base = float(np.ravel(raw)[0] - self._contributions(probe).sum())
+
+    @staticmethod
+    def _tree_values(model):
+        if isinstance(model, GradientBoostedStudent):
+            regressor = model.regressor
+            trees = regressor.estimators_[:, 0]
+            return trees, [t.tree_.value[:, 0, 0] * regressor.learning_rate for t in trees], 'logit'
+        if isinstance(model, GradientBoostingClassifier):
+            trees = model.estimators_[:, 0]
+            return trees, [t.tree_.value[:, 0, 0] * model.learning_rate for t in trees], 'logit'
+
+        trees = model.estimators_ if hasattr(model, 'estimators_') else [model]
+        values = []
+        for tree in trees:
+            # Older sklearn stores class counts, newer stores fractions; normalise both
+            class_values = tree.tree_.value[:, 0, :]
+            values.append(class_values[:, 1] / class_values.sum(axis=1) / len(trees))
+        return trees, values, 'proba'
+
+    @staticmethod
+    def _leaf_table(tree, values, n_features):
+        n_nodes = tree.node_count
+        parent = np.full(n_nodes, -1)
+        for node in range(n_nodes):
+            for child in (tree.children_left[node], tree.children_right[node]):
+                if child != -1:
+                    parent[child] = node
+
+        # sklearn numbers nodes depth-first, so a parent always precedes its children
+        path = np.zeros((n_nodes, n_features))
+        for node in range(1, n_nodes):
+            p = parent[node]
+            path[node] = path[p]
+            path[node, tree.feature[p]] += values[node] - values[p]
+
+        is_leaf = tree.children_left == -1
+        leaf_rows = np.full(n_nodes, -1)
+        leaf_rows[is_leaf] = np.arange(is_leaf.sum())
+        return path[is_leaf], leaf_rows
+
+    def _contributions(self, X):
+        leaves = self._applier.apply(X)
+        leaves = np.asarray(leaves).reshape(len(X), -1).astype(np.int64)
+        contributions = np.zeros((len(X), self.tables.shape[1]))
+        for start in range(0, len(X), _TREE_ROW_CHUNK):
+            rows = self.leaf_index[leaves[start:start + _TREE_ROW_CHUNK] + self.node_offsets[None, :]]
+            contributions[start:start + _TREE_ROW_CHUNK] = self.tables[rows].sum(axis=1)
+        return contributions
+
+    def explain(self, X):
+        X = np.asarray(X, dtype=float)
+        return np.full(len(X), self.base), self._contributions(X)
+
+
+class OcclusionExplainer:
+    """
+    Bounded-cost approximation for models without cheap exact attributions
+    (SVC, MLP, naive Bayes, ...).
+
+    Each feature in turn is replaced by its background mean and the drop in
+    predicted probability is its raw effect: one batched predict_proba over
+    n_rows * (n_features + 1) rows, with no sampling. Effects are rescaled to
+    sum to p(x) - p(background) so they read like the exact explainers.
+    """
+
+    space = 'proba'
+
+    def __init__(self, model, background):
+        self.model = model
+        self.background = np.asarray(background, dtype=float)
+        self.base = float(model.predict_proba(self.background[None, :])[0, 1])
+
+    def explain(self, X):
+        X = np.asarray(X, dtype=float)
+        n_rows, n_features = X.shape
+        occluded = np.repeat(X[:, None, :], n_features, axis=1)
+        idx = np.arange(n_features)
+        occluded[:, idx, idx] = self.background
+        stacked = np.vstack([X, occluded.reshape(-1, n_features)])
+        proba = self.model.predict_proba(stacked)[:, 1]
+
+        p = proba[:n_rows]
+        effects = p[:, None] - proba[n_rows:].reshape(n_rows, n_features)
+        total = effects.sum(axis=1)
+        target = p - self.base
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(np.abs(total) > 1e-12, target / total, 0.0)
+        contributions = effects * scale[:, None]
+        # No single feature explains the change; spread it evenly
+        flat = np.abs(total) <= 1e-12
+        contributions[flat] = (target[flat] / n_features)[:, None]
+        return np.full(n_rows, self.base), contributions
+
+
+class EnsembleExplainer:
+    """Soft-voting ensembles: the weighted mean of members' probability-space contributions"""
+
+    space = 'proba'
+
+    def __init__(self, model, background):
+        names = [name for name, _ in model.estimators]
+        weights = np.ones(len(names)) if model.weights is None else np.asarray(model.weights, dtype=float)
+        members = [model.named_estimators_[name] for name in names]
+        self.weights = weights / weights.sum()
+        self.members = [build_explainer(member, background) for member in members]
+
+    def explain(self, X):
+        base = np.zeros(len(X))
+        contributions = None
+        for weight, member in zip(self.weights, self.members):
+            member_base, member_contrib = explain_in_probability(member, X)
+            base += weight * member_base
+            contributions = weight * member_contrib if contributions is None else contributions + weight * member_contrib
+        return base, contributions
+
+
+def build_explainer(model, background):
+    """
+    Precompute the cheapest faithful explainer for a fitted model
+
+    Args:
+        model: The fitted estimator that scores preprocessed (scaled, selected) rows
+        background: Mean preprocessed row; the reference point contributions are measured from
+    """
+    background = np.asarray(background, dtype=float)
+    if isinstance(model, VotingClassifier) and model.voting == 'soft':
+        return EnsembleExplainer(model, background)
+    if isinstance(model, LogisticRegression) or (isinstance(model, SGDClassifier) and model.loss == 'log_loss'):
+        return LinearExplainer(model, background)
+    if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier, DecisionTreeClassifier,
+                          GradientBoostedStudent)) or (
+            isinstance(model, GradientBoostingClassifier) and model.n_classes_ == 2):
+        return TreeTableExplainer(model, len(background))
+    return OcclusionExplainer(model, background)
+
+
+def explain_in_probability(explainer, X):
+    """(base probability, per-feature contributions) that sum to the predicted probability"""
+    base, contributions = explainer.explain(X)
+    if explainer.space == 'logit':
+        return _to_probability(base, contributions)
+    return base, contributions
+
+
+def top_factors(contributions, feature_names, top_k=5):
+    """The top_k features by absolute contribution, largest first"""
+    order = np.argsort(-np.abs(contributions))[:top_k]
+    return [
+        {'feature': feature_names[i], 'contribution': float(contributions[i])}
+        for i in order if contributions[i] != 0
+    ]
@@ -0,0 +1,232 @@
+import time
+import threading
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+
+from frozen_predictor import (
+    AVAILABLE_DISEASES, RISK_LABELS, FrozenDiseaseModel, FrozenPredictor, model_source, read_model
+)
+from model_artifacts import MANIFEST_FILE, is_artifact_dir
+
+
+def _fingerprint(source):
+    """Identity of what is on disk right now; changes whenever a model is rewritten"""
+    if is_artifact_dir(source):
+        # The artifact path is a symlink to the version directory in use
+        version_dir = Path(source).resolve()
+        stat = (version_dir / MANIFEST_FILE).stat()
+        return str(version_dir), stat.st_mtime_ns, stat.st_size
+    stat = Path(source).stat()
+    return str(source), stat.st_mtime_ns, stat.st_size
+
+
+class ModelRegistry:
+    """
+    Serves the newest valid model for each disease from a directory, reloading
+    in the background when retraining writes a new version.
+
+    The models in use are always one immutable FrozenPredictor. A reload builds
+    the new FrozenDiseaseModel off to the side, checks it, and then replaces
+    the FrozenPredictor reference in a single assignment: requests already
+    running keep the snapshot they started with, new requests get the new one,
+    and nothing is ever served from a half-loaded model.
+
+    A changed file is only loaded once its size and mtime have stayed the same
+    for stable_seconds, so a writer that is not atomic (a legacy pickle) is
+    not read mid-write; artifact directories are swapped in atomically by
+    save_artifact.
+    A model that fails to load or validate is skipped until the file changes
+    again; the previous version keeps serving. A model whose file is deleted
+    also keeps serving.
+    """
+
+    def __init__(self, models_dir=None, diseases=None, poll_interval=5.0, stable_seconds=1.0,
+                 serve_student=True, cascade_margin=None):
+        self.models_dir = Path(models_dir or Path(__file__).parent.absolute())
+        self.diseases = diseases or AVAILABLE_DISEASES
+        self.poll_interval = poll_interval
+        self.stable_seconds = stable_seconds
+        self.serve_student = serve_student
+        self.cascade_margin = cascade_margin
+
+        self._current = FrozenPredictor({})
+        self._loaded = {}       # disease -> fingerprint being served
+        self._pending = {}      # disease -> (fingerprint, first seen at)
+        self._rejected = {}     # disease -> fingerprint that failed validation
+        self._status = {disease: {'model_version': None, 'loaded_at': None, 'last_error': None}
+                        for disease in self.diseases}
+        self._swap_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self.check_for_updates(wait_for_stable=False)
+
+    # ------------------------------------------------------------------
+    # Serving
+    # ------------------------------------------------------------------
+    @property
+    def current(self):
+        """The FrozenPredictor in use; hold on to it to score a request against one version"""
+        return self._current
+
+    @property
+    def models(self):
+        return self._current.models
+
+    @property
+    def feature_names(self):
+        return self._current.feature_names
+
+    def predict_risk_score(self, patient_data, disease, explain=False):
+        return self._current.predict_risk_score(patient_data, disease, explain=explain)
+
+    def predict_risk_batch(self, patient_frame, disease, explain=False):
+        return self._current.predict_risk_batch(patient_frame, disease, explain=explain)
+
+    # ------------------------------------------------------------------
+    # Reloading
+    # ------------------------------------------------------------------
+    def _validate(self, model):
+        """A model is only swapped in if it scores a probe row sensibly"""
+        if model.input_columns is None or len(model.input_columns) == 0:
+            raise ValueError("model has no input columns")
+        if not np.all(np.diff(model.bounds) > 0):
+            raise ValueError(f"risk thresholds are not increasing: {dict(model.risk_thresholds)}")
+
+        # All-missing rows exercise the full pipeline: imputation, encoding, scaling, selection
+        probe = {col: None for col in model.input_columns}
+        batch = model.predict_batch([probe, probe])
+        scores = np.asarray(batch['risk_score'], dtype=float)
+        if scores.shape != (2,) or not np.all(np.isfinite(scores)) or scores.min() < 0 or scores.max() > 1:
+            raise ValueError(f"probe scores out of range: {scores}")
+        if not np.isin(batch['risk_category'], RISK_LABELS).all():
+            raise ValueError("probe produced unknown risk categories")
+
+    def _load_candidate(self, disease, source):
+        model_data, model_version = read_model(source, verify=True)
+        model = FrozenDiseaseModel(
+            disease, model_data,
+            serve_student=self.serve_student,
+            cascade_margin=self.cascade_margin,
+            model_version=model_version
+        )
+        self._validate(model)
+        return model
+
+    def _ready(self, disease, fingerprint, wait_for_stable):
+        """True once a changed file has been unchanged for stable_seconds"""
+        if not wait_for_stable:
+            return True
+        now = time.monotonic()
+        pending = self._pending.get(disease)
+        if pending is None or pending[0] != fingerprint:
+            self._pending[disease] = (fingerprint, now)
+            return self.stable_seconds <= 0
+        return now - pending[1] >= self.stable_seconds
+
+    def check_for_updates(self, wait_for_stable=True):
+        """
+        Look for new model versions once and swap in any that validate
+
+        Returns:
+            List of diseases whose model was replaced
+        """
+        with self._swap_lock:
+            replacements = {}
+            for disease in self.diseases:
+                try:
+                    source = model_source(self.models_dir, disease)
+                    if source is None:
+                        continue
+                    fingerprint = _fingerprint(source)
+                except OSError:
+                    # Replaced between the existence check and stat; next poll sees it
+                    continue
+
+                if fingerprint in (self._loaded.get(disease), self._rejected.get(disease)):
+                    continue
+                if not self._ready(disease, fingerprint, wait_for_stable):
+                    continue
+
+                try:
+                    model = self._load_candidate(disease, source)
+                    if _fingerprint(source) != fingerprint:
+                        # Rewritten while we were loading it; try again once it settles
+                        self._pending.pop(disease, None)
+                        continue
+                except Exception as e:
+                    self._rejected[disease] = fingerprint
+                    self._status[disease]['last_error'] = str(e)
+                    print(f"❌ Rejected new {disease} model from {source}: {e}")
+                    continue
+
+                replacements[disease] = model
+                self._loaded[disease] = fingerprint
+                self._pending.pop(disease, None)
+                self._status[disease].update({
+                    'model_version': model.model_version,
+                    'loaded_at': datetime.now().isoformat(),
+                    'last_error': None,
+                    'source': str(source)
+                })
+
+            if replacements:
+                # The swap itself: one reference assignment
+                self._current = FrozenPredictor({**self._current.models, **replacements})
+                for disease, model in replacements.items():
+                    print(f"🔄 Serving {disease} model version {model.model_version}")
+
+        return list(replacements.keys())
+
+    def status(self):
+        """Served version, load time and last rejection per disease"""
+        with self._swap_lock:
+            return {disease: dict(info) for disease, info in self._status.items()}
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.check_for_updates()
+            except Exception as e:
+                print(f"⚠️ Model reload check failed: {e}")
+
+    def start(self):
+        """Start polling the model directory in a daemon thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._watch, name='model-registry', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Watch a model directory and hot-reload new versions')
+    parser.add_argument('--models-dir', default=str(Path(__file__).parent.absolute()))
+    parser.add_argument('--interval', type=float, default=5.0)
+    parser.add_argument('--stable-seconds', type=float, default=1.0)
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.models_dir, poll_interval=args.interval, stable_seconds=args.stable_seconds)
+    print(json.dumps(registry.status(), indent=2))
+    with registry:
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            pass
@@ -1,18 +1,39 @@
 import os
+import threading
 import pandas as pd
 import numpy as np
-import requests
 import json
-import zipfile
 from pathlib import Path
 from datetime import datetime
-import kaggle
-from kaggle.api.kaggle_api_extended import KaggleApi
+from data_paths import data_path
+from dataset_store import LocalDatasetStore
+from fetch_engine import ConcurrentFetchEngine
+from cdc_stream_reader import SocrataStreamReader
+from lean_dataset_loader import read_csv_lean
 import warnings
 warnings.filterwarnings('ignore')
 
 class MultiAPIDatasetFetcher:
-    def __init__(self):
+    def __init__(self, offline=None, cache_dir=None, cache_ttl_hours=24 * 7,
+                 fetch_engine=None, max_workers=6):
+        """
+        Args:
+            offline: Only serve datasets from the local store, never touch the network.
+                     Defaults to the CARESYNC_OFFLINE environment variable.
+            cache_dir: Directory holding the local dataset store (default: dataset_cache in the data directory)
+            cache_ttl_hours: How long a downloaded dataset is reused before re-fetching
+            fetch_engine: Shared ConcurrentFetchEngine (pooled session, retries, timeouts)
+            max_workers: Diseases / sources fetched in parallel
+        """
+        if offline is None:
+            offline = os.getenv('CARESYNC_OFFLINE', '').lower() in ('1', 'true', 'yes')
+        self.offline = offline
+        self.max_workers = max_workers
+        self.engine = fetch_engine or ConcurrentFetchEngine(max_workers=max_workers)
+        # The Kaggle client is not documented as thread-safe, so downloads go one at a time
+        self._kaggle_lock = threading.Lock()
+        self._kaggle_setup_attempted = False
+        
         self.datasets_config = {
             'diabetes': {
                 'sources': [
@@ -62,13 +83,15 @@ class MultiAPIDatasetFetcher:
                     {
                         'name': 'kidney_disease_uci',
                         'type': 'direct_url',
-                        'url': 'https://raw.githubusercontent.com/mpuig/chronic-kidney-disease/master/data/kidney_disease.csv'
+                        'url': 'https://raw.githubusercontent.com/mpuig/chronic-kidney-disease/master/data/kidney_disease.csv',
+                        'schema': {'exclude_columns': ['id']}
                     },
                     {
                         'name': 'kidney_disease_kaggle',
                         'type': 'kaggle',
                         'dataset_id': 'mansoordaku/ckdisease',
-                        'file_name': 'kidney_disease.csv'
+                        'file_name': 'kidney_disease.csv',
+                        'schema': {'exclude_columns': ['id']}
                     }
                 ]
             },
@@ -107,16 +130,20 @@ class MultiAPIDatasetFetcher:
                     {
                         'name': 'copd_kaggle',
                         'type': 'kaggle',
-                        'dataset_id': 'prakharrathi25/copd-student-dataset'
+                        'dataset_id': 'prakharrathi25/copd-student-dataset',
+                        'schema': {'exclude_columns': ['Unnamed: 0', 'ID']}
                     }
                 ]
             }
         }
         
         self.api_configs = {
-            'kaggle': self._setup_kaggle_api(),
+            # Importing kaggle authenticates, so it waits until a Kaggle source is used (see _kaggle_api)
+            'kaggle': None,
             'cdc': {
                 'base_url': 'https://chronicdata.cdc.gov/api/views',
+                'resource_url': 'https://chronicdata.cdc.gov/resource',
+                'page_size': 10000,
                 'endpoints': {
                     'brfss': 'waxm-p5qv',
                     'diabetes': 'vt4j-ke6b',
@@ -132,12 +159,24 @@ class MultiAPIDatasetFetcher:
             }
         }
         
-        self.cache_dir = Path('dataset_cache')
-        self.cache_dir.mkdir(exist_ok=True)
+        self.cache_dir = Path(cache_dir or data_path('dataset_cache'))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.store = LocalDatasetStore(self.cache_dir, default_ttl_hours=cache_ttl_hours)
     
+    def _kaggle_api(self):
+        """The authenticated Kaggle client, set up on first use; always None in offline mode"""
+        if self.offline:
+            return None
+        with self._kaggle_lock:
+            if not self._kaggle_setup_attempted:
+                self._kaggle_setup_attempted = True
+                self.api_configs['kaggle'] = self._setup_kaggle_api()
+        return self.api_configs['kaggle']
+
     def _setup_kaggle_api(self):
         """Setup Kaggle API with authentication"""
         try:
+            from kaggle.api.kaggle_api_extended import KaggleApi
             api = KaggleApi()
             api.authenticate()
             print("✓ Kaggle API authenticated successfully")
@@ -150,24 +189,25 @@ class MultiAPIDatasetFetcher:
             print("3. Place kaggle.json in ~/.kaggle/ directory")
             return None
     
-    def fetch_from_direct_url(self, url, columns=None):
-        """Fetch dataset from direct URL"""
+    def fetch_from_direct_url(self, url, columns=None, schema=None):
+        """
+        Fetch dataset from direct URL
+        
+        ``schema`` is passed to read_csv_lean (usecols / exclude_columns /
+        categorical_columns) so unused columns are never parsed.
+        """
         try:
             print(f"Fetching from URL: {url}")
             
+            response = self.engine.get(url)
+            
             # Handle different file formats
-            if url.endswith('.csv'):
-                if columns:
-                    df = pd.read_csv(url, names=columns)
-                else:
-                    df = pd.read_csv(url)
-            elif url.endswith('.json'):
-                response = requests.get(url)
+            if url.endswith('.json'):
                 data = response.json()
                 df = pd.json_normalize(data)
             else:
                 # Try CSV as default
-                df = pd.read_csv(url)
+                df = read_csv_lean(response.content, names=columns, **(schema or {}))
             
             print(f"✓ Dataset loaded: {df.shape}")
             return df
@@ -176,9 +216,10 @@ class MultiAPIDatasetFetcher:
             print(f"❌ Error fetching from URL: {e}")
             return None
     
-    def fetch_from_kaggle(self, dataset_id, file_name=None):
+    def fetch_from_kaggle(self, dataset_id, file_name=None, schema=None):
         """Fetch dataset from Kaggle"""
-        if not self.api_configs['kaggle']:
+        kaggle_api = self._kaggle_api()
+        if not kaggle_api:
             print("❌ Kaggle API not available")
             return None
         
@@ -189,18 +230,19 @@ class MultiAPIDatasetFetcher:
             cache_path = self.cache_dir / dataset_id.replace('/', '_')
             cache_path.mkdir(exist_ok=True)
             
-            self.api_configs['kaggle'].dataset_download_files(
-                dataset_id, 
-                path=str(cache_path),
-                unzip=True,
-                quiet=True
-            )
+            with self._kaggle_lock:
+                kaggle_api.dataset_download_files(
+                    dataset_id, 
+                    path=str(cache_path),
+                    unzip=True,
+                    quiet=True
+                )
             
             # Find and load the dataset file
             if file_name:
                 file_path = cache_path / file_name
                 if file_path.exists():
-                    df = pd.read_csv(file_path)
+                    df = read_csv_lean(file_path, **(schema or {}))
                 else:
                     print(f"❌ File {file_name} not found in dataset")
                     return None
@@ -208,7 +250,7 @@ class MultiAPIDatasetFetcher:
                 # Find the first CSV file
                 csv_files = list(cache_path.glob('*.csv'))
                 if csv_files:
-                    df = pd.read_csv(csv_files[0])
+                    df = read_csv_lean(csv_files[0], **(schema or {}))
                 else:
                     print("❌ No CSV files found in dataset")
                     return None
@@ -220,23 +262,28 @@ class MultiAPIDatasetFetcher:
             print(f"❌ Error fetching from Kaggle: {e}")
             return None
     
-    def fetch_from_cdc_api(self, endpoint, limit=10000):
-        """Fetch data from CDC API"""
+    def stream_cdc_to_parquet(self, endpoint, output_path=None, max_rows=None):
+        """Page through a CDC dataset into a parquet file without holding it in memory"""
+        cdc_config = self.api_configs['cdc']
+        endpoint_id = cdc_config['endpoints'].get(endpoint, endpoint)
+        if output_path is None:
+            output_path = self.cache_dir / 'cdc' / f"{endpoint_id}.parquet"
+        
+        reader = SocrataStreamReader(
+            resource_url=cdc_config['resource_url'],
+            views_url=cdc_config['base_url'],
+            fetch_engine=self.engine,
+            page_size=cdc_config.get('page_size', 10000)
+        )
+        return reader.stream_to_parquet(endpoint_id, output_path, max_rows=max_rows)
+    
+    def fetch_from_cdc_api(self, endpoint, limit=None):
+        """Fetch data from CDC API (all rows unless limit is given)"""
         try:
-            base_url = self.api_configs['cdc']['base_url']
-            endpoint_id = self.api_configs['cdc']['endpoints'].get(endpoint, endpoint)
-            
-            url = f"{base_url}/{endpoint_id}/rows.json?$limit={limit}"
             print(f"Fetching from CDC API: {endpoint}")
             
-            response = requests.get(url)
-            response.raise_for_status()
-            
-            data = response.json()
-            if 'data' in data:
-                df = pd.DataFrame(data['data'], columns=data.get('meta', {}).get('view', {}).get('columns', []))
-            else:
-                df = pd.json_normalize(data)
+            result = self.stream_cdc_to_parquet(endpoint, max_rows=limit)
+            df = pd.read_parquet(result['path'])
             
             print(f"✓ CDC data loaded: {df.shape}")
             return df
@@ -256,8 +303,7 @@ class MultiAPIDatasetFetcher:
             
             print(f"Fetching from WHO API: {indicator}")
             
-            response = requests.get(url)
-            response.raise_for_status()
+            response = self.engine.get(url)
             
             data = response.json()
             df = pd.json_normalize(data.get('value', []))
@@ -269,7 +315,7 @@ class MultiAPIDatasetFetcher:
             print(f"❌ Error fetching from WHO API: {e}")
             return None
     
-    def fetch_dataset(self, disease, source_preference=None, fallback=True):
+    def fetch_dataset(self, disease, source_preference=None, fallback=True, refresh=False):
         """
         Fetch dataset for a specific disease with multiple source options
         
@@ -277,10 +323,11 @@ class MultiAPIDatasetFetcher:
             disease: Disease type (diabetes, heart_disease, etc.)
             source_preference: Preferred source type ('kaggle', 'direct_url', 'cdc', 'who')
             fallback: Whether to try other sources if preferred fails
+            refresh: Ignore fresh cache entries and download again
         """
         if disease not in self.datasets_config:
             print(f"❌ Disease '{disease}' not configured")
-            return None
+            return None, None
         
         sources = self.datasets_config[disease]['sources']
         
@@ -288,6 +335,20 @@ class MultiAPIDatasetFetcher:
         if source_preference:
             sources = sorted(sources, key=lambda x: 0 if x['type'] == source_preference else 1)
         
+        # Serve from the local store first; offline mode also accepts expired entries
+        if not refresh or self.offline:
+            for source in sources:
+                df, cached_source = self.store.get(disease, source['name'], allow_stale=self.offline)
+                if df is not None and not df.empty:
+                    print(f"📦 Loaded {disease} dataset from local store ({source['name']}): {df.shape}")
+                    return df, cached_source
+                if not fallback:
+                    break
+        
+        if self.offline:
+            print(f"❌ Offline mode: no cached dataset for {disease}")
+            return None, None
+        
         for source in sources:
             print(f"\n🔍 Trying source: {source['name']} ({source['type']})")
             
@@ -295,12 +356,14 @@ class MultiAPIDatasetFetcher:
                 if source['type'] == 'direct_url':
                     df = self.fetch_from_direct_url(
                         source['url'], 
-                        source.get('columns')
+                        source.get('columns'),
+                        source.get('schema')
                     )
                 elif source['type'] == 'kaggle':
                     df = self.fetch_from_kaggle(
                         source['dataset_id'],
-                        source.get('file_name')
+                        source.get('file_name'),
+                        source.get('schema')
                     )
                 elif source['type'] == 'cdc':
                     df = self.fetch_from_cdc_api(source['endpoint'])
@@ -314,9 +377,10 @@ class MultiAPIDatasetFetcher:
                     print(f"✅ Successfully loaded dataset from {source['name']}")
                     
                     # Cache the dataset
-                    cache_file = self.cache_dir / f"{disease}_{source['name']}.csv"
-                    df.to_csv(cache_file, index=False)
-                    print(f"💾 Dataset cached to: {cache_file}")
+                    try:
+                        self.store.put(disease, source, df)
+                    except Exception as e:
+                        print(f"⚠️ Could not cache dataset: {e}")
                     
                     return df, source
                 
@@ -326,20 +390,34 @@ class MultiAPIDatasetFetcher:
             if not fallback:
                 break
         
+        # Last resort: an expired cache entry is better than nothing, in the same source order
+        for source in sources:
+            df, cached_source = self.store.get(disease, source['name'], allow_stale=True)
+            if df is not None and not df.empty:
+                print(f"⚠️ All sources failed, using stale cached dataset for {disease} ({source['name']})")
+                return df, cached_source
+            if not fallback:
+                break
+        
         print(f"❌ All sources failed for disease: {disease}")
         return None, None
     
-    def fetch_all_datasets(self, source_preference=None):
-        """Fetch all available datasets"""
-        datasets = {}
+    def fetch_all_datasets(self, source_preference=None, max_workers=None):
+        """Fetch all available datasets, several diseases at a time"""
+        diseases = list(self.datasets_config.keys())
+        print(f"\n🔍 FETCHING {len(diseases)} DATASETS ({max_workers or self.max_workers} in parallel)")
         
-        for disease in self.datasets_config.keys():
-            print(f"\n{'='*50}")
-            print(f"🔍 FETCHING DATASET: {disease.upper()}")
-            print('='*50)
-            
-            result = self.fetch_dataset(disease, source_preference)
-            if result[0] is not None:
+        results = self.engine.map(
+            lambda disease: self.fetch_dataset(disease, source_preference),
+            diseases,
+            max_workers=max_workers or self.max_workers
+        )
+        
+        datasets = {}
+        for disease, result in zip(diseases, results):
+            if isinstance(result, Exception):
+                print(f"❌ Failed to fetch {disease} dataset: {result}")
+            elif result[0] is not None:
                 datasets[disease] = {
                     'data': result[0],
                     'source': result[1],
@@ -378,8 +456,25 @@ class MultiAPIDatasetFetcher:
             print(f"  {i}. {disease.replace('_', ' ').title()} ({source_count} sources)")
         return diseases
     
+    def _probe_source(self, source):
+        """Check a single source is reachable; returns True/False"""
+        if source['type'] == 'direct_url':
+            response = self.engine.head(source['url'])
+            return response.status_code == 200
+        
+        elif source['type'] == 'kaggle':
+            kaggle_api = self._kaggle_api()
+            if not kaggle_api:
+                return False
+            # Test by getting dataset info
+            with self._kaggle_lock:
+                kaggle_api.dataset_list_files(source['dataset_id'])
+            return True
+        
+        return True  # Assume working for other types
+    
     def test_all_sources(self):
-        """Test connectivity to all data sources"""
+        """Test connectivity to all data sources concurrently"""
         print("🔍 Testing all data sources...")
         
         results = {
@@ -388,35 +483,19 @@ class MultiAPIDatasetFetcher:
             'total_sources': 0
         }
         
-        for disease, config in self.datasets_config.items():
-            for source in config['sources']:
-                results['total_sources'] += 1
-                source_id = f"{disease}:{source['name']}"
-                
-                try:
-                    if source['type'] == 'direct_url':
-                        response = requests.head(source['url'], timeout=10)
-                        if response.status_code == 200:
-                            results['working'].append(source_id)
-                        else:
-                            results['failed'].append(source_id)
-                    
-                    elif source['type'] == 'kaggle':
-                        if self.api_configs['kaggle']:
-                            # Test by getting dataset info
-                            try:
-                                self.api_configs['kaggle'].dataset_list_files(source['dataset_id'])
-                                results['working'].append(source_id)
-                            except:
-                                results['failed'].append(source_id)
-                        else:
-                            results['failed'].append(source_id)
-                    
-                    else:
-                        results['working'].append(source_id)  # Assume working for other types
-                        
-                except Exception:
-                    results['failed'].append(source_id)
+        probes = [
+            (f"{disease}:{source['name']}", source)
+            for disease, config in self.datasets_config.items()
+            for source in config['sources']
+        ]
+        results['total_sources'] = len(probes)
+        
+        outcomes = self.engine.map(lambda probe: self._probe_source(probe[1]), probes)
+        for (source_id, _), outcome in zip(probes, outcomes):
+            if outcome is True:
+                results['working'].append(source_id)
+            else:
+                results['failed'].append(source_id)
         
         # Print results
         print(f"\n📊 Source Connectivity Test Results:")
@@ -0,0 +1,410 @@
+from collections import Counter
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scipy import stats
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.feature_selection import SelectKBest, f_classif
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import accuracy_score, roc_auc_score
+
+
+class OutOfCoreTrainer:
+    """
+    Train a disease model without loading the whole dataset into memory.
+
+    Chunks are streamed from the parquet object in the local dataset store and
+    go through three passes:
+
+    1. imputation statistics (column means / modes) and the class labels,
+       with each column's type and the target labels settled for the whole
+       file so every chunk is encoded the same way,
+    2. a streaming ``StandardScaler.partial_fit`` plus per-class sums used to
+       compute the same ANOVA F-scores ``SelectKBest(f_classif)`` would,
+    3. ``partial_fit`` of incremental learners for a few epochs.
+
+    A deterministic per-chunk holdout sample is kept for evaluation. The
+    fitted components are written onto the predictor under the same keys
+    ``train_advanced_model`` uses, so ``save_model``/``load_model`` work
+    unchanged.
+    """
+
+    def __init__(self, predictor, chunk_size=100000, holdout_fraction=0.1,
+                 max_holdout_rows=200000, epochs=3, random_state=42):
+        self.predictor = predictor
+        self.chunk_size = chunk_size
+        self.holdout_fraction = holdout_fraction
+        self.max_holdout_rows = max_holdout_rows
+        self.epochs = epochs
+        self.random_state = random_state
+
+    # ------------------------------------------------------------------
+    # Chunk streaming
+    # ------------------------------------------------------------------
+    def _settle_target(self, parquet_path, disease):
+        """
+        (target column, {raw value: label}) for the whole file
+
+        The prepare functions label-encode or binarise the target from the
+        values in the frame they are given, so two chunks could label the same
+        raw value differently. Preparing one frame that holds every distinct
+        raw value (read from the target column alone) fixes a single mapping.
+        """
+        parquet_file = pq.ParquetFile(parquet_path)
+        first = next(parquet_file.iter_batches(batch_size=1), None)
+        if first is None:
+            raise ValueError(f"No rows found for {disease}")
+        first = first.to_pandas()
+        _, _, target_column = self.predictor._prepare_disease_dataset(first, disease)
+        if target_column is None:
+            raise ValueError(f"Could not prepare {disease} dataset")
+
+        distinct = None
+        for batch in parquet_file.iter_batches(batch_size=self.chunk_size, columns=[target_column]):
+            values = batch.column(0)
+            if pa.types.is_dictionary(values.type):
+                values = values.dictionary_decode()
+            distinct = values.unique() if distinct is None else pa.concat_arrays([distinct, values.unique()]).unique()
+        values = distinct.to_pandas()
+        if isinstance(first[target_column].dtype, pd.CategoricalDtype):
+            values = values.astype('category')
+
+        frame = first.iloc[[0] * len(values)].reset_index(drop=True)
+        frame[target_column] = values
+        _, labels, _ = self.predictor._prepare_disease_dataset(frame, disease)
+        return target_column, dict(zip(values.astype(object), np.asarray(labels).tolist()))
+
+    def _iter_chunks(self, parquet_path, disease, schema):
+        """
+        Yield (chunk_index, X, y, holdout_mask) for each prepared chunk
+
+        Labels come from schema's target mapping. Once schema holds the column
+        types, every chunk is coerced to them: numeric columns with
+        pd.to_numeric, and a categorical column that prepare turned numeric in
+        this chunk gets its raw text back, so its categories match the chunks
+        where it stayed text. The columns that came out non-numeric are
+        added to schema['non_numeric_seen'].
+        """
+        parquet_file = pq.ParquetFile(parquet_path)
+        for index, batch in enumerate(parquet_file.iter_batches(batch_size=self.chunk_size)):
+            frame = batch.to_pandas()
+            X, y, _ = self.predictor._prepare_disease_dataset(frame, disease)
+            if X is None or y is None:
+                raise ValueError(f"Could not prepare chunk {index} of {disease} dataset")
+
+            schema['non_numeric_seen'].update(col for col in X.columns if not pd.api.types.is_numeric_dtype(X[col]))
+            if schema.get('numeric_columns') is not None:
+                for col in schema['numeric_columns']:
+                    if not pd.api.types.is_numeric_dtype(X[col]):
+                        X[col] = pd.to_numeric(X[col].astype(object), errors='coerce')
+                for col in schema['categorical_columns']:
+                    if pd.api.types.is_numeric_dtype(X[col]) and col in frame.columns:
+                        X[col] = frame[col].astype(object).where(X[col].notna())
+
+            y = np.asarray(frame[schema['target_column']].astype(object).map(schema['target_mapping']))
+            # Seeded by chunk index so every pass sees the same split
+            rng = np.random.default_rng((self.random_state, index))
+            holdout = rng.random(len(y)) < self.holdout_fraction
+            yield index, X.reset_index(drop=True), y, holdout
+
+    # ------------------------------------------------------------------
+    # Pass 1: imputation statistics
+    # ------------------------------------------------------------------
+    def _collect_statistics(self, parquet_path, disease):
+        target_column, target_mapping = self._settle_target(parquet_path, disease)
+        schema = {'target_column': target_column, 'target_mapping': target_mapping, 'numeric_columns': None}
+        statistics = None
+        while statistics is None:
+            schema['non_numeric_seen'] = set()
+            statistics = self._scan_statistics(parquet_path, disease, schema)
+            # A column is numeric only if it is numeric in every chunk (as it would be
+            # with the whole file in memory). Columns assumed numeric from the first chunk
+            # that turn out mixed need one more scan with the kinds fixed.
+            mixed = [col for col in statistics['numeric_columns'] if col in schema['non_numeric_seen']]
+            if mixed:
+                print(f"  Columns numeric in some chunks only, treated as categorical: {', '.join(mixed)}")
+                schema['numeric_columns'] = [col for col in statistics['numeric_columns'] if col not in mixed]
+                schema['categorical_columns'] = [col for col in statistics['columns']
+                                                 if col not in schema['numeric_columns']]
+                statistics = None
+
+        statistics['schema'] = schema
+        return statistics
+
+    def _scan_statistics(self, parquet_path, disease, schema):
+        columns = None
+        numeric_columns = []
+        categorical_columns = []
+        sums = counts = None
+        value_counts = {}
+        classes = set()
+        total_rows = 0
+
+        for _, X, y, holdout in self._iter_chunks(parquet_path, disease, schema):
+            X_train, y_train = X[~holdout], y[~holdout]
+            if columns is None:
+                columns = list(X.columns)
+                if schema['numeric_columns'] is None:
+                    schema['numeric_columns'] = X.select_dtypes(include=[np.number]).columns.tolist()
+                    schema['categorical_columns'] = [col for col in columns if col not in schema['numeric_columns']]
+                numeric_columns = schema['numeric_columns']
+                categorical_columns = schema['categorical_columns']
+                sums = np.zeros(len(numeric_columns))
+                counts = np.zeros(len(numeric_columns))
+                value_counts = {col: Counter() for col in categorical_columns}
+
+            if numeric_columns:
+                values = X_train[numeric_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+                sums += np.nansum(values, axis=0)
+                counts += np.sum(~np.isnan(values), axis=0)
+
+            for col in categorical_columns:
+                value_counts[col].update(X_train[col].dropna().astype(str))
+
+            classes.update(np.unique(y_train).tolist())
+            total_rows += len(y)
+
+        if columns is None:
+            raise ValueError(f"No rows found for {disease}")
+
+        means = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+        modes = {col: (counts_.most_common(1)[0][0] if counts_ else 'missing')
+                 for col, counts_ in value_counts.items()}
+
+        return {
+            'columns': columns,
+            'numeric_columns': numeric_columns,
+            'categorical_columns': categorical_columns,
+            'means': means,
+            'modes': modes,
+            'categories': {col: sorted(counts_.keys()) for col, counts_ in value_counts.items()},
+            'classes': np.array(sorted(classes)),
+            'total_rows': total_rows
+        }
+
+    def _build_imputers_and_encoders(self, statistics):
+        """Fit imputers and label encoders from the pass-1 statistics"""
+        numeric_imputer = None
+        if statistics['numeric_columns']:
+            # A one-row frame of means makes SimpleImputer's statistics_ exactly those means
+            numeric_imputer = SimpleImputer(strategy='mean')
+            numeric_imputer.fit(pd.DataFrame([statistics['means']], columns=statistics['numeric_columns']))
+
+        categorical_imputer = None
+        label_encoders = {}
+        if statistics['categorical_columns']:
+            modes = statistics['modes']
+            categorical_imputer = SimpleImputer(strategy='most_frequent')
+            categorical_imputer.fit(pd.DataFrame([modes], columns=statistics['categorical_columns'], dtype=object))
+
+            for col in statistics['categorical_columns']:
+                le = LabelEncoder()
+                le.fit(sorted(set(statistics['categories'][col]) | {str(modes[col])}))
+                label_encoders[col] = le
+
+        return {'numeric': numeric_imputer, 'categorical': categorical_imputer}, label_encoders
+
+    def _transform_chunk(self, X, statistics, imputers, label_encoders):
+        """Impute and label-encode a chunk exactly as preprocess_features does"""
+        X = X[statistics['columns']]
+        numeric_columns = statistics['numeric_columns']
+        categorical_columns = statistics['categorical_columns']
+
+        if numeric_columns:
+            numeric = X[numeric_columns].apply(pd.to_numeric, errors='coerce')
+            X[numeric_columns] = imputers['numeric'].transform(numeric)
+
+        for col in categorical_columns:
+            values = X[col].astype(object)
+            values = values.where(values.notna(), statistics['modes'][col]).astype(str)
+            le = label_encoders[col]
+            known = np.isin(values, le.classes_)
+            # Unseen categories fall back to the most frequent training value
+            values = values.where(known, str(statistics['modes'][col]))
+            X[col] = le.transform(values)
+
+        return X.astype(np.float64)
+
+    # ------------------------------------------------------------------
+    # Pass 2: streaming scaler and ANOVA statistics
+    # ------------------------------------------------------------------
+    def _fit_scaler_and_selector(self, parquet_path, disease, statistics, imputers, label_encoders):
+        scaler = StandardScaler()
+        classes = statistics['classes']
+        n_features = len(statistics['columns'])
+        class_counts = np.zeros(len(classes))
+        class_sums = np.zeros((len(classes), n_features))
+        class_sumsq = np.zeros((len(classes), n_features))
+
+        for _, X, y, holdout in self._iter_chunks(parquet_path, disease, statistics['schema']):
+            X_train = self._transform_chunk(X[~holdout], statistics, imputers, label_encoders)
+            y_train = y[~holdout]
+            if len(y_train) == 0:
+                continue
+
+            scaler.partial_fit(X_train)
+            values = X_train.to_numpy()
+            for k, label in enumerate(classes):
+                rows = values[y_train == label]
+                class_counts[k] += len(rows)
+                class_sums[k] += rows.sum(axis=0)
+                class_sumsq[k] += (rows ** 2).sum(axis=0)
+
+        # One-way ANOVA F per feature; invariant to the scaling applied later
+        n_total = class_counts.sum()
+        grand_mean = class_sums.sum(axis=0) / n_total
+        class_means = class_sums / class_counts[:, None]
+        ss_between = (class_counts[:, None] * (class_means - grand_mean) ** 2).sum(axis=0)
+        ss_within = (class_sumsq - class_counts[:, None] * class_means ** 2).sum(axis=0)
+        df_between = len(classes) - 1
+        df_within = n_total - len(classes)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f_scores = (ss_between / df_between) / (ss_within / df_within)
+        f_scores = np.nan_to_num(f_scores, nan=0.0, posinf=np.finfo(np.float64).max)
+        p_values = stats.f.sf(f_scores, df_between, df_within)
+
+        selector = SelectKBest(f_classif, k=min(10, n_features))
+        selector.scores_ = f_scores
+        selector.pvalues_ = p_values
+        selector.n_features_in_ = n_features
+
+        return scaler, selector
+
+    # ------------------------------------------------------------------
+    # Pass 3: incremental learners
+    # ------------------------------------------------------------------
+    def _candidate_models(self):
+        return {
+            'SGDLogistic': SGDClassifier(loss='log_loss', alpha=1e-4, random_state=self.random_state),
+            'SGDModifiedHuber': SGDClassifier(loss='modified_huber', alpha=1e-4, random_state=self.random_state),
+            'GaussianNB': GaussianNB()
+        }
+
+    def train(self, disease, source_name=None, parquet_path=None):
+        """
+        Train an out-of-core model for a disease from the local dataset store
+
+        Args:
+            disease: Disease type
+            source_name: Restrict to a cached source (defaults to the best cached entry)
+            parquet_path: Explicit parquet file instead of the store lookup
+
+        Returns:
+            The selected model, or None if no cached dataset is available
+        """
+        if parquet_path is None:
+            parquet_path = self.predictor.fetcher.store.get_path(disease, source_name, allow_stale=True)
+        if parquet_path is None:
+            print(f"❌ No cached dataset for {disease}; fetch it once before out-of-core training")
+            return None
+
+        print(f"🌊 Out-of-core training for {disease} from {parquet_path}")
+
+        statistics = self._collect_statistics(parquet_path, disease)
+        imputers, label_encoders = self._build_imputers_and_encoders(statistics)
+        scaler, selector = self._fit_scaler_and_selector(parquet_path, disease, statistics, imputers, label_encoders)
+        print(f"  Pass 1-2 complete: {statistics['total_rows']} rows, {len(statistics['columns'])} columns")
+
+        models = self._candidate_models()
+        classes = statistics['classes']
+        holdout_X, holdout_y = [], []
+        holdout_rows = 0
+        training_samples = 0
+
+        for epoch in range(self.epochs):
+            rng = np.random.default_rng((self.random_state, epoch))
+            for index, X, y, holdout in self._iter_chunks(parquet_path, disease, statistics['schema']):
+                X_all = self._transform_chunk(X, statistics, imputers, label_encoders)
+                X_selected = selector.transform(scaler.transform(X_all))
+
+                if epoch == 0 and holdout.any() and holdout_rows < self.max_holdout_rows:
+                    take = min(int(holdout.sum()), self.max_holdout_rows - holdout_rows)
+                    holdout_X.append(X_selected[holdout][:take])
+                    holdout_y.append(y[holdout][:take])
+                    holdout_rows += take
+
+                X_train, y_train = X_selected[~holdout], y[~holdout]
+                if len(y_train) == 0:
+                    continue
+                if epoch == 0:
+                    training_samples += len(y_train)
+
+                order = rng.permutation(len(y_train))
+                for name, model in models.items():
+                    if name == 'GaussianNB' and epoch > 0:
+                        continue  # NB statistics are exact after one pass
+                    model.partial_fit(X_train[order], y_train[order], classes=classes)
+
+            print(f"  Epoch {epoch + 1}/{self.epochs} complete")
+
+        if not holdout_X:
+            print("❌ Holdout sample is empty; cannot evaluate models")
+            return None
+
+        X_holdout = np.vstack(holdout_X)
+        y_holdout = np.concatenate(holdout_y)
+
+        model_scores = {}
+        for name, model in models.items():
+            proba = model.predict_proba(X_holdout)[:, 1]
+            try:
+                auc_score = roc_auc_score(y_holdout, proba)
+            except ValueError:
+                auc_score = float('nan')
+            model_scores[name] = {
+                'accuracy': accuracy_score(y_holdout, model.predict(X_holdout)),
+                'auc_score': auc_score
+            }
+            print(f"    {name}: Accuracy: {model_scores[name]['accuracy']:.4f}, AUC: {auc_score:.4f}")
+
+        best_name = max(model_scores, key=lambda name: np.nan_to_num(model_scores[name]['auc_score'], nan=-1))
+        best_model = models[best_name]
+        print(f"🏆 Best out-of-core model: {best_name} (AUC: {model_scores[best_name]['auc_score']:.4f})")
+
+        predictor = self.predictor
+        predictor.models[disease] = best_model
+        predictor.imputers[disease] = imputers
+        predictor.label_encoders[disease] = label_encoders
+        predictor.scalers[disease] = scaler
+        predictor.feature_selectors[disease] = selector
+        predictor.feature_names[disease] = [
+            col for col, keep in zip(statistics['columns'], selector.get_support()) if keep
+        ]
+        predictor.model_metadata[disease] = {
+            'model_type': best_name,
+            'accuracy': model_scores[best_name]['accuracy'],
+            'auc_score': model_scores[best_name]['auc_score'],
+            'training_date': datetime.now().isoformat(),
+            'feature_count': int(selector.get_support().sum()),
+            'training_samples': training_samples,
+            'holdout_samples': int(len(y_holdout)),
+            'training_mode': 'out_of_core',
+            'chunk_size': self.chunk_size,
+            'epochs': self.epochs
+        }
+        predictor.student_models.pop(disease, None)
+        predictor._build_explainers(disease, X_holdout.mean(axis=0))
+
+        return best_model
+
+
+if __name__ == "__main__":
+    import argparse
+    from enhanced_chronic_disease_predictor import EnhancedChronicDiseasePredictor
+
+    parser = argparse.ArgumentParser(description='Out-of-core training from the local dataset store')
+    parser.add_argument('disease')
+    parser.add_argument('--source-name')
+    parser.add_argument('--parquet')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--epochs', type=int, default=3)
+    args = parser.parse_args()
+
+    predictor = EnhancedChronicDiseasePredictor(offline=True)
+    trainer = OutOfCoreTrainer(predictor, chunk_size=args.chunk_size, epochs=args.epochs)
+    if trainer.train(args.disease, args.source_name, args.parquet) is not None:
+        predictor.save_model(args.disease)
@@ -0,0 +1,233 @@
+import os
+import json
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+
+from data_paths import data_path
+from feature_mapping import vital_to_profile
+
+DEFAULT_DB_PATH = os.getenv('CARESYNC_FEATURE_DB') or data_path('patient_features.db')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    observed_at TEXT NOT NULL,
+    recorded_at TEXT NOT NULL,
+    source TEXT NOT NULL,
+    source_ref TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_observations_patient
+    ON observations (patient_id, field, observed_at);
+
+CREATE TABLE IF NOT EXISTS latest_features (
+    patient_id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    observed_at TEXT NOT NULL,
+    source TEXT NOT NULL,
+    source_ref TEXT,
+    observation_id INTEGER NOT NULL,
+    PRIMARY KEY (patient_id, field)
+);
+"""
+
+
+def _timestamp(value):
+    if value is None:
+        return datetime.now().isoformat()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return datetime.fromisoformat(str(value)).isoformat()
+
+
+class PatientFeatureStore:
+    """
+    Local SQLite store of canonical patient features.
+
+    Every value written is kept in ``observations`` with when it was observed,
+    where it came from (source: 'report', 'vital', ...; source_ref: file name,
+    record id) and when it was recorded. ``latest_features`` holds the newest
+    observation per patient and field, so a patient's current profile is one
+    indexed lookup. An observation older than the stored latest value is kept
+    in the history but does not replace it, so backfilled documents cannot
+    overwrite fresher vitals.
+
+    Field names are the profile fields used by feature_mapping (age, gender,
+    glucose, blood_pressure_systolic, ...).
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = str(db_path or DEFAULT_DB_PATH)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        # A connection per call keeps the store safe across threads and forked workers
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def record(self, patient_id, features, source, source_ref=None, observed_at=None):
+        """
+        Store observed feature values for a patient
+
+        Args:
+            patient_id: Patient identifier (stored as text)
+            features: Dict of profile field -> value; None values are ignored
+            source: Where the values came from, e.g. 'report' or 'vital'
+            source_ref: Optional reference within the source (file name, record id)
+            observed_at: When the values were measured; defaults to now
+
+        Returns:
+            List of fields whose latest value changed
+        """
+        observed_at = _timestamp(observed_at)
+        recorded_at = datetime.now().isoformat()
+        changed = []
+
+        with closing(self._connect()) as conn, conn:
+            for field, value in features.items():
+                if value is None:
+                    continue
+                encoded = json.dumps(value)
+                cursor = conn.execute(
+                    "INSERT INTO observations (patient_id, field, value, observed_at, recorded_at, source, source_ref) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (str(patient_id), field, encoded, observed_at, recorded_at, source, source_ref)
+                )
+                previous = conn.execute(
+                    "SELECT value FROM latest_features WHERE patient_id = ? AND field = ?",
+                    (str(patient_id), field)
+                ).fetchone()
+                updated = conn.execute(
+                    "INSERT INTO latest_features (patient_id, field, value, observed_at, source, source_ref, observation_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (patient_id, field) DO UPDATE SET "
+                    "value = excluded.value, observed_at = excluded.observed_at, source = excluded.source, "
+                    "source_ref = excluded.source_ref, observation_id = excluded.observation_id "
+                    "WHERE excluded.observed_at >= latest_features.observed_at",
+                    (str(patient_id), field, encoded, observed_at, source, source_ref, cursor.lastrowid)
+                ).rowcount
+                if updated and (previous is None or previous[0] != encoded):
+                    changed.append(field)
+        return changed
+
+    def record_vital(self, patient_id, vital_type, value, observed_at=None, source_ref=None):
+        """Store one logged vital (type and value as saved by the Node API)"""
+        return self.record(patient_id, vital_to_profile(vital_type, value), 'vital',
+                           source_ref=source_ref, observed_at=observed_at)
+
+    def get_profile(self, patient_id):
+        """Latest value of every known field for a patient"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT field, value FROM latest_features WHERE patient_id = ?", (str(patient_id),)
+            ).fetchall()
+        return {field: json.loads(value) for field, value in rows}
+
+    def get_features(self, patient_id):
+        """Latest value per field with its timestamp and provenance"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT field, value, observed_at, source, source_ref FROM latest_features WHERE patient_id = ?",
+                (str(patient_id),)
+            ).fetchall()
+        return {
+            field: {'value': json.loads(value), 'observed_at': observed_at, 'source': source, 'source_ref': source_ref}
+            for field, value, observed_at, source, source_ref in rows
+        }
+
+    def history(self, patient_id, field=None, limit=None):
+        """Observations for a patient (optionally one field), newest first"""
+        query = "SELECT field, value, observed_at, recorded_at, source, source_ref FROM observations WHERE patient_id = ?"
+        params = [str(patient_id)]
+        if field is not None:
+            query += " AND field = ?"
+            params.append(field)
+        query += " ORDER BY observed_at DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [
+            {'field': f, 'value': json.loads(v), 'observed_at': o, 'recorded_at': r, 'source': s, 'source_ref': ref}
+            for f, v, o, r, s, ref in rows
+        ]
+
+    def iter_feature_frames(self, chunk_size=50000):
+        """
+        Latest features of every patient in columnar form, chunk_size patients at a time
+
+        Yields DataFrames indexed by patient_id with one column per profile
+        field (NaN where a patient has no value). Patients are paged in
+        patient_id order straight off the latest_features primary key.
+        """
+        last_id = ''
+        while True:
+            with closing(self._connect()) as conn:
+                ids = [row[0] for row in conn.execute(
+                    "SELECT DISTINCT patient_id FROM latest_features WHERE patient_id > ? "
+                    "ORDER BY patient_id LIMIT ?", (last_id, int(chunk_size))
+                )]
+                if not ids:
+                    return
+                rows = pd.read_sql_query(
+                    "SELECT patient_id, field, value FROM latest_features WHERE patient_id BETWEEN ? AND ?",
+                    conn, params=(ids[0], ids[-1])
+                )
+            rows['value'] = rows['value'].map(json.loads)
+            frame = rows.pivot(index='patient_id', columns='field', values='value')
+            frame.columns.name = None
+            yield frame.reindex(ids).infer_objects()
+            last_id = ids[-1]
+
+    def patients(self):
+        with closing(self._connect()) as conn:
+            return [row[0] for row in conn.execute("SELECT DISTINCT patient_id FROM latest_features ORDER BY patient_id")]
+
+    def delete_patient(self, patient_id):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM observations WHERE patient_id = ?", (str(patient_id),))
+            conn.execute("DELETE FROM latest_features WHERE patient_id = ?", (str(patient_id),))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inspect the patient feature store and rescore patients')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('patients', help='List patients with stored features')
+    show_parser = subparsers.add_parser('show', help="Show a patient's latest features and provenance")
+    show_parser.add_argument('patient_id')
+    vital_parser = subparsers.add_parser('vital', help='Record a vital reading')
+    vital_parser.add_argument('patient_id')
+    vital_parser.add_argument('type')
+    vital_parser.add_argument('value')
+    score_parser = subparsers.add_parser('score', help='Score a patient from stored features')
+    score_parser.add_argument('patient_id')
+    score_parser.add_argument('--models-dir', default=str(Path(__file__).parent.absolute()))
+    args = parser.parse_args()
+
+    store = PatientFeatureStore(args.db)
+    if args.command == 'patients':
+        print("\n".join(store.patients()))
+    elif args.command == 'show':
+        print(json.dumps(store.get_features(args.patient_id), indent=2))
+    elif args.command == 'vital':
+        print(f"Updated fields: {store.record_vital(args.patient_id, args.type, args.value)}")
+    else:
+        from frozen_predictor import FrozenPredictor
+        from incremental_risk import IncrementalRiskScorer
+
+        scorer = IncrementalRiskScorer(FrozenPredictor.from_directory(args.models_dir), feature_store=store)
+        print(json.dumps(scorer.score_patient(args.patient_id), indent=2, default=str))
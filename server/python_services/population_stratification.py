@@ -0,0 +1,135 @@
+import time
+import heapq
+import numpy as np
+
+from feature_mapping import map_columns
+from frozen_predictor import RISK_LABELS
+
+
+class _TopK:
+    """
+    The k highest-scoring patients seen so far, kept in a min-heap
+
+    Ties go to the patient seen first, so a ranking over patients read in
+    patient_id order is deterministic.
+    """
+
+    def __init__(self, k):
+        if k < 0:
+            raise ValueError(f"top_k must be 0 or more, got {k}")
+        self.k = k
+        self.heap = []
+        self.seen = 0
+
+    def offer(self, scores, patient_ids):
+        if self.k == 0:
+            # Nothing to rank; the caller only wants the distribution
+            self.seen += len(scores)
+            return
+        # Only a chunk's own top k (and anything tied with its k-th score) can enter the overall top k
+        if len(scores) > self.k:
+            kth = np.partition(scores, -self.k)[-self.k]
+            candidates = np.flatnonzero(scores >= kth)
+        else:
+            candidates = np.arange(len(scores))
+        for i in candidates:
+            entry = (float(scores[i]), -(self.seen + int(i)), str(patient_ids[i]))
+            if len(self.heap) < self.k:
+                heapq.heappush(self.heap, entry)
+            elif entry > self.heap[0]:
+                heapq.heapreplace(self.heap, entry)
+        self.seen += len(scores)
+
+    def ranked(self):
+        return [(score, patient_id) for score, _, patient_id in sorted(self.heap, reverse=True)]
+
+
+def stratify_population(predictor, feature_frames, diseases=None, top_k=20):
+    """
+    Rank every stored patient by risk for each disease
+
+    Args:
+        predictor: FrozenPredictor or ModelRegistry (an EnhancedChronicDiseasePredictor is frozen first)
+        feature_frames: Iterable of DataFrames indexed by patient_id, e.g.
+            PatientFeatureStore.iter_feature_frames()
+        diseases: Diseases to score (default: every loaded model)
+        top_k: Patients kept in each disease's ranking (0 for only the distribution)
+
+    Returns:
+        Dict with, per disease, the top_k patients (highest risk first), a
+        histogram of patients per risk category and the mean risk score, plus
+        the number of patients scored and elapsed seconds
+    """
+    start = time.perf_counter()
+    if not hasattr(predictor, 'predict_risk_batch'):
+        predictor = predictor.freeze()
+    # One snapshot for the whole run, so a registry reload can't mix model versions
+    predictor = getattr(predictor, 'current', predictor)
+
+    diseases = [d for d in (diseases or list(predictor.models.keys())) if d in predictor.models]
+    rankings = {disease: _TopK(top_k) for disease in diseases}
+    histograms = {disease: np.zeros(len(RISK_LABELS), dtype=np.int64) for disease in diseases}
+    score_sums = dict.fromkeys(diseases, 0.0)
+    patients = 0
+
+    for frame in feature_frames:
+        if frame.empty:
+            continue
+        patient_ids = frame.index.to_numpy()
+        patients += len(frame)
+        for disease in diseases:
+            model = predictor.models[disease]
+            batch = model.predict_batch(map_columns(frame, model.input_columns))
+            scores = batch['risk_score']
+            rankings[disease].offer(scores, patient_ids)
+            histograms[disease] += np.bincount(
+                np.searchsorted(model.bounds, scores, side='right'), minlength=len(RISK_LABELS)
+            )
+            score_sums[disease] += float(scores.sum())
+
+    result = {'patients': patients, 'diseases': {}}
+    for disease in diseases:
+        model = predictor.models[disease]
+        result['diseases'][disease] = {
+            'top_patients': [
+                {'patient_id': patient_id, 'risk_score': score, 'risk_category': str(model.categorize(score))}
+                for score, patient_id in rankings[disease].ranked()
+            ],
+            'category_counts': dict(zip(RISK_LABELS.tolist(), histograms[disease].tolist())),
+            'mean_risk_score': score_sums[disease] / patients if patients else None,
+            'model_version': model.model_version
+        }
+    result['elapsed_seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+    from pathlib import Path
+    from frozen_predictor import FrozenPredictor
+    from patient_feature_store import PatientFeatureStore, DEFAULT_DB_PATH
+
+    parser = argparse.ArgumentParser(description='Top-K highest-risk patients per disease across the feature store')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    parser.add_argument('--models-dir', default=str(Path(__file__).parent.absolute()))
+    parser.add_argument('--diseases', nargs='*')
+    parser.add_argument('--top-k', type=int, default=20)
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--output', help='Also write the full result to this JSON file')
+    args = parser.parse_args()
+
+    store = PatientFeatureStore(args.db)
+    predictor = FrozenPredictor.from_directory(args.models_dir, args.diseases)
+    report = stratify_population(predictor, store.iter_feature_frames(args.chunk_size), top_k=args.top_k)
+
+    print(f"\n📊 POPULATION STRATIFICATION ({report['patients']} patients, {report['elapsed_seconds']}s)")
+    for disease, summary in report['diseases'].items():
+        counts = ", ".join(f"{label}: {count}" for label, count in summary['category_counts'].items())
+        print(f"\n{disease}: {counts}")
+        for rank, entry in enumerate(summary['top_patients'][:10], 1):
+            print(f"  {rank:>2}. {entry['patient_id']}  {entry['risk_score']:.3f}  {entry['risk_category']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,182 @@
+import gc
+import os
+import sys
+import time
+import multiprocessing as mp
+from collections import Counter
+from pathlib import Path
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.append(str(current_dir))
+
+# Set by the parent before forking; workers inherit it copy-on-write
+_PRELOADED_PREDICTOR = None
+
+
+def _smaps_rollup(pid):
+    """Rss/Pss/shared/private memory of a process in bytes, from /proc"""
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                parts = value.split()
+                if len(parts) == 2 and parts[1] == 'kB':
+                    fields[key] = int(parts[0]) * 1024
+    except OSError:
+        return None
+
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+        'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    }
+
+
+def _analyze_in_worker(file_path, disease_context):
+    from analyze_input import analyze_report
+
+    result = analyze_report(file_path, disease_context, predictor=_PRELOADED_PREDICTOR)
+    return os.getpid(), result
+
+
+def _watch_models():
+    # The registry's polling thread doesn't survive the fork; each worker runs its own
+    _PRELOADED_PREDICTOR.start()
+
+
+class ReportWorkerPool:
+    """
+    Pre-fork pool of report analysis workers.
+
+    The parent imports the heavy libraries and loads every disease model once,
+    then moves all of it into the permanent GC generation with gc.freeze() so
+    collections in the children never write to (and therefore never copy)
+    those pages. Workers are forked afterwards and share the model memory
+    copy-on-write; each worker is replaced after max_tasks_per_child reports
+    so any memory it does accumulate is returned.
+
+    The models are served through a ModelRegistry. With watch_models, every
+    worker polls the model directory and swaps in retrained models without a
+    restart; a model reloaded that way is private to the worker until the
+    pool is restarted.
+    """
+
+    def __init__(self, processes=None, max_tasks_per_child=50, models_dir=None, watch_models=True):
+        self.processes = processes or max(1, (os.cpu_count() or 2) - 1)
+        self.max_tasks_per_child = max_tasks_per_child
+        self.models_dir = models_dir or current_dir
+        self.watch_models = watch_models
+        self.requests_per_worker = Counter()
+        self._pool = None
+
+    def start(self):
+        global _PRELOADED_PREDICTOR
+
+        if self._pool is not None:
+            return self
+
+        start = time.perf_counter()
+        from analyze_input import load_risk_predictor
+        _PRELOADED_PREDICTOR = load_risk_predictor(self.models_dir)
+
+        # Everything allocated so far is shared; keep the collector away from it
+        gc.collect()
+        gc.freeze()
+
+        self._pool = mp.get_context('fork').Pool(
+            processes=self.processes,
+            maxtasksperchild=self.max_tasks_per_child,
+            initializer=_watch_models if self.watch_models else None
+        )
+        print(f"✅ Report worker pool started: {self.processes} workers, "
+              f"{len(_PRELOADED_PREDICTOR.models)} models preloaded in {time.perf_counter() - start:.1f}s")
+        return self
+
+    def analyze(self, file_path, disease_context="General", timeout=None):
+        """Analyze one report in a worker and return analyze_report's result dict"""
+        pid, result = self._pool.apply_async(_analyze_in_worker, (file_path, disease_context)).get(timeout)
+        self.requests_per_worker[pid] += 1
+        return result
+
+    def analyze_many(self, jobs, timeout=None):
+        """Analyze (file_path, disease_context) pairs in parallel, results in input order"""
+        pending = [self._pool.apply_async(_analyze_in_worker, job) for job in jobs]
+        results = []
+        for async_result in pending:
+            pid, result = async_result.get(timeout)
+            self.requests_per_worker[pid] += 1
+            results.append(result)
+        return results
+
+    def worker_memory(self):
+        """
+        Memory of the parent and each live worker
+
+        'shared' is memory still shared with other processes (the preloaded
+        models); 'private' is what the worker has copied or allocated itself.
+        PSS splits shared pages evenly, so summing it gives the real total.
+        """
+        report = {'parent': _smaps_rollup(os.getpid()), 'workers': {}}
+        for process in self._pool._pool if self._pool is not None else []:
+            memory = _smaps_rollup(process.pid)
+            if memory is not None:
+                memory['requests'] = self.requests_per_worker.get(process.pid, 0)
+                report['workers'][process.pid] = memory
+
+        report['total_pss'] = (report['parent'] or {}).get('pss', 0) + sum(
+            worker['pss'] for worker in report['workers'].values()
+        )
+        return report
+
+    def print_worker_memory(self):
+        report = self.worker_memory()
+        print(f"\n📊 REPORT WORKER MEMORY (total PSS {report['total_pss'] / 1e6:.1f} MB)")
+        print(f"{'Process':<14} {'RSS MB':>8} {'PSS MB':>8} {'Shared MB':>10} {'Private MB':>11} {'Requests':>9}")
+        parent = report['parent'] or {}
+        print(f"{'parent':<14} {parent.get('rss', 0) / 1e6:>8.1f} {parent.get('pss', 0) / 1e6:>8.1f} "
+              f"{parent.get('shared', 0) / 1e6:>10.1f} {parent.get('private', 0) / 1e6:>11.1f} {'-':>9}")
+        for pid, worker in report['workers'].items():
+            print(f"{'worker ' + str(pid):<14} {worker['rss'] / 1e6:>8.1f} {worker['pss'] / 1e6:>8.1f} "
+                  f"{worker['shared'] / 1e6:>10.1f} {worker['private'] / 1e6:>11.1f} {worker['requests']:>9}")
+        return report
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        gc.unfreeze()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Analyze reports with a pre-forked worker pool')
+    parser.add_argument('reports', nargs='+', help='Report files to analyze')
+    parser.add_argument('--context', default='General', help='Disease context passed to analyze_report')
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--max-tasks-per-child', type=int, default=50)
+    args = parser.parse_args()
+
+    # analyze_input sends stdout to stderr when imported; keep ours for the results
+    stdout = sys.stdout
+    with ReportWorkerPool(args.processes, args.max_tasks_per_child) as pool:
+        sys.stdout = stdout
+        start = time.perf_counter()
+        results = pool.analyze_many([(path, args.context) for path in args.reports])
+        elapsed = time.perf_counter() - start
+
+        for path, result in zip(args.reports, results):
+            print(f"\n📄 {path}")
+            print(json.dumps(result, indent=2, default=str))
+        print(f"\n⏱️ {len(results)} reports in {elapsed:.2f}s")
+        pool.print_worker_memory()
@@ -0,0 +1,157 @@
+import time
+import itertools
+import numpy as np
+import pandas as pd
+
+from feature_mapping import build_dependency_map, map_columns
+
+
+def delta_range(low, high, steps):
+    """Evenly spaced deltas from low to high, always including 0 (the patient as-is)"""
+    return np.union1d(np.linspace(low, high, int(steps)), [0.0])
+
+
+def build_perturbation_grid(profile, perturbations, full_grid=False):
+    """
+    Profile rows to score: the baseline, one-at-a-time rows and optionally the full product
+
+    Args:
+        profile: Canonical patient profile (see feature_mapping)
+        perturbations: Dict of profile field -> iterable of deltas added to the baseline value
+        full_grid: Also include every combination of deltas across fields
+
+    Returns:
+        (frame, skipped) - a DataFrame of profiles with 'kind', 'field' and
+        'delta_<field>' columns describing each row, and the requested fields
+        that could not be perturbed because the profile has no value for them
+    """
+    baseline = {field: value for field, value in profile.items() if value is not None}
+    skipped = [field for field in perturbations if baseline.get(field) is None]
+    fields = [field for field in perturbations if field not in skipped]
+    deltas = {field: np.asarray(list(perturbations[field]), dtype=float) for field in fields}
+
+    rows = [dict(baseline, kind='baseline', field=None, **{f'delta_{f}': 0.0 for f in fields})]
+    for field in fields:
+        for delta in deltas[field]:
+            row = dict(baseline, kind='curve', field=field, **{f'delta_{f}': 0.0 for f in fields})
+            row[field] = baseline[field] + delta
+            row[f'delta_{field}'] = delta
+            rows.append(row)
+
+    if full_grid and len(fields) > 1:
+        for combination in itertools.product(*(deltas[field] for field in fields)):
+            row = dict(baseline, kind='grid', field=None)
+            for field, delta in zip(fields, combination):
+                row[field] = baseline[field] + delta
+                row[f'delta_{field}'] = delta
+            rows.append(row)
+
+    return pd.DataFrame(rows), skipped
+
+
+def analyze_sensitivity(predictor, profile, perturbations, diseases=None, full_grid=False):
+    """
+    How each disease risk responds to changes in the chosen profile fields
+
+    The whole grid is scored with one batched call per disease. Diseases whose
+    selected features read none of the perturbed fields get only their
+    baseline score, because their curves are flat by construction.
+
+    Args:
+        predictor: FrozenPredictor or ModelRegistry (an EnhancedChronicDiseasePredictor is frozen first)
+        profile: Canonical patient profile, e.g. {'glucose': 160, 'bmi': 31, 'age': 55}
+        perturbations: Dict of profile field -> deltas, e.g. {'glucose': delta_range(-40, 0, 5)}
+        diseases: Diseases to analyze (default: every loaded model)
+        full_grid: Also score every combination of deltas (for 2-D response surfaces)
+
+    Returns:
+        Dict with baseline scores, per-disease per-field response curves,
+        the scored grid (if full_grid) and elapsed milliseconds
+    """
+    start = time.perf_counter()
+    if not hasattr(predictor, 'predict_risk_batch'):
+        predictor = predictor.freeze()
+
+    diseases = [d for d in (diseases or list(predictor.models.keys())) if d in predictor.models]
+    frame, skipped = build_perturbation_grid(profile, perturbations, full_grid)
+    fields = [field for field in perturbations if field not in skipped]
+    dependencies = build_dependency_map({d: predictor.models[d].feature_names for d in diseases})
+
+    result = {'baseline': {}, 'curves': {}, 'skipped_fields': skipped, 'insensitive_diseases': []}
+    grid_scores = {}
+    for disease in diseases:
+        model = predictor.models[disease]
+        sensitive = any(disease in dependencies.get(field, ()) for field in fields)
+        rows = frame if sensitive else frame.iloc[:1]
+        batch = model.predict_batch(map_columns(rows, model.input_columns))
+
+        result['baseline'][disease] = {
+            'risk_score': float(batch['risk_score'][0]),
+            'risk_category': str(batch['risk_category'][0])
+        }
+        if not sensitive:
+            result['insensitive_diseases'].append(disease)
+            continue
+
+        curves = {}
+        for field in fields:
+            mask = (rows['kind'] == 'curve').values & (rows['field'] == field).values
+            curve_deltas = rows.loc[mask, f'delta_{field}'].to_numpy()
+            order = np.argsort(curve_deltas)
+            curves[field] = {
+                'deltas': curve_deltas[order].tolist(),
+                'values': rows.loc[mask, field].to_numpy()[order].tolist(),
+                'risk_scores': batch['risk_score'][mask][order].tolist(),
+                'risk_categories': batch['risk_category'][mask][order].tolist()
+            }
+        result['curves'][disease] = curves
+        if full_grid:
+            grid_scores[disease] = batch['risk_score']
+
+    if full_grid and grid_scores:
+        grid_mask = (frame['kind'] == 'grid').values
+        grid = frame.loc[grid_mask, [f'delta_{field}' for field in fields]].reset_index(drop=True)
+        for disease, scores in grid_scores.items():
+            grid[f'{disease}_risk_score'] = scores[grid_mask]
+        result['grid'] = grid
+
+    result['rows_scored'] = int(len(frame))
+    result['elapsed_ms'] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def _parse_vary(spec):
+    """'glucose=-40:0:9' -> ('glucose', delta_range(-40, 0, 9))"""
+    field, _, bounds = spec.partition('=')
+    low, high, steps = bounds.split(':')
+    return field, delta_range(float(low), float(high), int(steps))
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+    from pathlib import Path
+    from frozen_predictor import FrozenPredictor
+
+    parser = argparse.ArgumentParser(description='What-if risk curves for one patient')
+    parser.add_argument('--profile', required=True, help='Patient profile as JSON')
+    parser.add_argument('--vary', nargs='+', required=True, help='field=low:high:steps, e.g. glucose=-40:0:9')
+    parser.add_argument('--grid', action='store_true', help='Also score every combination of deltas')
+    parser.add_argument('--models-dir', default=str(Path(__file__).parent.absolute()))
+    args = parser.parse_args()
+
+    predictor = FrozenPredictor.from_directory(args.models_dir)
+    analysis = analyze_sensitivity(
+        predictor, json.loads(args.profile), dict(_parse_vary(spec) for spec in args.vary), full_grid=args.grid
+    )
+
+    print(f"\n🔬 SENSITIVITY ({analysis['rows_scored']} profiles per disease, {analysis['elapsed_ms']:.1f} ms)")
+    for disease, curves in analysis['curves'].items():
+        print(f"\n{disease}: baseline {analysis['baseline'][disease]['risk_score']:.3f}")
+        for field, curve in curves.items():
+            points = ", ".join(f"{d:+g}->{s:.3f}" for d, s in zip(curve['deltas'], curve['risk_scores']))
+            print(f"  {field}: {points}")
+    if analysis['insensitive_diseases']:
+        print(f"\nNot affected by these fields: {', '.join(analysis['insensitive_diseases'])}")
+    if analysis['skipped_fields']:
+        print(f"Skipped (no baseline value): {', '.join(analysis['skipped_fields'])}")
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The services are flat modules imported by name, as the scripts themselves do
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from batch_score import _ResultWriter, score_chunk
+
+
+class _ConstantModel:
+    input_columns = ['age']
+
+    def predict_batch(self, frame):
+        rows = len(frame)
+        return {
+            'risk_score': np.full(rows, 0.25),
+            'risk_category': np.full(rows, 'Low Risk'),
+            'confidence': np.full(rows, 0.8),
+            'confidence_method': np.full(rows, 'fixed')
+        }
+
+
+class _Predictor:
+    models = {'diabetes': _ConstantModel()}
+
+
+def _result_chunk(ids):
+    return pd.DataFrame({'patient_id': ids, 'diabetes_risk_score': np.full(len(ids), 0.25)})
+
+
+def test_parquet_writer_accepts_chunk_with_null_ids(tmp_path):
+    output = tmp_path / 'scores.parquet'
+    writer = _ResultWriter(output)
+    writer.write(_result_chunk(pd.Series([1, 2], dtype='int64')))
+    writer.write(_result_chunk(pd.Series([3.0, np.nan])))
+    writer.close()
+
+    table = pq.read_table(output)
+    assert str(table.schema.field('patient_id').type) == 'int64'
+    assert table.column('patient_id').to_pylist() == [1, 2, 3, None]
+
+
+def test_score_chunk_keeps_integer_ids_when_some_are_missing(tmp_path):
+    first = score_chunk(_Predictor(), pd.DataFrame({'patient_id': [1, 2], 'age': [40, 50]}),
+                        ['diabetes'], id_column='patient_id')
+    second = score_chunk(_Predictor(), pd.DataFrame({'patient_id': [3, None], 'age': [60, 70]}),
+                         ['diabetes'], id_column='patient_id')
+    assert second['patient_id'].dtype == 'Int64'
+
+    output = tmp_path / 'scores.csv'
+    writer = _ResultWriter(output)
+    writer.write(first)
+    writer.write(second)
+    writer.close()
+
+    assert output.read_text().splitlines()[1:] == [
+        '1,0.25,Low Risk,0.8,fixed',
+        '2,0.25,Low Risk,0.8,fixed',
+        '3,0.25,Low Risk,0.8,fixed',
+        ',0.25,Low Risk,0.8,fixed'
+    ]
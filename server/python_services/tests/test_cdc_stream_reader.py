@@ -0,0 +1,113 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pyarrow.parquet as pq
+import pytest
+
+from cdc_stream_reader import SocrataStreamReader
+from fetch_engine import ConcurrentFetchEngine
+
+
+def _records(count):
+    # Socrata leaves null fields out; 'stratification' only appears from row 12 on
+    records = []
+    for i in range(count):
+        record = {'year': str(2000 + i), 'value': str(i)}
+        if i >= 12:
+            record['stratification'] = f"group {i % 3}"
+        records.append(record)
+    return records
+
+
+class _FakeSocrata:
+    """Serves /resource/<id>.json pages by $offset/$limit; optionally view metadata and a row count"""
+
+    def __init__(self, records, columns=None, count=False):
+        self.records = records
+        self.offsets = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if url.path.startswith('/api/views/'):
+                    body = {'columns': [{'fieldName': col} for col in columns]} if columns else None
+                elif '$select' in query:
+                    body = [{'count': str(len(fake.records))}] if count else None
+                else:
+                    offset, limit = int(query['$offset']), int(query['$limit'])
+                    fake.offsets.append(offset)
+                    body = fake.records[offset:offset + limit]
+                data = json.dumps(body).encode()
+                self.send_response(404 if body is None else 200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+
+    def reader(self, page_size=10, max_in_flight=3):
+        host, port = self._httpd.server_address[:2]
+        return SocrataStreamReader(
+            resource_url=f"http://{host}:{port}/resource",
+            views_url=f"http://{host}:{port}/api/views",
+            fetch_engine=ConcurrentFetchEngine(max_retries=0, timeout=5),
+            page_size=page_size,
+            max_in_flight=max_in_flight
+        )
+
+    def __enter__(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def test_stops_on_short_page_and_widens_for_late_columns(tmp_path):
+    records = _records(25)
+    output = tmp_path / 'extract.parquet'
+    with _FakeSocrata(records) as server:
+        result = server.reader().stream_to_parquet('abcd-1234', output)
+
+    assert result['rows'] == 25 and result['pages'] == 3
+    # Nothing is requested past the short page at offset 20 but what was already in flight
+    assert max(server.offsets) <= 40
+    table = pq.read_table(output)
+    assert table.column_names == ['year', 'value', 'stratification']
+    assert table.num_rows == 25
+    assert table.column('value').to_pylist() == [str(i) for i in range(25)]
+    assert table.column('stratification').to_pylist() == [None] * 12 + [f"group {i % 3}" for i in range(12, 25)]
+    assert list(tmp_path.iterdir()) == [output]
+
+
+def test_metadata_columns_and_row_count_bound_the_download(tmp_path):
+    records = _records(30)
+    output = tmp_path / 'extract.parquet'
+    with _FakeSocrata(records, columns=['year', 'value', 'stratification'], count=True) as server:
+        result = server.reader().stream_to_parquet('abcd-1234', output, max_rows=25)
+
+    assert result['rows'] == 25
+    assert sorted(server.offsets) == [0, 10, 20]
+    table = pq.read_table(output)
+    assert table.column_names == ['year', 'value', 'stratification']
+    assert table.num_rows == 25
+
+
+@pytest.mark.parametrize('count', [0, 10])
+def test_empty_or_exact_page_extract(tmp_path, count):
+    output = tmp_path / 'extract.parquet'
+    with _FakeSocrata(_records(count)) as server:
+        result = server.reader().stream_to_parquet('abcd-1234', output)
+
+    assert result['rows'] == count
+    assert pq.read_table(output).num_rows == count
@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from fetch_engine import ConcurrentFetchEngine, FetchError
+
+
+class _StandInServer:
+    """
+    Local HTTP server whose paths misbehave on purpose
+
+    /fail/<n>    503 for the first n requests, then 200
+    /throttle    429 with Retry-After: 1 on the first request, then 200
+    /slow        200 after 0.2s, tracking how many requests overlap
+    /hang        200 after 2s
+    /missing     404
+    """
+
+    def __init__(self):
+        self.hits = Counter()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.hits[self.path] += 1
+                    hits = server.hits[self.path]
+                headers = {}
+                if self.path.startswith('/fail/'):
+                    status = 503 if hits <= int(self.path.rsplit('/', 1)[1]) else 200
+                elif self.path == '/throttle':
+                    status = 429 if hits == 1 else 200
+                    if status == 429:
+                        headers['Retry-After'] = '1'
+                elif self.path == '/slow':
+                    with server._lock:
+                        server.active += 1
+                        server.max_active = max(server.max_active, server.active)
+                    time.sleep(0.2)
+                    with server._lock:
+                        server.active -= 1
+                    status = 200
+                elif self.path == '/hang':
+                    time.sleep(2)
+                    status = 200
+                else:
+                    status = 404
+                data = b'ok'
+                try:
+                    self.send_response(status)
+                    for key, value in headers.items():
+                        self.send_header(key, value)
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+
+    def url(self, path):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def __enter__(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    with _StandInServer() as server:
+        yield server
+
+
+def test_5xx_is_retried_with_backoff(server):
+    engine = ConcurrentFetchEngine(max_retries=3, backoff_factor=0.1)
+    start = time.perf_counter()
+    assert engine.get(server.url('/fail/2')).text == 'ok'
+    # Two backoffs of at least 0.1s and 0.2s
+    assert time.perf_counter() - start >= 0.3
+    assert server.hits['/fail/2'] == 3
+
+
+def test_gives_up_after_max_retries(server):
+    engine = ConcurrentFetchEngine(max_retries=1, backoff_factor=0.01)
+    with pytest.raises(FetchError, match='503'):
+        engine.get(server.url('/fail/5'))
+    assert server.hits['/fail/5'] == 2
+
+
+def test_429_waits_for_retry_after(server):
+    engine = ConcurrentFetchEngine(max_retries=2, backoff_factor=0.01)
+    start = time.perf_counter()
+    assert engine.get(server.url('/throttle')).status_code == 200
+    assert time.perf_counter() - start >= 1.0
+    assert server.hits['/throttle'] == 2
+
+
+def test_client_errors_are_not_retried(server):
+    engine = ConcurrentFetchEngine(max_retries=3, backoff_factor=0.01)
+    with pytest.raises(requests.HTTPError):
+        engine.get(server.url('/missing'))
+    assert server.hits['/missing'] == 1
+
+
+def test_per_host_limit_caps_concurrent_requests(server):
+    engine = ConcurrentFetchEngine(max_workers=8, per_host_limit=2)
+    results = engine.map(lambda _: engine.get(server.url('/slow')).status_code, range(8))
+    assert results == [200] * 8
+    assert server.max_active == 2
+
+
+def test_each_request_is_bounded_by_the_timeout(server):
+    engine = ConcurrentFetchEngine(timeout=0.3, max_retries=1, backoff_factor=0.01)
+    start = time.perf_counter()
+    with pytest.raises(FetchError):
+        engine.get(server.url('/hang'))
+    assert time.perf_counter() - start < 1.5
+    assert server.hits['/hang'] == 2
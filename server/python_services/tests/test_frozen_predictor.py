@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from frozen_predictor import FrozenDiseaseModel, FrozenPredictor
+
+NUMERIC = ['age', 'glucose', 'bmi']
+
+
+def _synthetic_model_data(rows=300):
+    """A small fitted pipeline with the same pieces the trainer saves"""
+    rng = np.random.default_rng(7)
+    frame = pd.DataFrame({col: rng.normal(50, 15, size=rows) for col in NUMERIC})
+    frame['gender'] = rng.choice(['Male', 'Female'], size=rows)
+    y = (frame['glucose'] + rng.normal(0, 10, size=rows) > 55).astype(int)
+
+    numeric_imputer = SimpleImputer(strategy='median').fit(frame[NUMERIC])
+    categorical_imputer = SimpleImputer(strategy='most_frequent').fit(frame[['gender']])
+    encoder = LabelEncoder().fit(frame['gender'])
+    encoded = frame.assign(gender=encoder.transform(frame['gender']))
+    scaler = StandardScaler().fit(encoded)
+    model = VotingClassifier([
+        ('forest', RandomForestClassifier(n_estimators=20, random_state=0)),
+        ('logistic', LogisticRegression())
+    ], voting='soft').fit(scaler.transform(encoded), y)
+
+    return {
+        'model': model,
+        'scaler': scaler,
+        'imputer': {'numeric': numeric_imputer, 'categorical': categorical_imputer},
+        'label_encoders': {'gender': encoder},
+        'feature_names': list(encoded.columns)
+    }
+
+
+def _patients(rows=20):
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({col: rng.normal(50, 20, size=rows) for col in NUMERIC})
+    frame['gender'] = rng.choice(['Male', 'Female', 'unseen', None], size=rows)
+    frame.loc[::7, 'glucose'] = np.nan
+    return frame
+
+
+def _as_bytes(result):
+    """Exact representation of a batch frame or result dict, so equal means bit-for-bit equal"""
+    if isinstance(result, pd.DataFrame):
+        return {col: result[col].to_numpy().tobytes() if result[col].dtype.kind in 'fiu'
+                else result[col].tolist() for col in result.columns}
+    return {key: np.float64(value).tobytes() if isinstance(value, float) else value
+            for key, value in result.items()}
+
+
+def test_concurrent_scoring_matches_serial_scoring():
+    predictor = FrozenPredictor({'diabetes': FrozenDiseaseModel('diabetes', _synthetic_model_data())})
+    frame = _patients()
+    original = frame.copy()
+    rows = len(frame)
+
+    expected_batch = _as_bytes(predictor.predict_risk_batch(frame, 'diabetes'))
+    expected_rows = [_as_bytes(predictor.predict_risk_score(frame.iloc[[i]], 'diabetes')) for i in range(rows)]
+    assert expected_rows[0]['confidence_method'] == 'ensemble_agreement'
+
+    def worker(seed):
+        order = np.random.default_rng(seed).permutation(rows)
+        batch_ok = _as_bytes(predictor.predict_risk_batch(frame, 'diabetes')) == expected_batch
+        rows_ok = all(_as_bytes(predictor.predict_risk_score(frame.iloc[[i]], 'diabetes')) == expected_rows[i]
+                      for i in order)
+        return batch_ok and rows_ok
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        outcomes = list(pool.map(worker, range(16)))
+
+    assert all(outcomes)
+    # Scoring works on private copies; the shared input is never modified
+    pd.testing.assert_frame_equal(frame, original)
+
+
+def test_frozen_model_rejects_writes():
+    model = FrozenDiseaseModel('diabetes', _synthetic_model_data(rows=60))
+    with pytest.raises(AttributeError):
+        model.disease = 'other'
+    with pytest.raises(AttributeError):
+        FrozenPredictor({'diabetes': model}).models = {}
@@ -0,0 +1,133 @@
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker
+from llm_cache import LLMResponseCache
+from llm_client import AsyncLLMClient, FakeLLMServer, GeminiHTTPClient, LLMError, LLMTimeout, LLMUnavailable
+
+
+def _client(server, deadline=5.0):
+    # No shared circuit or response cache, so tests don't affect each other
+    return GeminiHTTPClient('gemini-test', api_key='test-key', base_url=server.base_url,
+                            deadline=deadline, breaker=False, cache=False)
+
+
+def test_base_client_is_abstract():
+    with pytest.raises(TypeError):
+        AsyncLLMClient()
+
+
+def test_reply_is_parsed_as_json():
+    with FakeLLMServer('```json\n{"risk_score": 0.4}\n```') as server:
+        assert _client(server).generate_json_sync('assess this') == {'risk_score': 0.4}
+        assert server.prompts == ['assess this']
+
+
+def test_deadline_exceeded_raises_timeout():
+    with FakeLLMServer('{}', latency=2.0) as server:
+        start = time.perf_counter()
+        with pytest.raises(LLMTimeout):
+            _client(server, deadline=0.3).generate_json_sync('slow prompt')
+        assert time.perf_counter() - start < 1.5
+
+
+def test_call_overlaps_with_local_scoring():
+    with FakeLLMServer('{"risk_score": 0.7}', latency=0.5) as server:
+        start = time.perf_counter()
+        future = _client(server).submit_json('context prompt')
+        # Stand-in for report extraction and model scoring on the calling thread
+        time.sleep(0.5)
+        assert future.result() == {'risk_score': 0.7}
+        assert time.perf_counter() - start < 0.9
+
+
+def test_non_200_response_raises_llm_error():
+    with FakeLLMServer('{}', status=500) as server:
+        with pytest.raises(LLMError, match='HTTP 500'):
+            _client(server).generate_json_sync('any prompt')
+
+
+def _cached_client(server, cache):
+    return GeminiHTTPClient('gemini-test', api_key='test-key', base_url=server.base_url,
+                            breaker=False, cache=cache)
+
+
+def test_cache_is_scoped_to_the_endpoint(tmp_path):
+    cache = LLMResponseCache(tmp_path / 'llm_state.db')
+    with FakeLLMServer('{"risk_score": 0.1}') as first, FakeLLMServer('{"risk_score": 0.9}') as second:
+        assert _cached_client(first, cache).generate_json_sync('same prompt') == {'risk_score': 0.1}
+        assert _cached_client(first, cache).generate_json_sync('same prompt') == {'risk_score': 0.1}
+        assert _cached_client(second, cache).generate_json_sync('same prompt') == {'risk_score': 0.9}
+        assert len(first.prompts) == 1 and len(second.prompts) == 1
+
+
+def test_reply_failing_validation_is_not_cached(tmp_path):
+    cache = LLMResponseCache(tmp_path / 'llm_state.db')
+    has_score = lambda data: isinstance(data, dict) and 'risk_score' in data
+    with FakeLLMServer('{"unexpected": true}') as server:
+        client = _cached_client(server, cache)
+        with pytest.raises(LLMError, match='unexpected response shape'):
+            client.generate_json_sync('assess this', validate=has_score)
+        assert cache.snapshot()['entries'] == 0
+
+        server.respond = lambda prompt: '{"risk_score": 0.3}'
+        assert client.generate_json_sync('assess this', validate=has_score) == {'risk_score': 0.3}
+        assert client.generate_json_sync('assess this', validate=has_score) == {'risk_score': 0.3}
+        assert len(server.prompts) == 2
+
+
+def _half_open_breaker(tmp_path):
+    breaker = CircuitBreaker('test', db_path=tmp_path / 'llm_state.db', min_calls=1, cooldown=0.0)
+    breaker.record(0.1, False, 'boom')
+    assert breaker.state == 'open'
+    return breaker
+
+
+def test_unconfigured_call_gives_back_its_probe(tmp_path):
+    breaker = _half_open_breaker(tmp_path)
+    client = GeminiHTTPClient('gemini-test', api_key='', base_url='http://127.0.0.1:9/v1beta',
+                              breaker=breaker, cache=False)
+    client.api_key = None
+    with pytest.raises(LLMUnavailable):
+        client.generate_json_sync('prompt')
+    snapshot = breaker.snapshot()
+    assert (snapshot['state'], snapshot['probes_in_flight']) == ('half_open', 0)
+
+
+def test_cancelled_call_gives_back_its_probe(tmp_path):
+    breaker = _half_open_breaker(tmp_path)
+    with FakeLLMServer('{}', latency=1.0) as server:
+        client = GeminiHTTPClient('gemini-test', api_key='test-key', base_url=server.base_url,
+                                  breaker=breaker, cache=False)
+        future = client.submit_json('prompt')
+        time.sleep(0.2)
+        future.cancel()
+        deadline = time.time() + 2
+        while breaker.snapshot()['probes_in_flight'] and time.time() < deadline:
+            time.sleep(0.05)
+    assert breaker.snapshot()['probes_in_flight'] == 0
+
+
+def test_locked_breaker_database_does_not_stall_other_calls(tmp_path):
+    import sqlite3
+
+    db_path = tmp_path / 'llm_state.db'
+    breaker = CircuitBreaker('locked', db_path=db_path)
+    breaker.reset()
+    # Another process holds the write lock
+    holder = sqlite3.connect(db_path, isolation_level=None)
+    holder.execute('BEGIN IMMEDIATE')
+    try:
+        with FakeLLMServer('{"risk_score": 0.2}') as server:
+            blocked = GeminiHTTPClient('gemini-test', api_key='test-key', base_url=server.base_url,
+                                       breaker=breaker, cache=False).submit_json('waits on the lock')
+            start = time.perf_counter()
+            assert _client(server).generate_json_sync('independent call') == {'risk_score': 0.2}
+            assert time.perf_counter() - start < 1.0
+            time.sleep(0.2)
+            assert not blocked.done()
+    finally:
+        holder.execute('ROLLBACK')
+        holder.close()
+    assert blocked.result(timeout=10) == {'risk_score': 0.2}
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from frozen_predictor import DEFAULT_THRESHOLDS, RISK_LABELS, FrozenPredictor
+from population_stratification import stratify_population
+
+
+class _ConstantModel:
+    """Scores every patient the same; stands in for one model version"""
+
+    input_columns = feature_names = ('age',)
+    bounds = np.array([DEFAULT_THRESHOLDS['low'], DEFAULT_THRESHOLDS['moderate'], DEFAULT_THRESHOLDS['high']])
+
+    def __init__(self, score, version):
+        self.score = score
+        self.model_version = version
+
+    def predict_batch(self, frame):
+        return {'risk_score': np.full(len(frame), self.score)}
+
+    def categorize(self, score):
+        return RISK_LABELS[np.searchsorted(self.bounds, score, side='right')]
+
+
+class _ReloadingRegistry:
+    """Like ModelRegistry, but a retrained v2 replaces v1 once the run has started reading models"""
+
+    def __init__(self):
+        self._current = FrozenPredictor({'diabetes': _ConstantModel(0.2, 'v1')})
+        self._reads = 0
+
+    def predict_risk_batch(self, *args):
+        raise AssertionError('not used')
+
+    @property
+    def current(self):
+        return self._current
+
+    @property
+    def models(self):
+        self._reads += 1
+        models = self._current.models
+        if self._reads == 2:
+            self._current = FrozenPredictor({'diabetes': _ConstantModel(0.9, 'v2')})
+        return models
+
+
+def _frames(chunks, size):
+    for chunk in range(chunks):
+        ids = range(chunk * size, (chunk + 1) * size)
+        yield pd.DataFrame({'age': np.full(size, 50.0)}, index=pd.Index(ids, name='patient_id'))
+
+
+def test_reload_during_run_does_not_mix_model_versions():
+    report = stratify_population(_ReloadingRegistry(), _frames(3, 4), top_k=2)['diseases']['diabetes']
+    assert report['model_version'] == 'v1'
+    assert report['category_counts']['Low Risk'] == 12
+    assert report['mean_risk_score'] == pytest.approx(0.2)
+
+
+def test_top_k_zero_keeps_only_the_distribution():
+    predictor = FrozenPredictor({'diabetes': _ConstantModel(0.7, 'v1')})
+    report = stratify_population(predictor, _frames(2, 3), top_k=0)
+    assert report['patients'] == 6
+    assert report['diseases']['diabetes']['top_patients'] == []
+    assert report['diseases']['diabetes']['category_counts']['High Risk'] == 6
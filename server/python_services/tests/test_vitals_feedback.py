@@ -0,0 +1,46 @@
+import pytest
+
+from vitals_feedback import analyze_vitals_fallback, evaluate_vitals_batch
+
+
+@pytest.mark.parametrize('vtype, value, status', [
+    ('Blood Sugar', '100000000000000000', 'Warning'),
+    ('Blood Sugar', '9' * 400, 'Warning'),
+    ('Oxygen', '-100000000000000000', 'Critical'),
+    ('Oxygen', '-' + '9' * 400, 'Critical'),
+    ('Blood Pressure', '9' * 400 + '/80', 'Critical'),
+])
+def test_huge_readings_still_trip_their_thresholds(vtype, value, status):
+    assert analyze_vitals_fallback([{'type': vtype, 'value': value}])['status'] == status
+
+
+def test_huge_reading_leaves_other_patients_alone():
+    results = evaluate_vitals_batch([
+        [{'type': 'Blood Sugar', 'value': '9' * 400}],
+        [{'type': 'Heart Rate', 'value': '72'}]
+    ])
+    assert results[1]['status'] == 'Normal'
+
+
+def test_worker_baselines_pick_up_other_writers(tmp_path, monkeypatch):
+    import vitals_baseline
+    from vitals_feedback import _Baselines
+
+    monkeypatch.setattr(vitals_baseline, 'DEFAULT_DB_PATH', str(tmp_path / 'baselines.db'))
+    baselines = _Baselines()
+
+    def request(value):
+        item = {'patient_id': 'p1', 'vitals': [{'type': 'Heart Rate', 'value': value}], 'result': {}}
+        baselines.add_alerts([item])
+        return item
+
+    request('70')
+    assert baselines.tracker._states == {}
+
+    # The one-shot CLI records a reading for the same patient in between
+    other = vitals_baseline.VitalBaselineTracker()
+    other.observe('p1', 'Heart Rate', '72')
+    other.flush()
+
+    request('71')
+    assert vitals_baseline.VitalBaselineTracker().baseline('p1')['heart_rate']['readings'] == 3
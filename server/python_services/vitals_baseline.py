@@ -0,0 +1,356 @@
+import math
+import sqlite3
+import struct
+from array import array
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+
+from feature_mapping import vital_to_profile
+from patient_feature_store import DEFAULT_DB_PATH
+
+# Smallest spread used when scoring a reading, per metric. A patient whose
+# readings have barely moved would otherwise get huge z-scores for ordinary noise.
+MIN_STD = {
+    'blood_pressure_systolic': 4.0,
+    'blood_pressure_diastolic': 3.0,
+    'glucose': 5.0,
+    'heart_rate': 3.0,
+    'oxygen': 1.0,
+    'temperature': 0.3,
+    'weight': 0.5,
+    'respiratory_rate': 1.5
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vital_baselines (
+    patient_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    state BLOB NOT NULL,
+    last_seen TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (patient_id, metric)
+);
+"""
+
+# count, head, ewma mean, ewma variance, window sum, window sum of squares
+_HEADER = struct.Struct('<IIdddd')
+
+
+def vital_metrics(vital_type, value):
+    """
+    Numeric metrics in one logged vital
+
+    Blood pressure splits into systolic and diastolic; the other types known to
+    the risk models use their profile field names (glucose, heart_rate, oxygen).
+    Any other numeric vital (temperature, weight, ...) is tracked under its own type.
+    """
+    if not vital_type:
+        return {}
+    metrics = vital_to_profile(vital_type, value)
+    if not metrics:
+        try:
+            metrics = {str(vital_type).lower(): float(value)}
+        except (TypeError, ValueError):
+            return {}
+    # A NaN or infinite reading would poison the running sums for good
+    return {metric: v for metric, v in metrics.items() if math.isfinite(v)}
+
+
+class VitalBaseline:
+    """
+    Running baseline of one metric for one patient, updated in constant time and memory
+
+    Keeps an exponentially weighted mean and variance (the long-run baseline,
+    which follows slow drift) and a fixed-size ring buffer of the latest
+    readings with running sums, so the recent-window mean and variance never
+    need a pass over history.
+    """
+
+    __slots__ = ('count', 'head', 'mean', 'var', 'window_sum', 'window_sq', 'window', 'last_seen')
+
+    def __init__(self, window_size):
+        self.count = 0
+        self.head = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.window_sum = 0.0
+        self.window_sq = 0.0
+        self.window = array('d', bytes(8 * window_size))
+        self.last_seen = None
+
+    @property
+    def window_count(self):
+        return min(self.count, len(self.window))
+
+    @property
+    def std(self):
+        return math.sqrt(self.var)
+
+    def window_stats(self):
+        """(mean, sample std) of the readings in the ring buffer"""
+        n = self.window_count
+        if n == 0:
+            return None, None
+        mean = self.window_sum / n
+        if n < 2:
+            return mean, 0.0
+        var = max(self.window_sq - n * mean * mean, 0.0) / (n - 1)
+        return mean, math.sqrt(var)
+
+    def recent(self):
+        """Readings in the ring buffer, oldest first"""
+        n = self.window_count
+        size = len(self.window)
+        start = (self.head - n) % size
+        return [self.window[(start + i) % size] for i in range(n)]
+
+    def update(self, value, alpha):
+        if self.count == 0:
+            self.mean = value
+            self.var = 0.0
+        else:
+            diff = value - self.mean
+            increment = alpha * diff
+            self.mean += increment
+            self.var = (1 - alpha) * (self.var + diff * increment)
+
+        size = len(self.window)
+        if self.count >= size:
+            evicted = self.window[self.head]
+            self.window_sum -= evicted
+            self.window_sq -= evicted * evicted
+        self.window[self.head] = value
+        self.window_sum += value
+        self.window_sq += value * value
+        self.head = (self.head + 1) % size
+        self.count += 1
+        if self.head == 0:
+            # Once per lap, recompute the sums so rounding error can't build up
+            self.window_sum = math.fsum(self.window)
+            self.window_sq = math.fsum(v * v for v in self.window)
+
+    def to_bytes(self):
+        header = _HEADER.pack(self.count, self.head, self.mean, self.var, self.window_sum, self.window_sq)
+        return header + self.window.tobytes()
+
+    @classmethod
+    def from_bytes(cls, blob, window_size=None):
+        count, head, mean, var, window_sum, window_sq = _HEADER.unpack_from(blob)
+        window = array('d')
+        window.frombytes(blob[_HEADER.size:])
+        state = cls(len(window))
+        state.count, state.head, state.mean, state.var = count, head, mean, var
+        state.window_sum, state.window_sq, state.window = window_sum, window_sq, window
+        if window_size is not None and window_size != len(window):
+            state = state.resized(window_size)
+        return state
+
+    def resized(self, window_size):
+        """Copy with a different ring buffer size, keeping the newest readings that fit"""
+        resized = VitalBaseline(window_size)
+        kept = self.recent()[-window_size:]
+        resized.count, resized.mean, resized.var = self.count, self.mean, self.var
+        resized.last_seen = self.last_seen
+        for i, value in enumerate(kept):
+            resized.window[i] = value
+        resized.head = len(kept) % window_size
+        resized.window_sum = math.fsum(kept)
+        resized.window_sq = math.fsum(v * v for v in kept)
+        return resized
+
+
+class VitalBaselineTracker:
+    """
+    Flags vitals that deviate from the patient's own baseline.
+
+    Each reading is scored against the baseline built from the readings
+    before it (z-score against the EWMA mean and spread), then folded in.
+    State is a few numbers plus a small ring buffer per patient and metric,
+    loaded from SQLite the first time a patient is seen and written back by
+    flush(). Readings carrying a timestamp no newer than the last one
+    applied are ignored, so re-submitting the same vitals is harmless.
+    """
+
+    def __init__(self, db_path=None, alpha=0.2, window=32, z_threshold=3.0, warmup=5, min_std=None):
+        """
+        Args:
+            db_path: SQLite file for persisted baselines (default: the patient feature store's)
+            alpha: EWMA weight of the newest reading
+            window: Readings kept in each ring buffer
+            z_threshold: |z| at which a reading is flagged
+            warmup: Readings needed before anything is flagged
+            min_std: Per-metric spread floors (default MIN_STD)
+        """
+        self.db_path = str(db_path or DEFAULT_DB_PATH)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.alpha = alpha
+        self.window = window
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.min_std = {**MIN_STD, **(min_std or {})}
+        self._states = {}
+        self._dirty = set()
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _patient_states(self, patient_id):
+        patient_id = str(patient_id)
+        states = self._states.get(patient_id)
+        if states is None:
+            with closing(self._connect()) as conn:
+                rows = conn.execute(
+                    "SELECT metric, state, last_seen FROM vital_baselines WHERE patient_id = ?", (patient_id,)
+                ).fetchall()
+            states = {}
+            for metric, blob, last_seen in rows:
+                states[metric] = VitalBaseline.from_bytes(blob, self.window)
+                states[metric].last_seen = last_seen
+            self._states[patient_id] = states
+        return states
+
+    def _score(self, metric, state, value):
+        if state.count == 0:
+            return None
+        spread = max(state.std, self.min_std.get(metric, 1.0))
+        return (value - state.mean) / spread
+
+    def observe(self, patient_id, vital_type, value, observed_at=None):
+        """
+        Score one logged vital against the patient's baseline and fold it in
+
+        Returns:
+            One dict per metric in the vital (blood pressure gives two): value,
+            baseline mean and spread before this reading, z_score, anomaly,
+            direction and readings seen. Empty if the value isn't numeric or the
+            reading is older than one already applied.
+        """
+        observed_at = observed_at.isoformat() if isinstance(observed_at, datetime) else observed_at
+        states = self._patient_states(patient_id)
+        results = []
+        for metric, metric_value in vital_metrics(vital_type, value).items():
+            state = states.get(metric)
+            if state is None:
+                state = states[metric] = VitalBaseline(self.window)
+            if observed_at is not None and state.last_seen is not None and str(observed_at) <= state.last_seen:
+                continue
+
+            z_score = self._score(metric, state, metric_value)
+            anomaly = z_score is not None and state.count >= self.warmup and abs(z_score) >= self.z_threshold
+            results.append({
+                'metric': metric,
+                'value': metric_value,
+                'baseline': state.mean if state.count else None,
+                'std': state.std if state.count else None,
+                'z_score': z_score,
+                'anomaly': anomaly,
+                'direction': ('high' if z_score > 0 else 'low') if anomaly else None,
+                'readings': state.count
+            })
+
+            state.update(metric_value, self.alpha)
+            if observed_at is not None:
+                state.last_seen = str(observed_at)
+            self._dirty.add((str(patient_id), metric))
+        return results
+
+    def observe_many(self, patient_id, vitals):
+        """
+        Observe vitals as sent by the Node API, oldest first
+
+        Each vital is a dict with 'type' and 'value' and optionally a
+        'createdAt' or 'observed_at' timestamp.
+        """
+        def timestamp(vital):
+            return vital.get('observed_at') or vital.get('createdAt')
+
+        ordered = sorted(vitals, key=lambda vital: str(timestamp(vital) or ''))
+        results = []
+        for vital in ordered:
+            results.extend(self.observe(patient_id, vital.get('type'), vital.get('value'), timestamp(vital)))
+        return results
+
+    def baseline(self, patient_id):
+        """Current baseline of every metric tracked for a patient"""
+        summary = {}
+        for metric, state in self._patient_states(patient_id).items():
+            window_mean, window_std = state.window_stats()
+            summary[metric] = {
+                'readings': state.count,
+                'ewma_mean': state.mean,
+                'ewma_std': state.std,
+                'window_mean': window_mean,
+                'window_std': window_std,
+                'recent': state.recent(),
+                'last_seen': state.last_seen
+            }
+        return summary
+
+    def flush(self):
+        """Write every changed baseline back to SQLite in one transaction"""
+        if not self._dirty:
+            return 0
+        now = datetime.now().isoformat()
+        rows = []
+        for patient_id, metric in self._dirty:
+            state = self._states[patient_id][metric]
+            rows.append((patient_id, metric, state.to_bytes(), state.last_seen, now))
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT INTO vital_baselines (patient_id, metric, state, last_seen, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (patient_id, metric) DO UPDATE SET "
+                "state = excluded.state, last_seen = excluded.last_seen, updated_at = excluded.updated_at",
+                rows
+            )
+        self._dirty.clear()
+        return len(rows)
+
+    def evict(self, patient_ids=None):
+        """
+        Drop flushed baselines from memory (every patient's, or only these)
+
+        The next reading for an evicted patient loads their state from SQLite
+        again, picking up anything another process wrote in the meantime.
+        Unflushed changes are kept.
+        """
+        keep = {patient_id for patient_id, _ in self._dirty}
+        patient_ids = self._states.keys() if patient_ids is None else {str(p) for p in patient_ids}
+        for patient_id in list(patient_ids):
+            if patient_id not in keep:
+                self._states.pop(patient_id, None)
+
+    def forget(self, patient_id):
+        """Drop a patient's baselines from memory and from the database"""
+        patient_id = str(patient_id)
+        self._states.pop(patient_id, None)
+        self._dirty = {key for key in self._dirty if key[0] != patient_id}
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM vital_baselines WHERE patient_id = ?", (patient_id,))
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Per-patient vitals baselines and anomaly flags")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    observe_parser = subparsers.add_parser('observe', help='Score and record a vital reading')
+    observe_parser.add_argument('patient_id')
+    observe_parser.add_argument('type')
+    observe_parser.add_argument('value')
+    observe_parser.add_argument('--observed-at')
+    show_parser = subparsers.add_parser('show', help="Show a patient's baselines")
+    show_parser.add_argument('patient_id')
+    args = parser.parse_args()
+
+    tracker = VitalBaselineTracker(args.db)
+    if args.command == 'observe':
+        print(json.dumps(tracker.observe(args.patient_id, args.type, args.value, args.observed_at), indent=2))
+        tracker.flush()
+    else:
+        print(json.dumps(tracker.baseline(args.patient_id), indent=2))
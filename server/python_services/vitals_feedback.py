@@ -2,23 +2,24 @@
 import sys
 import json
 import os
+import time
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
 
-def analyze_vitals(vitals_data):
-    """
-    Analyze vitals using rule-based logic.
-    Falls back gracefully if Gemini is unavailable.
-    """
-    try:
-        # Try to use Gemini API if available
-        try:
-            import google.generativeai as genai
-            GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-            
-            if GEMINI_API_KEY and GEMINI_API_KEY.startswith("AIza"):
-                genai.configure(api_key=GEMINI_API_KEY)
-                model = genai.GenerativeModel('gemini-1.5-flash')
-                
-                prompt = f"""
+from llm_client import GeminiHTTPClient, LLMUnavailable
+
+# 'legacy' asks the LLM about every submission and uses rules only when it fails;
+# 'tiered' runs the rules first and asks the LLM only about readings that need it
+ANALYSIS_MODE = os.getenv("VITALS_ANALYSIS_MODE", "legacy")
+
+VALID_STATUSES = ("Normal", "Warning", "Critical")
+
+
+def build_prompt(vitals_data):
+    return f"""
                 Act as an empathetic but professional doctor. 
                 Analyze the following patient vitals logged just now:
                 {json.dumps(vitals_data, indent=2)}
@@ -33,10 +34,151 @@ def analyze_vitals(vitals_data):
                     "color": "green" | "amber" | "red"
                 }}
                 """
-                
-                response = model.generate_content(prompt)
-                text = response.text.replace('```json', '').replace('```', '').strip()
-                return json.loads(text)
+
+
+def is_valid_assessment(result):
+    """Whether an LLM reply has the fields the vitals result needs"""
+    return isinstance(result, dict) and result.get("status") in VALID_STATUSES and "feedback" in result
+
+
+class GeminiVitalsLLM:
+    """Gemini assessment of a vitals submission, bounded by the client's deadline"""
+
+    def __init__(self, model_name='gemini-1.5-flash', api_key=None, deadline=None):
+        self.client = GeminiHTTPClient(model_name, api_key=api_key, deadline=deadline)
+
+    def __call__(self, vitals_data):
+        api_key = self.client.api_key
+        if not (api_key and api_key.startswith("AIza")):
+            raise LLMUnavailable("GEMINI_API_KEY is not configured")
+        return self.client.generate_json_sync(build_prompt(vitals_data), validate=is_valid_assessment)
+
+
+class StubVitalsLLM:
+    """
+    Local stand-in for the LLM tier, for tests and load runs
+
+    Answers after a fixed delay, either with a canned response or with the
+    rule-based result marked as coming from the stub.
+    """
+
+    def __init__(self, latency=0.0, response=None, fail=False):
+        self.latency = latency
+        self.response = response
+        self.fail = fail
+        self.calls = 0
+
+    def __call__(self, vitals_data):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail:
+            raise LLMUnavailable("stub LLM configured to fail")
+        if self.response is not None:
+            return dict(self.response)
+        result = analyze_vitals_fallback(vitals_data)
+        return {**result, "feedback": f"[stub] {result['feedback']}"}
+
+
+_default_llm = None
+
+
+def default_llm():
+    """The LLM selected by VITALS_LLM: 'gemini' (default) or 'stub' (delay from VITALS_LLM_STUB_LATENCY)"""
+    global _default_llm
+    if _default_llm is None:
+        if os.getenv("VITALS_LLM", "gemini").lower() == "stub":
+            _default_llm = StubVitalsLLM(latency=float(os.getenv("VITALS_LLM_STUB_LATENCY", "0")))
+        else:
+            _default_llm = GeminiVitalsLLM()
+    return _default_llm
+
+
+class TierStats:
+    """Escalation rate and latency per analysis tier (thread-safe, in-process)"""
+
+    def __init__(self, sample_size=1000):
+        self._lock = threading.Lock()
+        self._sample_size = sample_size
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.escalations = Counter()
+            self.llm_failures = 0
+            self._latencies = {}
+
+    def record(self, tier, seconds, reason=None, llm_failed=False):
+        with self._lock:
+            self.requests += 1
+            if reason is not None:
+                self.escalations[reason] += 1
+            self.llm_failures += llm_failed
+            self._latencies.setdefault(tier, deque(maxlen=self._sample_size)).append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            escalated = sum(self.escalations.values())
+            tiers = {}
+            for tier, samples in self._latencies.items():
+                ms = np.asarray(samples) * 1000
+                tiers[tier] = {
+                    'count': len(ms),
+                    'mean_ms': round(float(ms.mean()), 3),
+                    'p50_ms': round(float(np.percentile(ms, 50)), 3),
+                    'p95_ms': round(float(np.percentile(ms, 95)), 3)
+                }
+            return {
+                'requests': self.requests,
+                'escalated': escalated,
+                'escalation_rate': escalated / self.requests if self.requests else 0.0,
+                'escalations_by_reason': dict(self.escalations),
+                'llm_failures': self.llm_failures,
+                'latency_by_tier': tiers
+            }
+
+
+TIER_STATS = TierStats()
+
+
+def get_tier_stats():
+    return TIER_STATS.snapshot()
+
+
+def llm_circuit_status(llm=None):
+    """Circuit breaker snapshot of the LLM tier, or None if it has no breaker (e.g. the stub)"""
+    breaker = getattr(getattr(llm or default_llm(), 'client', None), 'breaker', None)
+    return breaker.snapshot() if breaker is not None else None
+
+
+def llm_cache_status(llm=None):
+    """Response cache snapshot of the LLM tier, or None if it has no cache"""
+    cache = getattr(getattr(llm or default_llm(), 'client', None), 'cache', None)
+    return cache.snapshot() if cache is not None else None
+
+
+def analyze_vitals(vitals_data, mode=None, llm=None):
+    """
+    Analyze vitals with Gemini and rule-based logic.
+
+    Args:
+        vitals_data: List of {'type', 'value', ...} readings
+        mode: 'legacy' (LLM first, rules on failure) or 'tiered' (see
+            analyze_vitals_tiered); defaults to VITALS_ANALYSIS_MODE
+        llm: Callable taking vitals_data and returning the result dict
+            (default: default_llm())
+    """
+    llm = llm or default_llm()
+    if (mode or ANALYSIS_MODE) == "tiered":
+        return analyze_vitals_tiered(vitals_data, llm)
+
+    try:
+        # Try the LLM if available
+        try:
+            return llm(vitals_data)
+        except LLMUnavailable:
+            pass
         except Exception as gemini_error:
             print(f"Gemini unavailable, using fallback: {gemini_error}", file=sys.stderr)
         
@@ -44,80 +186,260 @@ def analyze_vitals(vitals_data):
         return analyze_vitals_fallback(vitals_data)
     
     except Exception as e:
-        return {
-            "status": "Error",
-            "feedback": "Unable to analyze vitals at this moment.",
-            "action_items": ["Please consult with your healthcare provider"],
-            "error": str(e),
-            "color": "amber"
-        }
+        return _error_result(e)
 
-def analyze_vitals_fallback(vitals_data):
-    """Rule-based vital analysis when Gemini is unavailable"""
-    issues = []
-    warnings = []
-    status = "Normal"
-    color = "green"
-    
-    for vital in vitals_data:
-        vtype = vital.get('type', '').lower()
-        value = vital.get('value', '')
-        
-        # Blood Pressure Analysis
-        if 'pressure' in vtype:
-            try:
-                sys_val, dia_val = map(int, value.split('/'))
-                if sys_val > 140 or dia_val > 90:
-                    status = "Warning"
-                    color = "amber"
-                    warnings.append(f"Blood pressure is elevated ({value})")
-                if sys_val > 160 or dia_val > 100:
-                    status = "Critical"
-                    color = "red"
-                    issues.append(f"Blood pressure is critically high ({value})")
-            except:
-                pass
-        
-        # Blood Sugar Analysis
-        elif 'sugar' in vtype or 'glucose' in vtype:
-            try:
-                sugar_val = int(value)
-                if sugar_val > 140:
-                    status = "Warning" if status == "Normal" else status
-                    color = "amber" if color == "green" else color
-                    warnings.append(f"Blood sugar is high ({sugar_val} mg/dL)")
-                if sugar_val < 70:
-                    status = "Warning" if status == "Normal" else status
-                    warnings.append(f"Blood sugar is low ({sugar_val} mg/dL)")
-            except:
-                pass
-        
-        # Heart Rate Analysis
-        elif 'heart' in vtype:
-            try:
-                hr_val = int(value)
-                if hr_val > 100:
-                    warnings.append(f"Heart rate is elevated ({hr_val} bpm)")
-                if hr_val < 60:
-                    warnings.append(f"Heart rate is low ({hr_val} bpm)")
-            except:
-                pass
-        
-        # Oxygen Analysis
-        elif 'oxygen' in vtype:
-            try:
-                ox_val = int(value)
-                if ox_val < 95:
-                    status = "Warning" if status == "Normal" else status
-                    warnings.append(f"Oxygen level is below normal ({ox_val}%)")
-                if ox_val < 90:
-                    status = "Critical"
-                    color = "red"
-                    issues.append(f"Oxygen level is critically low ({ox_val}%)")
-            except:
-                pass
-    
-    # Build feedback message
+
+def analyze_vitals_tiered(vitals_data, llm=None, stats=TIER_STATS):
+    """
+    Rules first; the LLM only for submissions the rules can't settle alone
+
+    Clearly normal vitals are answered by the rule engine without touching
+    the LLM. Warning or Critical results, and readings that are unparseable
+    or within a kind's margin of a threshold, are escalated. If the LLM is
+    unavailable or returns something unusable, the rule result stands.
+    Every result carries 'analysis_tier': 'rules', 'llm' or 'rules_fallback'.
+    """
+    start = time.perf_counter()
+    try:
+        results, ambiguous = _evaluate_batch([vitals_data], raise_errors=True)
+    except Exception as e:
+        stats.record("rules", time.perf_counter() - start)
+        return _error_result(e)
+    return _escalate(vitals_data, results[0], ambiguous[0], llm or default_llm(), stats, start)
+
+
+def _escalate(vitals_data, result, ambiguous, llm, stats, start):
+    """Second tier of analyze_vitals_tiered, given the rule result; start is when the request began"""
+    if result["status"] == "Error":
+        stats.record("rules", time.perf_counter() - start)
+        return result
+    if result["status"] == "Critical":
+        reason = "critical"
+    elif result["status"] == "Warning":
+        reason = "warning"
+    elif ambiguous:
+        reason = "ambiguous"
+    else:
+        stats.record("rules", time.perf_counter() - start)
+        return {**result, "analysis_tier": "rules"}
+
+    try:
+        llm_result = llm(vitals_data)
+        if not is_valid_assessment(llm_result):
+            raise ValueError(f"unusable LLM response: {llm_result!r:.200}")
+    except Exception as llm_error:
+        if not isinstance(llm_error, LLMUnavailable):
+            print(f"LLM tier failed, using rules: {llm_error}", file=sys.stderr)
+        stats.record("rules_fallback", time.perf_counter() - start, reason, llm_failed=True)
+        return {**result, "analysis_tier": "rules_fallback"}
+
+    stats.record("llm", time.perf_counter() - start, reason)
+    return {**llm_result, "analysis_tier": "llm"}
+
+
+def analyze_vitals_many(vitals_list, mode=None, llm=None, stats=TIER_STATS):
+    """
+    analyze_vitals for many submissions, rule-scoring them in one vectorised pass
+
+    Results are in input order and match calling analyze_vitals on each. In
+    legacy mode the LLM is tried per submission until it reports itself
+    unavailable; everything it didn't answer is rule-scored together.
+    """
+    llm = llm or default_llm()
+    vitals_list = list(vitals_list)
+    if not vitals_list:
+        return []
+
+    if (mode or ANALYSIS_MODE) == "tiered":
+        start = time.perf_counter()
+        results, ambiguous = _evaluate_batch(vitals_list)
+        # Each submission is charged an equal share of the batched rule pass
+        share = (time.perf_counter() - start) / len(vitals_list)
+        return [
+            _escalate(vitals_data, result, is_ambiguous, llm, stats, time.perf_counter() - share)
+            for vitals_data, result, is_ambiguous in zip(vitals_list, results, ambiguous.tolist())
+        ]
+
+    results = [None] * len(vitals_list)
+    llm_available = True
+    for i, vitals_data in enumerate(vitals_list):
+        if not llm_available:
+            break
+        try:
+            results[i] = llm(vitals_data)
+        except LLMUnavailable:
+            llm_available = False
+        except Exception as gemini_error:
+            print(f"Gemini unavailable, using fallback: {gemini_error}", file=sys.stderr)
+
+    pending = [i for i, result in enumerate(results) if result is None]
+    for i, result in zip(pending, evaluate_vitals_batch([vitals_list[i] for i in pending])):
+        results[i] = result
+    return results
+
+
+# Vital kinds, matched against the lower-cased 'type' in this order (first match wins).
+# 'fields' are the integers parsed from 'value': "120/80" for blood pressure, "98" otherwise.
+# A reading within 'margin' of any threshold of its kind counts as ambiguous (tiered mode).
+VITAL_KINDS = [
+    {'kind': 'blood_pressure', 'match': ('pressure',), 'fields': ('systolic', 'diastolic'), 'margin': 5},
+    {'kind': 'blood_sugar', 'match': ('sugar', 'glucose'), 'fields': ('value',), 'margin': 10},
+    {'kind': 'heart_rate', 'match': ('heart',), 'fields': ('value',), 'margin': 5},
+    {'kind': 'oxygen', 'match': ('oxygen',), 'fields': ('value',), 'margin': 1},
+]
+
+# Threshold rules, applied to each reading in table order. A rule fires when any
+# of its conditions holds. 'status'/'color' effects:
+#   ('set', x)      - overwrite the current value
+#   ('escalate', x) - only move off the default ("Normal"/"green")
+# 'message' goes to the warnings or issues list; {raw} is the reading as logged,
+# {value} the parsed number.
+VITAL_RULES = [
+    {'kind': 'blood_pressure', 'any': [('systolic', '>', 140), ('diastolic', '>', 90)],
+     'status': ('set', 'Warning'), 'color': ('set', 'amber'),
+     'list': 'warnings', 'message': 'Blood pressure is elevated ({raw})'},
+    {'kind': 'blood_pressure', 'any': [('systolic', '>', 160), ('diastolic', '>', 100)],
+     'status': ('set', 'Critical'), 'color': ('set', 'red'),
+     'list': 'issues', 'message': 'Blood pressure is critically high ({raw})'},
+    {'kind': 'blood_sugar', 'any': [('value', '>', 140)],
+     'status': ('escalate', 'Warning'), 'color': ('escalate', 'amber'),
+     'list': 'warnings', 'message': 'Blood sugar is high ({value} mg/dL)'},
+    {'kind': 'blood_sugar', 'any': [('value', '<', 70)],
+     'status': ('escalate', 'Warning'), 'color': None,
+     'list': 'warnings', 'message': 'Blood sugar is low ({value} mg/dL)'},
+    {'kind': 'heart_rate', 'any': [('value', '>', 100)],
+     'status': None, 'color': None,
+     'list': 'warnings', 'message': 'Heart rate is elevated ({value} bpm)'},
+    {'kind': 'heart_rate', 'any': [('value', '<', 60)],
+     'status': None, 'color': None,
+     'list': 'warnings', 'message': 'Heart rate is low ({value} bpm)'},
+    {'kind': 'oxygen', 'any': [('value', '<', 95)],
+     'status': ('escalate', 'Warning'), 'color': None,
+     'list': 'warnings', 'message': 'Oxygen level is below normal ({value}%)'},
+    {'kind': 'oxygen', 'any': [('value', '<', 90)],
+     'status': ('set', 'Critical'), 'color': ('set', 'red'),
+     'list': 'issues', 'message': 'Oxygen level is critically low ({value}%)'},
+]
+
+_OPERATORS = {'>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal}
+
+
+def _compile_rules(kinds, rules):
+    """Turn the rule table into (kind index, [(column, ufunc, threshold)], rule) tuples"""
+    kind_index = {spec['kind']: i for i, spec in enumerate(kinds)}
+    compiled = []
+    for rule in rules:
+        fields = kinds[kind_index[rule['kind']]]['fields']
+        conditions = [(fields.index(field), _OPERATORS[op], threshold) for field, op, threshold in rule['any']]
+        compiled.append((kind_index[rule['kind']], conditions, rule))
+    return compiled
+
+
+_COMPILED_RULES = _compile_rules(VITAL_KINDS, VITAL_RULES)
+_MAX_FIELDS = max(len(spec['fields']) for spec in VITAL_KINDS)
+
+# Kind codes for table rows that no rule applies to
+_NO_RULES = -1
+_UNREADABLE = -2
+_UNPARSEABLE = -3
+
+
+@lru_cache(maxsize=256)
+def _match_kind(vtype):
+    for kind, spec in enumerate(VITAL_KINDS):
+        if any(keyword in vtype for keyword in spec['match']):
+            return kind
+    return _NO_RULES
+
+
+# Readings are compared as float64; larger integers can't be held exactly (or at all)
+def _parse_value(kind, value):
+    """The reading's integers, or None if it cannot be parsed the way it always was (int())"""
+    n_fields = len(VITAL_KINDS[kind]['fields'])
+    try:
+        parsed = tuple(map(int, value.split('/'))) if n_fields > 1 else (int(value),)
+    except Exception:
+        return None
+    if len(parsed) != n_fields:
+        return None
+    return parsed
+
+
+def _as_float(number):
+    """
+    An integer reading as a float for the rule table
+
+    Integers too large for a float (such as "9" * 400) become +/-inf, which
+    compares against every threshold the same way the integer does.
+    """
+    try:
+        return float(number)
+    except OverflowError:
+        return float('inf') if number > 0 else float('-inf')
+
+
+class _ReadingTable:
+    """
+    Distinct (type, value) pairs seen in a batch, each matched and parsed once
+
+    Logged vitals repeat a lot ("Blood Pressure", "120/80"), so a batch of
+    thousands of readings usually has only a few hundred distinct pairs.
+    Each becomes a row (kind, *ints) padded with NaN; rows for unknown types
+    (_NO_RULES) or unparseable values (_UNPARSEABLE) match no rule and are
+    skipped, as they always have been. A type that cannot be lower-cased is
+    _UNREADABLE and keeps its exception for the error result.
+    """
+
+    def __init__(self):
+        self.rows = [(_NO_RULES,) + (np.nan,) * _MAX_FIELDS]
+        self.raw = [None]
+        self.parsed = [None]
+        self.errors = {}
+        self.index = {}
+
+    def add(self, pair):
+        vtype, value = pair
+        row = len(self.rows)
+        try:
+            kind = _match_kind(vtype.lower())
+        except Exception as e:
+            self.errors[row] = e
+            kind = _UNREADABLE
+        parsed = _parse_value(kind, value) if kind >= 0 else None
+        if kind >= 0 and parsed is None:
+            kind = _UNPARSEABLE
+        padded = tuple(map(_as_float, parsed or ()))
+        self.rows.append((kind,) + padded + (np.nan,) * (_MAX_FIELDS - len(padded)))
+        self.raw.append(value)
+        self.parsed.append(parsed[0] if parsed else None)
+        return row
+
+    def lookup(self, pairs):
+        """Row index of every (type, value) pair, adding new pairs to the table"""
+        try:
+            new = {pair for pair in pairs if type(pair[0]) is str} - self.index.keys()
+        except TypeError:
+            # An unhashable value (list, dict) somewhere in the batch
+            return [self._lookup_one(pair) for pair in pairs]
+        for pair in new:
+            self.index[pair] = self.add(pair)
+        index = self.index
+        # Non-string types get their own row so each keeps its own error message
+        return [index[pair] if type(pair[0]) is str else self.add(pair) for pair in pairs]
+
+    def _lookup_one(self, pair):
+        if type(pair[0]) is not str:
+            return self.add(pair)
+        try:
+            row = self.index.get(pair)
+        except TypeError:
+            return self.add(pair)
+        if row is None:
+            row = self.index[pair] = self.add(pair)
+        return row
+
+
+def _build_feedback(status, warnings, issues, color):
     if status == "Normal":
         feedback = "Your vitals look good! All readings are within normal range. Keep up the healthy lifestyle."
         action_items = ["Continue monitoring regularly", "Maintain healthy diet and exercise"]
@@ -135,7 +457,373 @@ def analyze_vitals_fallback(vitals_data):
         "color": color
     }
 
+
+def _error_result(error):
+    return {
+        "status": "Error",
+        "feedback": "Unable to analyze vitals at this moment.",
+        "action_items": ["Please consult with your healthcare provider"],
+        "error": str(error),
+        "color": "amber"
+    }
+
+
+def _final_effect(effect_name, default, patients, fired_patient, fired_rule):
+    """
+    Final status (or color) per patient after applying the fired rules in order
+
+    Every 'set' value differs from the default, so once anything has moved
+    the patient off the default no 'escalate' changes it again: the last
+    'set' wins, otherwise the first 'escalate' does.
+    """
+    effects = [rule[effect_name] for _, _, rule in _COMPILED_RULES]
+    is_set = np.array([e is not None and e[0] == 'set' for e in effects], dtype=bool)[fired_rule]
+    is_escalate = np.array([e is not None and e[0] == 'escalate' for e in effects], dtype=bool)[fired_rule]
+    values = np.array([e[1] if e is not None else default for e in effects], dtype=object)
+
+    last_set = np.full(patients, -1)
+    np.maximum.at(last_set, fired_patient[is_set], np.flatnonzero(is_set))
+    first_escalate = np.full(patients, len(fired_rule))
+    np.minimum.at(first_escalate, fired_patient[is_escalate], np.flatnonzero(is_escalate))
+
+    final = np.full(patients, default, dtype=object)
+    escalated = first_escalate < len(fired_rule)
+    final[escalated] = values[fired_rule[first_escalate[escalated]]]
+    has_set = last_set >= 0
+    final[has_set] = values[fired_rule[last_set[has_set]]]
+    return final
+
+
+def evaluate_vitals_batch(vitals_by_patient, raise_errors=False):
+    """
+    Rule-based analysis for many patients at once
+
+    Readings are parsed once, then every rule in VITAL_RULES is a numpy
+    comparison over the whole array of readings. Each result is identical
+    to analyze_vitals_fallback on that patient's vitals; a patient whose
+    payload cannot be read gets the same error result analyze_vitals returns.
+
+    Args:
+        vitals_by_patient: Sequence of vitals lists, one per patient
+            (each vital a dict with 'type' and 'value')
+        raise_errors: Raise on an unreadable payload instead of returning an error result
+
+    Returns:
+        List of result dicts (status, feedback, action_items, color), in input order
+    """
+    return _evaluate_batch(vitals_by_patient, raise_errors)[0]
+
+
+def _evaluate_batch(vitals_by_patient, raise_errors=False):
+    """evaluate_vitals_batch, plus whether each patient has an ambiguous reading"""
+    vitals_by_patient = list(vitals_by_patient)
+    errors = {}
+    try:
+        counts = [len(vitals_data) for vitals_data in vitals_by_patient]
+        pairs = [(vital.get('type', ''), vital.get('value', ''))
+                 for vitals_data in vitals_by_patient for vital in vitals_data]
+    except Exception:
+        # Some payload is not a list of dicts; collect patient by patient
+        counts, pairs = [], []
+        for p, vitals_data in enumerate(vitals_by_patient):
+            try:
+                patient_pairs = [(vital.get('type', ''), vital.get('value', '')) for vital in vitals_data]
+            except Exception as e:
+                # The first reading that fails decides the error, as it always has
+                counts.append(0)
+                errors[p] = _first_error(vitals_data, e)
+                continue
+            counts.append(len(patient_pairs))
+            pairs.extend(patient_pairs)
+
+    patients = len(counts)
+    patient_of = np.repeat(np.arange(patients), counts)
+    table = _ReadingTable()
+    rows = np.asarray(table.lookup(pairs), dtype=np.int64)
+    parsed = np.asarray(table.rows, dtype=float)[rows]
+    kinds = parsed[:, 0]
+    readings = parsed[:, 1:]
+
+    # A type that can't be read fails its patient at the first such reading
+    for reading in np.flatnonzero(kinds == _UNREADABLE).tolist():
+        errors.setdefault(int(patient_of[reading]), table.errors[rows[reading]])
+    if errors and raise_errors:
+        raise errors[min(errors)]
+
+    margins = np.array([spec['margin'] for spec in VITAL_KINDS], dtype=float)
+    near_threshold = kinds == _UNPARSEABLE
+    fired_reading, fired_rule = [], []
+    for r, (kind, conditions, _) in enumerate(_COMPILED_RULES):
+        hit = np.zeros(len(rows), dtype=bool)
+        for column, op, threshold in conditions:
+            hit |= op(readings[:, column], threshold)
+            near_threshold |= (kinds == kind) & (np.abs(readings[:, column] - threshold) <= margins[kind])
+        hit &= kinds == kind
+        idx = np.flatnonzero(hit)
+        fired_reading.append(idx)
+        fired_rule.append(np.full(len(idx), r))
+
+    fired_reading = np.concatenate(fired_reading)
+    fired_rule = np.concatenate(fired_rule)
+    # Reading order first, then table order: the sequence the rules used to run in
+    order = np.lexsort((fired_rule, fired_reading))
+    fired_reading, fired_rule = fired_reading[order], fired_rule[order]
+    fired_patient = patient_of[fired_reading]
+
+    status = _final_effect('status', 'Normal', patients, fired_patient, fired_rule)
+    color = _final_effect('color', 'green', patients, fired_patient, fired_rule)
+
+    # Feedback quotes the warnings for a Warning and the issues for a Critical; format only those
+    rule_lists = np.array([rule['list'] for _, _, rule in _COMPILED_RULES], dtype=object)
+    wanted_list = np.where(status == 'Critical', 'issues', 'warnings').astype(object)
+    quoted = rule_lists[fired_rule] == wanted_list[fired_patient]
+    fired_reading, fired_rule, fired_patient = fired_reading[quoted], fired_rule[quoted], fired_patient[quoted]
+
+    # Each table row comes from one distinct logged value, so (rule, row) fixes the message text
+    fired_row = rows[fired_reading]
+    keys = fired_rule * len(table.rows) + fired_row
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    texts = [
+        _COMPILED_RULES[r][2]['message'].format(raw=table.raw[row], value=table.parsed[row])
+        for r, row in zip(fired_rule[first].tolist(), fired_row[first].tolist())
+    ]
+    messages = [texts[i] for i in inverse.ravel().tolist()]
+    bounds = np.searchsorted(fired_patient, np.arange(patients + 1)).tolist()
+
+    results = [
+        _build_feedback(p_status, messages[start:end], messages[start:end], p_color)
+        for p_status, p_color, start, end in zip(status.tolist(), color.tolist(), bounds, bounds[1:])
+    ]
+    for p, error in errors.items():
+        results[p] = _error_result(error)
+    ambiguous = np.bincount(patient_of[near_threshold], minlength=patients) > 0
+    return results, ambiguous
+
+
+def check_baseline(patient_id, vitals_data, tracker=None, flush=True):
+    """
+    Readings that are unusual for this patient, judged against their own history
+
+    Complements the fixed thresholds: a heart rate of 95 is normal in general
+    but worth mentioning for a patient whose baseline is 62.
+
+    Returns:
+        List of alerts (metric, value, baseline, z_score, direction, message)
+    """
+    from vitals_baseline import VitalBaselineTracker
+
+    tracker = tracker or VitalBaselineTracker()
+    alerts = []
+    for flag in tracker.observe_many(patient_id, vitals_data):
+        if not flag['anomaly']:
+            continue
+        label = flag['metric'].replace('_', ' ')
+        alerts.append({
+            **{key: flag[key] for key in ('metric', 'value', 'baseline', 'z_score', 'direction')},
+            'message': f"{label.capitalize()} of {flag['value']:g} is unusually {flag['direction']} "
+                       f"for you (your usual is about {flag['baseline']:.0f})"
+        })
+    if flush:
+        tracker.flush()
+    return alerts
+
+
+def _first_error(vitals_data, error):
+    """The exception the original per-reading loop would have stopped at"""
+    try:
+        for vital in vitals_data:
+            vital.get('type', '').lower()
+            vital.get('value', '')
+    except Exception as e:
+        return e
+    return error
+
+
+def analyze_vitals_fallback(vitals_data):
+    """Rule-based vital analysis when Gemini is unavailable"""
+    # Malformed payloads still raise here; analyze_vitals turns that into its error result
+    return evaluate_vitals_batch([vitals_data], raise_errors=True)[0]
+
+def _parse_request(line, line_number):
+    """(request id, vitals, patient id, command) from one NDJSON line"""
+    request = json.loads(line)
+    if isinstance(request, list):
+        return line_number, request, None, None
+    if not isinstance(request, dict):
+        raise ValueError("request must be a vitals list or an object with 'vitals'")
+    request_id = request.get("id", line_number)
+    if "command" in request:
+        return request_id, None, None, request["command"]
+    if "vitals" not in request:
+        raise ValueError("request has no 'vitals'")
+    return request_id, request["vitals"], request.get("patient_id"), None
+
+
+class _Baselines:
+    """
+    The VitalBaselineTracker shared by the requests of one run, opened on first use
+
+    A patient's state is dropped from memory once it is flushed, so a
+    long-running worker doesn't accumulate every patient it has seen and
+    reloads baselines that another process (the one-shot CLI) has updated.
+    """
+
+    def __init__(self):
+        self.tracker = None
+        self.lock = threading.Lock()
+
+    def add_alerts(self, items):
+        """Attach baseline_alerts to each analyzed item that has a patient_id"""
+        items = [item for item in items if item["patient_id"] is not None and isinstance(item.get("result"), dict)]
+        if not items:
+            return
+        with self.lock:
+            for item in items:
+                try:
+                    if self.tracker is None:
+                        from vitals_baseline import VitalBaselineTracker
+                        self.tracker = VitalBaselineTracker()
+                    item["result"]["baseline_alerts"] = check_baseline(
+                        item["patient_id"], item["vitals"], self.tracker, flush=False
+                    )
+                except Exception as baseline_error:
+                    print(f"Baseline check failed: {baseline_error}", file=sys.stderr)
+            if self.tracker is not None:
+                self.tracker.flush()
+                self.tracker.evict(item["patient_id"] for item in items)
+
+
+def _parse_line(line, line_number, llm):
+    """One NDJSON line as a chunk item: a finished {"response"} or a request to analyze"""
+    try:
+        request_id, vitals_data, patient_id, command = _parse_request(line, line_number)
+    except Exception as e:
+        return {"response": {"id": None, "error": str(e)}}
+    if command == "stats":
+        return {"response": {
+            "id": request_id, "stats": get_tier_stats(),
+            "llm_circuit": llm_circuit_status(llm), "llm_cache": llm_cache_status(llm)
+        }}
+    if command == "ping":
+        return {"response": {"id": request_id, "pong": True}}
+    if command is not None:
+        return {"response": {"id": request_id, "error": f"unknown command {command!r}"}}
+    return {"id": request_id, "vitals": vitals_data, "patient_id": patient_id}
+
+
+def _answer_chunk(chunk, mode, llm, baselines):
+    """Analyze a chunk's requests together; returns one response per item, in order"""
+    analyzed = [item for item in chunk if "vitals" in item]
+    try:
+        results = analyze_vitals_many([item["vitals"] for item in analyzed], mode, llm)
+    except Exception:
+        # One request broke the chunk; analyze them one by one so only it fails
+        results = []
+        for item in analyzed:
+            try:
+                results.extend(analyze_vitals_many([item["vitals"]], mode, llm))
+            except Exception as e:
+                print(f"Request {item['id']} failed: {e}", file=sys.stderr)
+                item["response"] = {"id": item["id"], "error": str(e)}
+                results.append(None)
+    for item, result in zip(analyzed, results):
+        if "response" not in item:
+            item["result"] = result
+    baselines.add_alerts([item for item in analyzed if "response" not in item])
+    return [item["response"] if "response" in item else {"id": item["id"], "result": item["result"]}
+            for item in chunk]
+
+
+def process_ndjson(lines, chunk_size=1000, mode=None, llm=None):
+    """
+    Analyze NDJSON requests, yielding one response per non-blank line in order
+
+    Each request is a vitals list or {"id", "vitals", "patient_id"}; a
+    patient_id adds baseline_alerts. Responses are {"id", "result"}, or
+    {"id", "error"} for a line that isn't a valid request or whose analysis
+    failed; the other requests are unaffected. Requests are
+    analyzed chunk_size at a time with one vectorised rule pass per chunk.
+    {"command": "stats"} (tier stats, the LLM circuit breaker and cache) and
+    {"command": "ping"} answer immediately.
+    """
+    baselines = _Baselines()
+    chunk = []
+    line_number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        line_number += 1
+        chunk.append(_parse_line(line, line_number, llm))
+        if len(chunk) >= chunk_size:
+            yield from _answer_chunk(chunk, mode, llm, baselines)
+            chunk = []
+    if chunk:
+        yield from _answer_chunk(chunk, mode, llm, baselines)
+
+
+# Requests a --worker analyzes at once; in legacy mode each may wait on the LLM for its whole deadline
+WORKER_THREADS = int(os.getenv("VITALS_WORKER_THREADS", "16"))
+
+
+def serve_worker(lines, stdout, mode=None, llm=None, threads=None):
+    """
+    --worker loop: answer every request as soon as it is done, not in arrival order
+
+    Each request is analyzed on its own pool thread, so one that waits on the
+    LLM doesn't hold up the ones behind it; commands are answered straight
+    from the reading thread. Every response carries its request's id for the
+    caller to match. Returns once the input ends and in-flight requests finish.
+    """
+    baselines = _Baselines()
+    write_lock = threading.Lock()
+
+    def write(response):
+        data = json.dumps(response) + "\n"
+        with write_lock:
+            stdout.write(data)
+            stdout.flush()
+
+    def answer(item):
+        try:
+            response, = _answer_chunk([item], mode, llm, baselines)
+        except Exception as e:
+            print(f"Request {item['id']} failed: {e}", file=sys.stderr)
+            response = {"id": item["id"], "error": str(e)}
+        write(response)
+
+    with ThreadPoolExecutor(threads or WORKER_THREADS, thread_name_prefix="vitals-request") as executor:
+        line_number = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            line_number += 1
+            item = _parse_line(line, line_number, llm)
+            if "response" in item:
+                write(item["response"])
+            else:
+                executor.submit(answer, item)
+
+
+def run_ndjson(stdin, stdout, worker=False):
+    """
+    --batch: read NDJSON requests until EOF and write results in order.
+    --worker: stay up and answer requests concurrently as they arrive (see
+    serve_worker), so one process (and one set of imports) serves any number
+    of requests.
+    """
+    if worker:
+        serve_worker(stdin, stdout)
+        return
+    for response in process_ndjson(stdin):
+        stdout.write(json.dumps(response) + "\n")
+    stdout.flush()
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in ("--batch", "--worker"):
+        run_ndjson(sys.stdin, sys.stdout, worker=sys.argv[1] == "--worker")
+        sys.exit(0)
+
     if len(sys.argv) < 2:
         print(json.dumps({"error": "No data provided"}))
         sys.exit(1)
@@ -144,6 +832,12 @@ if __name__ == "__main__":
         # Argument is a JSON string of vitals
         vitals_input = json.loads(sys.argv[1])
         result = analyze_vitals(vitals_input)
+        # Optional patient id: also compare against the patient's own baseline
+        if len(sys.argv) > 2 and isinstance(result, dict):
+            try:
+                result["baseline_alerts"] = check_baseline(sys.argv[2], vitals_input)
+            except Exception as baseline_error:
+                print(f"Baseline check failed: {baseline_error}", file=sys.stderr)
         print(json.dumps(result))
     except Exception as e:
         print(json.dumps({"error": str(e)}))
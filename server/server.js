@@ -9,6 +9,7 @@ const path = require('path');
 const fs = require('fs');
 const { spawn } = require('child_process');
 const Message = require('./models/Message');
+const { protect } = require('./middleware/authMiddleware');
 
 // Configure Multer for temp uploads
 const upload = multer({ dest: path.join(__dirname, 'uploads/') }); // Store in local uploads folder for cleanup logic verification
@@ -72,8 +73,8 @@ app.use('/api/voice', require('./routes/voiceRoutes')); // Voice calling agent
 app.use('/api/prescriptions', require('./routes/prescriptionRoutes'));
 app.use('/api/products', require('./routes/productRoutes'));
 
-// Upload Report Endpoint
-app.post('/api/upload-report', upload.single('report'), async (req, res) => {
+// Upload Report Endpoint (authenticated before multer, so anonymous uploads are never stored)
+app.post('/api/upload-report', protect, upload.single('report'), async (req, res) => {
   console.log('Received file upload request');
   if (!req.file) {
     console.error('No file in request');
@@ -104,8 +105,10 @@ app.post('/api/upload-report', upload.single('report'), async (req, res) => {
     console.log('Disease Type:', diseaseType);
 
     // Pass '-u' for unbuffered output to capture real-time logs if needed
-    // Pass diseaseType as second argument
-    const pythonProcess = spawn('python', ['-u', pythonScript, filePath, diseaseType]);
+    // Pass diseaseType as second argument, and the signed-in patient's id as third
+    // so extracted values are kept in their feature store record
+    const pythonArgs = ['-u', pythonScript, filePath, diseaseType, String(req.user.id)];
+    const pythonProcess = spawn('python', pythonArgs);
 
     let dataString = '';
     let errorString = '';
@@ -286,3 +289,14 @@ server.listen(PORT, () => {
   const { initReminderScheduler } = require('./services/reminderScheduler');
   initReminderScheduler();
 });
+
+// Close the long-lived Python vitals worker along with the server
+const shutdown = (signal) => {
+  console.log(`${signal} received, shutting down`);
+  const { stopVitalsWorker } = require('./services/vitalsWorker');
+  stopVitalsWorker();
+  server.close(() => process.exit(0));
+  setTimeout(() => process.exit(0), 5000).unref();
+};
+process.on('SIGTERM', () => shutdown('SIGTERM'));
+process.on('SIGINT', () => shutdown('SIGINT'));
@@ -0,0 +1,88 @@
+const { spawn } = require('child_process');
+const path = require('path');
+const readline = require('readline');
+
+const scriptPath = path.join(__dirname, '../python_services/vitals_feedback.py');
+const REQUEST_TIMEOUT_MS = parseInt(process.env.VITALS_WORKER_TIMEOUT_MS || '30000', 10);
+
+// One long-lived `vitals_feedback.py --worker` process answers every request,
+// so the Python interpreter and its imports are paid for once, not per call.
+// It works on requests concurrently and replies as each finishes, so responses
+// are matched to their request by id, not by order.
+let worker = null;
+let nextId = 1;
+const pending = new Map();
+
+const failPending = (error) => {
+    for (const { reject, timer } of pending.values()) {
+        clearTimeout(timer);
+        reject(error);
+    }
+    pending.clear();
+};
+
+const startWorker = () => {
+    const child = spawn('python', [scriptPath, '--worker']);
+
+    readline.createInterface({ input: child.stdout }).on('line', (line) => {
+        let response;
+        try {
+            response = JSON.parse(line);
+        } catch (e) {
+            console.error('Failed to parse vitals worker output', line);
+            return;
+        }
+        const request = pending.get(response.id);
+        if (!request) return;
+        pending.delete(response.id);
+        clearTimeout(request.timer);
+        if (response.error) {
+            request.reject(new Error(response.error));
+        } else {
+            request.resolve(response.result);
+        }
+    });
+
+    child.stderr.on('data', (data) => {
+        console.error(`Python Error: ${data}`);
+    });
+
+    const onExit = (reason) => {
+        // The next request starts a fresh worker
+        if (worker === child) worker = null;
+        failPending(new Error(`Vitals worker stopped: ${reason}`));
+    };
+    child.on('error', (error) => onExit(error.message));
+    child.on('exit', (code, signal) => onExit(signal || `exit code ${code}`));
+    child.stdin.on('error', (error) => console.error('Vitals worker stdin error:', error.message));
+
+    return child;
+};
+
+// Analyze one patient's vitals; resolves with the same result the one-shot script prints
+const analyzeVitals = (vitals, patientId) => new Promise((resolve, reject) => {
+    if (!worker) worker = startWorker();
+
+    const id = nextId++;
+    const timer = setTimeout(() => {
+        pending.delete(id);
+        reject(new Error('Vitals analysis timed out'));
+    }, REQUEST_TIMEOUT_MS);
+    pending.set(id, { resolve, reject, timer });
+
+    const request = { id, vitals };
+    if (patientId) request.patient_id = String(patientId);
+    worker.stdin.write(JSON.stringify(request) + '\n');
+});
+
+const stopVitalsWorker = () => {
+    if (worker) {
+        worker.stdin.end();
+        worker = null;
+    }
+};
+
+module.exports = {
+    analyzeVitals,
+    stopVitalsWorker
+};
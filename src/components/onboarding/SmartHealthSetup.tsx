@@ -43,8 +43,10 @@ export function SmartHealthSetup({ onComplete, onSkip }: SmartHealthSetupProps)
             // Direct fetch if api wrapper doesn't support formData easily, 
             // but assuming standard usage. Use absolute URL if needed or proxy.
             // e.g. http://localhost:5000/api/upload-report
+            const token = localStorage.getItem('token');
             const response = await fetch('http://localhost:5000/api/upload-report', {
                 method: 'POST',
+                headers: token ? { Authorization: `Bearer ${token}` } : {},
                 body: formData,
             });
 